@@ -6,7 +6,7 @@ Returns: HTTP response с JWT токеном или ошибкой
 
 import json
 import os
-import psycopg2
+from db import get_db_connection, release_db_connection
 import bcrypt
 import jwt
 from datetime import datetime, timedelta
@@ -55,16 +55,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     # Подключаемся к БД
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection()
     cur = conn.cursor()
     
-    # Получаем хеш пароля из БД
-    cur.execute("SELECT password_hash FROM t_p21120869_mototumen_community_.admin_auth WHERE id = 1")
-    result = cur.fetchone()
-    
-    cur.close()
-    conn.close()
+    try:
+        # Получаем хеш пароля из БД
+        cur.execute("SELECT password_hash FROM t_p21120869_mototumen_community_.admin_auth WHERE id = 1")
+        result = cur.fetchone()
+    finally:
+        cur.close()
+        release_db_connection(conn)
     
     if not result:
         return {
@@ -6,7 +6,7 @@ Returns: HTTP response с данными пользователей или ре
 
 import json
 import os
-import psycopg2
+from db import get_db_connection, release_db_connection
 import jwt
 from typing import Dict, Any, Optional
 
@@ -49,8 +49,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -186,7 +185,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
     
     return {
         'statusCode': 405,
@@ -6,17 +6,14 @@ Returns: HTTP response with users list, role management, and individual password
 import json
 import os
 from typing import Dict, Any, Optional
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from session_cache import get_cached_session, cache_session, invalidate_user_sessions
 import bcrypt
 import requests
 
 SCHEMA = 't_p21120869_mototumen_community_'
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
-
 def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
     name_lower = name.lower()
     for key, value in headers.items():
@@ -25,15 +22,27 @@ def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
     return None
 
 def get_user_from_token(cur, token: str) -> Optional[Dict]:
+    cached_user = get_cached_session(token)
+    if cached_user:
+        return cached_user
+    
     cur.execute(
         f"""
-        SELECT u.id, u.email, u.name, u.role, u.admin_password_hash
+        SELECT u.id, u.email, u.name, u.role, u.admin_password_hash,
+               EXTRACT(EPOCH FROM s.expires_at - NOW()) AS expires_in
         FROM {SCHEMA}.users u
         JOIN {SCHEMA}.user_sessions s ON u.id = s.user_id
-        WHERE s.token = '{token}' AND s.expires_at > NOW()
-        """
+        WHERE s.token = %s AND s.expires_at > NOW()
+        """,
+        (token,)
     )
-    return cur.fetchone()
+    row = cur.fetchone()
+    if not row:
+        return None
+    
+    session_user = dict(row)
+    cache_session(token, session_user, session_user.pop('expires_in'))
+    return session_user
 
 def log_security_event(cur, event_type: str, severity: str, ip: str = None, 
                        user_id: int = None, endpoint: str = None, method: str = None,
@@ -81,7 +90,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(RealDictCursor)
         cur = conn.cursor()
         
         query_params = event.get('queryStringParameters', {}) or {}
@@ -165,6 +174,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (password_hash, user['id'])
             )
             conn.commit()
+            invalidate_user_sessions(user['id'])
             
             return {
                 'statusCode': 200,
@@ -233,6 +243,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (new_hash, user['id'])
             )
             conn.commit()
+            invalidate_user_sessions(user['id'])
             
             return {
                 'statusCode': 200,
@@ -359,6 +370,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             )
             
             conn.commit()
+            invalidate_user_sessions(req['user_id'])
             
             return {
                 'statusCode': 200,
@@ -427,6 +439,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (target_user_id,)
             )
             conn.commit()
+            invalidate_user_sessions(target_user_id)
             
             return {
                 'statusCode': 200,
@@ -516,6 +529,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (new_role, target_user_id)
             )
             conn.commit()
+            invalidate_user_sessions(target_user_id)
             
             ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
             log_security_event(cur, 'role_change', 'high', ip=ip,
@@ -575,8 +589,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             cur.execute(f"DELETE FROM {SCHEMA}.user_sessions WHERE user_id = %s", (user_id,))
             cur.execute(f"DELETE FROM {SCHEMA}.user_profiles WHERE user_id = %s", (user_id,))
             cur.execute(f"DELETE FROM {SCHEMA}.user_vehicles WHERE user_id = %s", (user_id,))
+            cur.execute(f"DELETE FROM {SCHEMA}.user_counters WHERE user_id = %s", (user_id,))
             cur.execute(f"DELETE FROM {SCHEMA}.users WHERE id = %s", (user_id,))
             conn.commit()
+            invalidate_user_sessions(user_id)
             
             ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
             log_security_event(cur, 'user_deleted', 'critical', ip=ip,
@@ -631,6 +647,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     ORDER BY created_at DESC
                 """)
                 shops = cur.fetchall()
+                for shop in shops:
+                    shop.pop('search_vector', None)
                 
                 return {
                     'statusCode': 200,
@@ -696,6 +714,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 ORDER BY created_at DESC
             """)
             shops = cur.fetchall()
+            for shop in shops:
+                shop.pop('search_vector', None)
             
             return {
                 'statusCode': 200,
@@ -1099,4 +1119,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
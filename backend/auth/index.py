@@ -9,22 +9,21 @@ import hashlib
 import secrets
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from telegram_membership import TELEGRAM_CHANNELS, check_channel_subscription, get_subscription_check_state
+from http_cache import etag_for_body, cached_response
+from session_cache import get_cached_session, cache_session, invalidate_session, invalidate_user_sessions, get_session_cache_stats
 import urllib.request
-import boto3
 import jwt
 import requests
 
-TELEGRAM_CHANNELS = [
-    "-1002441055201",  # Numeric chat_id (primary)
-    "@MotoTyumen",     # Username
-    "https://t.me/MotoTyumen"  # URL
-]
+PUBLIC_PROFILE_CACHE_CONTROL = 'public, max-age=60'
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+PROFILE_COUNTER_FIELDS = [
+    'pending_friend_requests', 'friends_count', 'vehicles_count', 'favorites_count',
+    'achievements_count', 'total_achievements', 'badges_count'
+]
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -41,15 +40,29 @@ def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
     return None
 
 def get_user_from_token(cur, token: str) -> Optional[Dict]:
+    """Resolve X-Auth-Token to a user, served from the session cache on warm containers"""
+    cached_user = get_cached_session(token)
+    if cached_user:
+        return cached_user
+    
     cur.execute(
-        f"""
-        SELECT u.id, u.email, u.name
+        """
+        SELECT u.id, u.email, u.name, u.role, u.created_at, p.callsign,
+               EXTRACT(EPOCH FROM s.expires_at - NOW()) AS expires_in
         FROM users u
         JOIN user_sessions s ON u.id = s.user_id
-        WHERE s.token = '{token}' AND s.expires_at > NOW()
-        """
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        WHERE s.token = %s AND s.expires_at > NOW()
+        """,
+        (token,)
     )
-    return cur.fetchone()
+    row = cur.fetchone()
+    if not row:
+        return None
+    
+    session_user = dict(row)
+    cache_session(token, session_user, session_user.pop('expires_in'))
+    return session_user
 
 def notify_ceo(message: str, notification_type: str = 'info'):
     notify_url = os.environ.get('NOTIFY_CEO_URL')
@@ -66,83 +79,23 @@ def notify_ceo(message: str, notification_type: str = 'info'):
     except Exception as e:
         print(f"Failed to notify CEO: {e}")
 
-def check_channel_subscription(user_id: int, username: str = None) -> bool:
-    """Check if user is subscribed to MotoTyumen group - tries all channel variants"""
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN_AUTH')
-    if not bot_token:
-        print("[CHECK_SUBSCRIPTION] TELEGRAM_BOT_TOKEN_AUTH not set, allowing auth")
-        return True
-    
-    print(f"[CHECK_SUBSCRIPTION] Checking user {user_id} in MotoTyumen group")
-    
-    for channel_id in TELEGRAM_CHANNELS:
-        print(f"[CHECK_SUBSCRIPTION] Trying channel variant: {channel_id}")
-        
-        try:
-            url = f"https://api.telegram.org/bot{bot_token}/getChatMember?chat_id={channel_id}&user_id={user_id}"
-            req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            
-            with urllib.request.urlopen(req, timeout=5) as response:
-                response_text = response.read().decode()
-                data = json.loads(response_text)
-                
-                if data.get('ok'):
-                    status = data.get('result', {}).get('status', '')
-                    is_member = status in ['member', 'administrator', 'creator']
-                    
-                    print(f"[CHECK_SUBSCRIPTION] ✅ SUCCESS with {channel_id}: user_id={user_id}, status={status}, is_member={is_member}")
-                    
-                    if is_member:
-                        return True
-                else:
-                    error_desc = data.get('description', 'Unknown error')
-                    print(f"[CHECK_SUBSCRIPTION] ❌ FAILED {channel_id}: {error_desc}")
-                
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode() if hasattr(e, 'read') else 'no body'
-            print(f"[CHECK_SUBSCRIPTION] ❌ HTTPError for {channel_id}: code={e.code}, body={error_body}")
-        except Exception as e:
-            print(f"[CHECK_SUBSCRIPTION] ❌ Error with {channel_id}: {e}")
-    
-    print(f"[CHECK_SUBSCRIPTION] ❌ ALL VARIANTS FAILED for user {user_id}")
-    return False
-
-def upload_avatar_to_s3(photo_url: str, user_id: int) -> Optional[str]:
-    """Download avatar from URL and upload to S3"""
+def enqueue_avatar_sync(cur, user_id: int, photo_url: str) -> None:
+    """Queue copying the Telegram avatar to S3 (done by avatar-sync) unless this source URL is already copied"""
     if not photo_url or not photo_url.startswith('http'):
-        return None
+        return
     
-    try:
-        req = urllib.request.Request(photo_url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            image_data = response.read()
-        
-        file_hash = hashlib.md5(image_data).hexdigest()[:8]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_name = f"avatars/{user_id}_{timestamp}_{file_hash}.jpg"
-        
-        s3_client = boto3.client(
-            's3',
-            endpoint_url='https://storage.yandexcloud.net',
-            aws_access_key_id=os.environ.get('YC_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('YC_SECRET_ACCESS_KEY'),
-            region_name='ru-central1'
-        )
-        
-        bucket_name = os.environ.get('YC_STORAGE_BUCKET')
-        
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_name,
-            Body=image_data,
-            ContentType='image/jpeg',
-            ACL='public-read'
-        )
-        
-        return f"https://storage.yandexcloud.net/{bucket_name}/{file_name}"
-    except Exception as e:
-        print(f"[AVATAR UPLOAD ERROR] {str(e)}")
-        return None
+    cur.execute(
+        """
+        INSERT INTO avatar_sync_jobs (user_id, source_url, status, attempts, available_at, updated_at)
+        SELECT %s, %s, 'pending', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        WHERE NOT EXISTS (SELECT 1 FROM user_profiles WHERE user_id = %s AND avatar_source_url = %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            source_url = EXCLUDED.source_url, status = 'pending', attempts = 0,
+            available_at = CURRENT_TIMESTAMP, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE avatar_sync_jobs.source_url <> EXCLUDED.source_url OR avatar_sync_jobs.status = 'failed'
+        """,
+        (user_id, photo_url, user_id, photo_url)
+    )
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', 'GET')
@@ -215,6 +168,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             results[f'variant_{idx}_{channel_id}'] = variant_result
         
+        results['subscription_check'] = get_subscription_check_state()
+        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -223,7 +178,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(RealDictCursor)
         cur = conn.cursor()
         
         user = None
@@ -255,7 +210,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     last_name = payload.get('last_name')
                     username = payload.get('username')
                     
-                    if not check_channel_subscription(telegram_id, username):
+                    if not check_channel_subscription(telegram_id, username, cur):
                         return {
                             'statusCode': 403,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -381,7 +336,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                if not check_channel_subscription(telegram_id):
+                if not check_channel_subscription(telegram_id, username, cur):
                     return {
                         'statusCode': 403,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -400,12 +355,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 if auth_user:
                     if photo_url:
-                        s3_url = upload_avatar_to_s3(photo_url, auth_user['id'])
-                        avatar_to_save = s3_url if s3_url else photo_url
                         cur.execute(
-                            "UPDATE user_profiles SET avatar_url = %s WHERE user_id = %s",
-                            (avatar_to_save, auth_user['id'])
+                            "UPDATE user_profiles SET avatar_url = %s WHERE user_id = %s AND avatar_url IS NULL",
+                            (photo_url, auth_user['id'])
                         )
+                        enqueue_avatar_sync(cur, auth_user['id'], photo_url)
                     
                     if username:
                         cur.execute(
@@ -445,15 +399,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     )
                     auth_user = cur.fetchone()
                     
-                    s3_avatar_url = None
-                    if photo_url:
-                        s3_avatar_url = upload_avatar_to_s3(photo_url, auth_user['id'])
-                    avatar_to_save = s3_avatar_url if s3_avatar_url else photo_url
-                    
                     cur.execute(
                         "INSERT INTO user_profiles (user_id, avatar_url, telegram) VALUES (%s, %s, %s)",
-                        (auth_user['id'], avatar_to_save, username)
+                        (auth_user['id'], photo_url or None, username)
                     )
+                    enqueue_avatar_sync(cur, auth_user['id'], photo_url)
                     
                     new_token = generate_token()
                     expires_at = datetime.now() + timedelta(days=30)
@@ -486,6 +436,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 if logout_token:
                     cur.execute("DELETE FROM user_sessions WHERE token = %s", (logout_token,))
                     conn.commit()
+                    invalidate_session(logout_token)
                 
                 return {
                     'statusCode': 200,
@@ -507,17 +458,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(
-                """
-                SELECT u.id, u.email, u.name, u.role, u.created_at, p.callsign
-                FROM users u
-                JOIN user_sessions s ON u.id = s.user_id
-                LEFT JOIN user_profiles p ON u.id = p.user_id
-                WHERE s.token = %s AND s.expires_at > NOW()
-                """,
-                (token,)
-            )
-            verify_user = cur.fetchone()
+            verify_user = user
+            print(f"[AUTH GET VERIFY] Session cache: {get_session_cache_stats()}")
             
             if not verify_user:
                 return {
@@ -765,27 +707,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             search = query_params.get('search', '').replace("'", "''")
             
             if user_id:
-                cur.execute(f"SELECT u.id, u.name, u.username, u.created_at, u.role, p.phone, p.bio, p.location, p.avatar_url, p.is_public, p.gender, p.callsign, p.telegram, u.username as telegram_username FROM users u LEFT JOIN user_profiles p ON u.id = p.user_id WHERE u.id = {user_id}")
-                udata = cur.fetchone()
-                if not udata or not udata.get('is_public', True):
+                cur.execute(
+                    """
+                    SELECT u.id, u.name, u.username, u.created_at, u.role, p.phone, p.bio, p.location, p.avatar_url, p.is_public, p.gender, p.callsign, p.telegram, u.username as telegram_username,
+                           COALESCE(c.friends_count, 0) as friends_count, COALESCE(c.favorites_count, 0) as favorites_count
+                    FROM users u
+                    LEFT JOIN user_profiles p ON u.id = p.user_id
+                    LEFT JOIN user_counters c ON u.id = c.user_id
+                    WHERE u.id = %s
+                    """,
+                    (user_id,)
+                )
+                row = cur.fetchone()
+                if not row or not row.get('is_public', True):
                     return {'statusCode': 403, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Private'}), 'isBase64Encoded': False}
                 
-                cur.execute(f"SELECT * FROM user_vehicles WHERE user_id = {user_id} ORDER BY is_primary DESC, created_at DESC")
-                vehicles = cur.fetchall()
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_friends WHERE (user_id = {user_id} OR friend_id = {user_id}) AND status = 'accepted'")
-                fcnt = cur.fetchone()
+                udata = dict(row)
+                friends_count = udata.pop('friends_count')
+                favorites_count = udata.pop('favorites_count')
                 
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_favorites WHERE user_id = {user_id}")
-                fav_cnt = cur.fetchone()
+                cur.execute("SELECT * FROM user_vehicles WHERE user_id = %s ORDER BY is_primary DESC, created_at DESC", (user_id,))
+                vehicles = cur.fetchall()
                 
-                return {'statusCode': 200, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'user': dict(udata), 'vehicles': [dict(v) for v in vehicles], 'friends_count': fcnt['cnt'] if fcnt else 0, 'favorites_count': fav_cnt['cnt'] if fav_cnt else 0}, default=str), 'isBase64Encoded': False}
+                body = json.dumps({'user': udata, 'vehicles': [dict(v) for v in vehicles], 'friends_count': friends_count, 'favorites_count': favorites_count}, default=str)
+                return cached_response(event, etag_for_body(body), PUBLIC_PROFILE_CACHE_CONTROL, {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, body)
             
             else:
                 search_cond = f"AND (u.name ILIKE '%{search}%' OR u.username ILIKE '%{search}%')" if search else ""
                 cur.execute(f"SELECT u.id, u.name, u.username, u.created_at, p.location, p.avatar_url FROM users u LEFT JOIN user_profiles p ON u.id = p.user_id WHERE p.is_public = true {search_cond} ORDER BY u.created_at DESC LIMIT 100")
                 users = cur.fetchall()
-                return {'statusCode': 200, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'users': [dict(u) for u in users]}, default=str), 'isBase64Encoded': False}
+                body = json.dumps({'users': [dict(u) for u in users]}, default=str)
+                return cached_response(event, etag_for_body(body), PUBLIC_PROFILE_CACHE_CONTROL, {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, body)
         
         # === PROFILE (my profile) ===
         else:
@@ -793,41 +745,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 return {'statusCode': 401, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Auth required'}), 'isBase64Encoded': False}
             
             if method == 'GET':
-                cur.execute(f"SELECT u.id, u.email, u.name, u.created_at, u.telegram_id, u.username as telegram_username, p.phone, p.avatar_url, p.bio, p.location, p.gender, p.callsign, p.telegram FROM users u LEFT JOIN user_profiles p ON u.id = p.user_id WHERE u.id = {user['id']}")
-                profile = cur.fetchone()
-                
-                cur.execute(f"SELECT item_type, item_id, created_at FROM user_favorites WHERE user_id = {user['id']} ORDER BY created_at DESC")
-                favorites = cur.fetchall()
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_friends WHERE friend_id = {user['id']} AND status = 'pending'")
-                pending_req = cur.fetchone()
-                pending_count = pending_req['cnt'] if pending_req else 0
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_friends WHERE (user_id = {user['id']} OR friend_id = {user['id']}) AND status = 'accepted'")
-                friends_cnt = cur.fetchone()
-                friends_count = friends_cnt['cnt'] if friends_cnt else 0
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_vehicles WHERE user_id = {user['id']}")
-                vehicles_cnt = cur.fetchone()
-                vehicles_count = vehicles_cnt['cnt'] if vehicles_cnt else 0
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_favorites WHERE user_id = {user['id']}")
-                favorites_cnt = cur.fetchone()
-                favorites_count = favorites_cnt['cnt'] if favorites_cnt else 0
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_achievements WHERE user_id = {user['id']}")
-                achievements_cnt = cur.fetchone()
-                achievements_count = achievements_cnt['cnt'] if achievements_cnt else 0
-                
-                cur.execute("SELECT COUNT(*) as cnt FROM achievements")
-                total_ach = cur.fetchone()
-                total_achievements = total_ach['cnt'] if total_ach else 0
-                
-                cur.execute(f"SELECT COUNT(*) as cnt FROM user_badges WHERE user_id = {user['id']}")
-                badges_cnt = cur.fetchone()
-                badges_count = badges_cnt['cnt'] if badges_cnt else 0
+                cur.execute(
+                    """
+                    SELECT u.id, u.email, u.name, u.created_at, u.telegram_id, u.username as telegram_username,
+                           p.phone, p.avatar_url, p.bio, p.location, p.gender, p.callsign, p.telegram,
+                           COALESCE(c.pending_friend_requests, 0) as pending_friend_requests,
+                           COALESCE(c.friends_count, 0) as friends_count,
+                           COALESCE(c.vehicles_count, 0) as vehicles_count,
+                           COALESCE(c.favorites_count, 0) as favorites_count,
+                           COALESCE(c.achievements_count, 0) as achievements_count,
+                           COALESCE(c.badges_count, 0) as badges_count,
+                           (SELECT COUNT(*) FROM achievements) as total_achievements,
+                           (SELECT COALESCE(json_agg(json_build_object('item_type', f.item_type, 'item_id', f.item_id, 'created_at', f.created_at::text) ORDER BY f.created_at DESC), '[]'::json)
+                            FROM user_favorites f WHERE f.user_id = u.id) as favorites
+                    FROM users u
+                    LEFT JOIN user_profiles p ON u.id = p.user_id
+                    LEFT JOIN user_counters c ON u.id = c.user_id
+                    WHERE u.id = %s
+                    """,
+                    (user['id'],)
+                )
+                row = cur.fetchone()
+                profile = dict(row) if row else {}
+                counters = {key: profile.pop(key, 0) for key in PROFILE_COUNTER_FIELDS}
+                favorites = profile.pop('favorites', None) or []
                 
-                return {'statusCode': 200, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'profile': dict(profile) if profile else {}, 'favorites': [dict(f) for f in favorites], 'pending_friend_requests': pending_count, 'friends_count': friends_count, 'vehicles_count': vehicles_count, 'favorites_count': favorites_count, 'achievements_count': achievements_count, 'total_achievements': total_achievements, 'badges_count': badges_count}, default=str), 'isBase64Encoded': False}
+                return {'statusCode': 200, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'profile': profile, 'favorites': favorites, **counters}, default=str), 'isBase64Encoded': False}
             
             elif method == 'PUT':
                 body = json.loads(event.get('body', '{}'))
@@ -842,6 +785,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     updates.append("updated_at = NOW()")
                     cur.execute(f"UPDATE user_profiles SET {', '.join(updates)} WHERE user_id = {user['id']}")
                     conn.commit()
+                    invalidate_user_sessions(user['id'])
                 
                 return {'statusCode': 200, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'message': 'Updated'}), 'isBase64Encoded': False}
         
@@ -856,4 +800,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
\ No newline at end of file
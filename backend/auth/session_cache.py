@@ -0,0 +1,68 @@
+'''
+Business: TTL+LRU кэш сессий X-Auth-Token, живущий между тёплыми вызовами функции
+Args: SESSION_CACHE_MAX_SIZE, SESSION_CACHE_TTL из окружения
+Returns: get/put/invalidate для записей пользователя по токену и счётчики попаданий
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+SESSION_CACHE_MAX_SIZE = int(os.environ.get('SESSION_CACHE_MAX_SIZE', '1024'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+
+_entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+def get_cached_session(token: str) -> Optional[Dict[str, Any]]:
+    """Return a copy of the cached user row for token, or None on miss/expiry"""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(token)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                del _entries[token]
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(token)
+        _stats['hits'] += 1
+        return dict(entry[1])
+
+def cache_session(token: str, user: Dict[str, Any], expires_in: Optional[float] = None) -> None:
+    """Store user row for token; never outlives the session's own expires_at"""
+    ttl = SESSION_CACHE_TTL if expires_in is None else min(SESSION_CACHE_TTL, float(expires_in))
+    if ttl <= 0:
+        return
+    with _lock:
+        _entries[token] = (time.monotonic() + ttl, dict(user))
+        _entries.move_to_end(token)
+        while len(_entries) > SESSION_CACHE_MAX_SIZE:
+            _entries.popitem(last=False)
+            _stats['evictions'] += 1
+
+def invalidate_session(token: str) -> None:
+    """Drop a single token, e.g. on logout"""
+    with _lock:
+        if _entries.pop(token, None) is not None:
+            _stats['invalidations'] += 1
+
+def invalidate_user_sessions(user_id: int) -> None:
+    """Drop every cached token of a user, e.g. after a role or profile change"""
+    with _lock:
+        stale = [token for token, (_, user) in _entries.items() if str(user.get('id')) == str(user_id)]
+        for token in stale:
+            del _entries[token]
+        _stats['invalidations'] += len(stale)
+
+def get_session_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters plus current size"""
+    with _lock:
+        total = _stats['hits'] + _stats['misses']
+        return {
+            **_stats,
+            'size': len(_entries),
+            'hit_ratio': round(_stats['hits'] / total, 4) if total else 0.0
+        }
@@ -0,0 +1,190 @@
+'''
+Business: Проверка подписки на группу @MotoTyumen: локальная таблица членства, затем Telegram Bot API с кэшем и предохранителем
+Args: курсор БД; TELEGRAM_BOT_TOKEN_AUTH, SUBSCRIPTION_* и TELEGRAM_BREAKER_* из окружения
+Returns: check_channel_subscription(user_id) -> bool за ограниченное время
+'''
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Optional
+
+TELEGRAM_CHANNELS = [
+    "-1002441055201",  # Numeric chat_id (primary)
+    "@MotoTyumen",     # Username
+    "https://t.me/MotoTyumen"  # URL
+]
+
+MEMBER_STATUSES = ['member', 'administrator', 'creator']
+
+SUBSCRIPTION_CACHE_TTL = float(os.environ.get('SUBSCRIPTION_CACHE_TTL', '600'))
+SUBSCRIPTION_NEGATIVE_CACHE_TTL = float(os.environ.get('SUBSCRIPTION_NEGATIVE_CACHE_TTL', '60'))
+SUBSCRIPTION_CACHE_MAX_SIZE = int(os.environ.get('SUBSCRIPTION_CACHE_MAX_SIZE', '4096'))
+SUBSCRIPTION_CHECK_TIMEOUT = float(os.environ.get('SUBSCRIPTION_CHECK_TIMEOUT', '5'))
+TELEGRAM_BREAKER_THRESHOLD = int(os.environ.get('TELEGRAM_BREAKER_THRESHOLD', '3'))
+TELEGRAM_BREAKER_COOLDOWN = float(os.environ.get('TELEGRAM_BREAKER_COOLDOWN', '30'))
+
+# Probe outcomes: a definite answer from Telegram, a variant Telegram rejects, or a transport failure
+MEMBER = 'member'
+NOT_MEMBER = 'not_member'
+INVALID = 'invalid'
+UNAVAILABLE = 'unavailable'
+
+_executor = ThreadPoolExecutor(max_workers=len(TELEGRAM_CHANNELS) * 2, thread_name_prefix='tg-probe')
+_cache: 'OrderedDict[str, tuple]' = OrderedDict()
+_breaker = {'failures': 0, 'open_until': 0.0}
+_lock = threading.Lock()
+
+def _get_cached(user_id: Any) -> Optional[bool]:
+    with _lock:
+        entry = _cache.get(str(user_id))
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _cache[str(user_id)]
+            return None
+        _cache.move_to_end(str(user_id))
+        return entry[1]
+
+def _store(user_id: Any, is_member: bool) -> None:
+    ttl = SUBSCRIPTION_CACHE_TTL if is_member else SUBSCRIPTION_NEGATIVE_CACHE_TTL
+    with _lock:
+        _cache[str(user_id)] = (time.monotonic() + ttl, is_member)
+        _cache.move_to_end(str(user_id))
+        while len(_cache) > SUBSCRIPTION_CACHE_MAX_SIZE:
+            _cache.popitem(last=False)
+
+def _breaker_is_open() -> bool:
+    with _lock:
+        return _breaker['open_until'] > time.monotonic()
+
+def _record_api_health(healthy: bool) -> None:
+    with _lock:
+        if healthy:
+            _breaker['failures'] = 0
+            _breaker['open_until'] = 0.0
+            return
+        _breaker['failures'] += 1
+        if _breaker['failures'] >= TELEGRAM_BREAKER_THRESHOLD:
+            _breaker['open_until'] = time.monotonic() + TELEGRAM_BREAKER_COOLDOWN
+            print(f"[CHECK_SUBSCRIPTION] Circuit open for {TELEGRAM_BREAKER_COOLDOWN}s after {_breaker['failures']} failures")
+
+def _probe(bot_token: str, channel_id: str, user_id: int) -> str:
+    """Ask getChatMember for one channel variant"""
+    url = f"https://api.telegram.org/bot{bot_token}/getChatMember?chat_id={channel_id}&user_id={user_id}"
+    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    try:
+        with urllib.request.urlopen(req, timeout=SUBSCRIPTION_CHECK_TIMEOUT) as response:
+            data = json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode() if hasattr(e, 'read') else 'no body'
+        print(f"[CHECK_SUBSCRIPTION] ❌ HTTPError for {channel_id}: code={e.code}, body={error_body}")
+        return UNAVAILABLE if e.code >= 500 or e.code == 429 else INVALID
+    except Exception as e:
+        print(f"[CHECK_SUBSCRIPTION] ❌ Error with {channel_id}: {e}")
+        return UNAVAILABLE
+
+    if not data.get('ok'):
+        print(f"[CHECK_SUBSCRIPTION] ❌ FAILED {channel_id}: {data.get('description', 'Unknown error')}")
+        return INVALID
+
+    status = data.get('result', {}).get('status', '')
+    print(f"[CHECK_SUBSCRIPTION] ✅ SUCCESS with {channel_id}: user_id={user_id}, status={status}")
+    return MEMBER if status in MEMBER_STATUSES else NOT_MEMBER
+
+def lookup_group_membership(cur, telegram_id: Any) -> Optional[bool]:
+    """Local answer from telegram_group_members (fed by the telegram-membership function), None if unknown"""
+    cur.execute("SELECT is_member FROM telegram_group_members WHERE telegram_id = %s", (telegram_id,))
+    row = cur.fetchone()
+    return row['is_member'] if row else None
+
+def remember_group_membership(cur, telegram_id: Any, username: Optional[str], is_member: bool) -> None:
+    """Write a Bot API answer back so the next login is a local lookup; committed with the caller's transaction"""
+    cur.execute(
+        """
+        INSERT INTO telegram_group_members (telegram_id, username, status, is_member, event_at, source, updated_at)
+        VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', 'login', CURRENT_TIMESTAMP)
+        ON CONFLICT (telegram_id) DO UPDATE SET
+            username = COALESCE(EXCLUDED.username, telegram_group_members.username),
+            status = EXCLUDED.status,
+            is_member = EXCLUDED.is_member,
+            event_at = EXCLUDED.event_at,
+            source = EXCLUDED.source,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE telegram_group_members.event_at <= EXCLUDED.event_at
+        """,
+        (telegram_id, username, 'member' if is_member else 'left', is_member)
+    )
+
+def _probe_channels(bot_token: str, user_id: Any) -> Optional[bool]:
+    """Probe every channel variant concurrently; None when no variant gave a definite answer"""
+    pending = {_executor.submit(_probe, bot_token, channel_id, user_id) for channel_id in TELEGRAM_CHANNELS}
+    deadline = time.monotonic() + SUBSCRIPTION_CHECK_TIMEOUT + 1
+    outcomes = []
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            outcome = future.result()
+            if outcome in (MEMBER, NOT_MEMBER):
+                # Every variant names the same group, so the first definite answer wins
+                for other in pending:
+                    other.cancel()
+                _record_api_health(True)
+                return outcome == MEMBER
+            outcomes.append(outcome)
+
+    for other in pending:
+        other.cancel()
+    _record_api_health(not pending and UNAVAILABLE not in outcomes)
+    return None
+
+def check_channel_subscription(user_id: int, username: str = None, cur=None) -> bool:
+    """Check if user is subscribed to MotoTyumen group: local membership table first, Bot API only as fallback"""
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN_AUTH')
+    if not bot_token:
+        print("[CHECK_SUBSCRIPTION] TELEGRAM_BOT_TOKEN_AUTH not set, allowing auth")
+        return True
+
+    # Only positive local answers are trusted: a missed join update must not lock a member out
+    if cur is not None and lookup_group_membership(cur, user_id):
+        print(f"[CHECK_SUBSCRIPTION] Local member record for user {user_id}")
+        return True
+
+    cached = _get_cached(user_id)
+    if cached is not None:
+        print(f"[CHECK_SUBSCRIPTION] Cache hit for user {user_id}: is_member={cached}")
+        return cached
+
+    if _breaker_is_open():
+        print(f"[CHECK_SUBSCRIPTION] Circuit open, failing fast for user {user_id}")
+        return False
+
+    print(f"[CHECK_SUBSCRIPTION] Checking user {user_id} in MotoTyumen group")
+
+    is_member = _probe_channels(bot_token, user_id)
+    if is_member is None:
+        print(f"[CHECK_SUBSCRIPTION] ❌ ALL VARIANTS FAILED for user {user_id}")
+        return False
+
+    _store(user_id, is_member)
+    if cur is not None:
+        remember_group_membership(cur, user_id, username, is_member)
+    return is_member
+
+def get_subscription_check_state() -> Dict[str, Any]:
+    """Cache size and circuit breaker state for debugging"""
+    with _lock:
+        return {
+            'cached_users': len(_cache),
+            'breaker_failures': _breaker['failures'],
+            'breaker_open': _breaker['open_until'] > time.monotonic()
+        }
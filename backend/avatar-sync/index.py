@@ -0,0 +1,188 @@
+"""
+Business: Background worker copying Telegram avatars to Object Storage from the avatar_sync_jobs outbox and queueing their thumbnails
+Args: event from a timer trigger or HTTP call, optional body {"limit": N}; context with request_id
+Returns: HTTP response with copied/unchanged/failed counts
+"""
+import json
+import os
+import hashlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from storage import get_s3_client, get_bucket_name, public_url
+from variants import enqueue_variants
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+AVATAR_SYNC_BATCH_SIZE = int(os.environ.get('AVATAR_SYNC_BATCH_SIZE', '20'))
+AVATAR_SYNC_WORKERS = int(os.environ.get('AVATAR_SYNC_WORKERS', '4'))
+AVATAR_SYNC_MAX_ATTEMPTS = int(os.environ.get('AVATAR_SYNC_MAX_ATTEMPTS', '5'))
+
+def claim_jobs(cur, limit: int) -> List[Dict[str, Any]]:
+    """Take due jobs (and ones stuck in processing) so parallel workers never pick the same user"""
+    cur.execute(
+        f"""
+        UPDATE {SCHEMA}.avatar_sync_jobs
+        SET status = 'processing', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id IN (
+            SELECT user_id FROM {SCHEMA}.avatar_sync_jobs
+            WHERE (status = 'pending' AND available_at <= CURRENT_TIMESTAMP)
+               OR (status = 'processing' AND updated_at < CURRENT_TIMESTAMP - INTERVAL '10 minutes')
+            ORDER BY available_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING user_id, source_url, attempts
+        """,
+        (limit,)
+    )
+    return cur.fetchall()
+
+def download_avatar(photo_url: str) -> bytes:
+    req = urllib.request.Request(photo_url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(req, timeout=10) as response:
+        return response.read()
+
+def avatar_key(user_id: int, content_hash: str) -> str:
+    return f"avatars/{user_id}_{content_hash[:16]}.jpg"
+
+def upload_avatar_to_s3(image_data: bytes, user_id: int, content_hash: str) -> str:
+    """Upload avatar bytes under a content-derived key, so a retried job rewrites the same object"""
+    file_name = avatar_key(user_id, content_hash)
+
+    get_s3_client().put_object(
+        Bucket=get_bucket_name(),
+        Key=file_name,
+        Body=image_data,
+        ContentType='image/jpeg',
+        ACL='public-read'
+    )
+
+    return public_url(file_name)
+
+def fetch_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        image_data = download_avatar(job['source_url'])
+        return {'job': job, 'data': image_data, 'hash': hashlib.sha256(image_data).hexdigest()}
+    except Exception as e:
+        return {'job': job, 'error': str(e)}
+
+def finish_job(cur, job: Dict[str, Any], error: Optional[str]) -> None:
+    """Mark done, or reschedule with linear backoff; a newer source_url queued meanwhile is left pending"""
+    if error is None:
+        cur.execute(
+            f"UPDATE {SCHEMA}.avatar_sync_jobs SET status = 'done', last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE user_id = %s AND source_url = %s",
+            (job['user_id'], job['source_url'])
+        )
+        return
+
+    cur.execute(
+        f"""
+        UPDATE {SCHEMA}.avatar_sync_jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+            available_at = CURRENT_TIMESTAMP + attempts * INTERVAL '1 minute',
+            last_error = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = %s AND source_url = %s
+        """,
+        (AVATAR_SYNC_MAX_ATTEMPTS, error[:500], job['user_id'], job['source_url'])
+    )
+
+def process_batch(conn, cur, limit: int) -> Dict[str, int]:
+    jobs = claim_jobs(cur, limit)
+    conn.commit()
+    result = {'claimed': len(jobs), 'copied': 0, 'unchanged': 0, 'failed': 0}
+    if not jobs:
+        return result
+
+    with ThreadPoolExecutor(max_workers=AVATAR_SYNC_WORKERS) as executor:
+        fetched = list(executor.map(fetch_job, jobs))
+
+    for item in fetched:
+        job = item['job']
+        error = item.get('error')
+
+        if error is None:
+            try:
+                cur.execute(
+                    f"SELECT avatar_source_hash FROM {SCHEMA}.user_profiles WHERE user_id = %s",
+                    (job['user_id'],)
+                )
+                profile = cur.fetchone()
+
+                if profile and profile['avatar_source_hash'] == item['hash']:
+                    # Telegram served the same picture under a new URL: remember the URL, skip the copy
+                    cur.execute(
+                        f"UPDATE {SCHEMA}.user_profiles SET avatar_source_url = %s WHERE user_id = %s",
+                        (job['source_url'], job['user_id'])
+                    )
+                    result['unchanged'] += 1
+                else:
+                    avatar_url = upload_avatar_to_s3(item['data'], job['user_id'], item['hash'])
+                    cur.execute(
+                        f"UPDATE {SCHEMA}.user_profiles SET avatar_url = %s, avatar_source_url = %s, avatar_source_hash = %s WHERE user_id = %s",
+                        (avatar_url, job['source_url'], item['hash'], job['user_id'])
+                    )
+                    enqueue_variants(cur, avatar_key(job['user_id'], item['hash']))
+                    result['copied'] += 1
+            except Exception as e:
+                conn.rollback()
+                error = str(e)
+
+        if error is not None:
+            print(f"[AVATAR SYNC ERROR] user_id={job['user_id']}: {error}")
+            result['failed'] += 1
+
+        finish_job(cur, job, error)
+        conn.commit()
+
+    return result
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    body_str = event.get('body') or '{}'
+    body = json.loads(body_str) if body_str.strip() else {}
+    limit = min(int(body.get('limit') or AVATAR_SYNC_BATCH_SIZE), 100)
+
+    try:
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
+
+        result = process_batch(conn, cur, limit)
+        print(f"[AVATAR SYNC] {result}")
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        print(f"[AVATAR SYNC ERROR] {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,55 @@
+'''
+Business: S3-клиент Yandex Object Storage, создаваемый один раз на контейнер и переиспользующий HTTPS-соединения
+Args: YC_ACCESS_KEY_ID, YC_SECRET_ACCESS_KEY, YC_STORAGE_BUCKET, S3_ENDPOINT_URL, S3_PUBLIC_URL, S3_REGION, S3_MAX_POOL_CONNECTIONS из окружения
+Returns: get_s3_client, get_bucket_name, public_url для обработчиков
+'''
+
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://storage.yandexcloud.net')
+S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL', S3_ENDPOINT_URL)
+S3_REGION = os.environ.get('S3_REGION', 'ru-central1')
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10'))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_s3_client():
+    """Lazily build one client per container; botocore keeps its connection pool alive between warm invocations"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                access_key = os.environ.get('YC_ACCESS_KEY_ID')
+                secret_key = os.environ.get('YC_SECRET_ACCESS_KEY')
+                if not access_key or not secret_key:
+                    raise Exception(f"Missing S3 credentials: access_key={bool(access_key)}, secret_key={bool(secret_key)}")
+
+                _client = boto3.session.Session().client(
+                    's3',
+                    endpoint_url=S3_ENDPOINT_URL,
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    region_name=S3_REGION,
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,
+                        connect_timeout=5,
+                        read_timeout=30,
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                        s3={'addressing_style': 'path'}
+                    )
+                )
+    return _client
+
+def get_bucket_name() -> str:
+    bucket_name = os.environ.get('YC_STORAGE_BUCKET')
+    if not bucket_name:
+        raise Exception('Missing S3 bucket: YC_STORAGE_BUCKET is not set')
+    return bucket_name
+
+def public_url(key: str) -> str:
+    return f"{S3_PUBLIC_URL}/{get_bucket_name()}/{key}"
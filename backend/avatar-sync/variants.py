@@ -0,0 +1,46 @@
+'''
+Business: Размеры превью/WebP-вариантов изображений и их детерминированные ключи рядом с оригиналом
+Args: ключ исходного объекта в бакете
+Returns: VARIANT_SPECS, variant_key, variant_urls, enqueue_variants для загрузчиков и воркера media-variants
+'''
+
+from typing import Dict, Optional
+from storage import public_url
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+# name -> max side in pixels; every variant is a WebP that fits inside a square of that side
+VARIANT_SPECS = {
+    'thumb': 320,
+    'medium': 960,
+    'large': 1600
+}
+
+VARIANT_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+
+def supports_variants(content_type: Optional[str]) -> bool:
+    return (content_type or '').split(';')[0].strip().lower() in VARIANT_CONTENT_TYPES
+
+def variant_key(object_key: str, name: str) -> str:
+    """garage/20250101_120000_ab12.jpg -> garage/20250101_120000_ab12__thumb.webp"""
+    stem = object_key.rsplit('.', 1)[0] if '.' in object_key.rsplit('/', 1)[-1] else object_key
+    return f"{stem}__{name}.webp"
+
+def variant_urls(object_key: str) -> Dict[str, str]:
+    return {name: public_url(variant_key(object_key, name)) for name in VARIANT_SPECS}
+
+def enqueue_variants(cur, object_key: str) -> None:
+    """Queue (or re-queue) derivation for one original; the media-variants worker fills the keys in"""
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.media_variant_jobs (object_key)
+        VALUES (%s)
+        ON CONFLICT (object_key) DO UPDATE SET
+            status = 'pending',
+            attempts = 0,
+            available_at = CURRENT_TIMESTAMP,
+            last_error = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (object_key,)
+    )
@@ -5,9 +5,8 @@ Returns: JSON с hasAccess, role
 '''
 
 import json
-import os
 from typing import Dict, Any
-import psycopg2
+from db import get_db_connection, release_db_connection
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -38,8 +37,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     telegram_id = token
     
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection()
         cur = conn.cursor()
         
         cur.execute(
@@ -48,8 +46,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
         
         result = cur.fetchone()
-        cur.close()
-        conn.close()
         
         if result and result[1]:  # Если нашли и is_active=true
             return {
@@ -73,3 +69,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,278 @@
+'''
+Business: Массовый импорт магазинов, школ и сервисов из CSV/NDJSON: COPY в staging-таблицу, проверка и upsert множественными запросами
+Args: соединение с БД, текст файла, формат (csv/ndjson), тип по умолчанию для строк без type
+Returns: run_import -> сводка задания (принято, ошибок, вставлено, обновлено); get_import_job -> прогресс и первые ошибки
+'''
+
+import csv
+import io
+import json
+import os
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+CONTENT_IMPORT_MAX_ROWS = int(os.environ.get('CONTENT_IMPORT_MAX_ROWS', '100000'))
+CONTENT_IMPORT_CHUNK_ROWS = int(os.environ.get('CONTENT_IMPORT_CHUNK_ROWS', '10000'))
+IMPORT_ERRORS_SAMPLE = 50
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_TYPES = ('shops', 'schools', 'services')
+STAGING_COLUMNS = ['content_type', 'external_id', 'name', 'description', 'category', 'image', 'rating', 'location',
+                   'phone', 'website', 'latitude', 'longitude', 'hours', 'price', 'items']
+# Input field names that differ from the staging column; CSV lists use "|" between items
+FIELD_ALIASES = {'type': 'content_type', 'address': 'location', 'working_hours': 'hours',
+                 'courses': 'items', 'services': 'items'}
+LIST_SEPARATOR = '|'
+
+NUMBER = r"'^\s*-?[0-9]+(\.[0-9]+)?\s*$'"
+
+# Set-based checks, first failing rule wins; casts sit inside CASE so they only run on text that passed the regex
+VALIDATE_SQL = f"""
+    UPDATE {SCHEMA}.content_import_rows r SET error = CASE
+        WHEN r.content_type IS NULL OR r.content_type NOT IN ('shops', 'schools', 'services') THEN 'type must be shops, schools or services'
+        WHEN btrim(coalesce(r.name, '')) = '' THEN 'name is required'
+        WHEN length(r.name) > 255 THEN 'name is longer than 255 characters'
+        WHEN length(r.external_id) > 100 THEN 'external_id is longer than 100 characters'
+        WHEN length(r.category) > 100 OR length(r.hours) > 100 OR length(r.price) > 100 THEN 'category, hours and price are limited to 100 characters'
+        WHEN length(r.image) > 500 OR length(r.website) > 500 THEN 'image and website are limited to 500 characters'
+        WHEN length(r.location) > 255 OR length(r.phone) > 50 THEN 'location is limited to 255 and phone to 50 characters'
+        WHEN r.rating IS NOT NULL AND CASE WHEN r.rating ~ {NUMBER} THEN r.rating::numeric NOT BETWEEN 0 AND 5 ELSE TRUE END
+            THEN 'rating must be a number from 0 to 5'
+        WHEN (r.latitude IS NULL) <> (r.longitude IS NULL) THEN 'latitude and longitude must be given together'
+        WHEN r.latitude IS NOT NULL AND CASE WHEN r.latitude ~ {NUMBER} AND r.longitude ~ {NUMBER}
+                THEN r.latitude::numeric NOT BETWEEN -90 AND 90 OR r.longitude::numeric NOT BETWEEN -180 AND 180 ELSE TRUE END
+            THEN 'latitude/longitude out of range'
+    END
+    WHERE r.job_id = %(job_id)s AND r.error IS NULL
+"""
+
+# A key repeated inside one file: the last line wins, earlier ones are reported
+DUPLICATES_SQL = f"""
+    UPDATE {SCHEMA}.content_import_rows r SET error = 'external_id repeats on a later line'
+    FROM (
+        SELECT line_no, row_number() OVER (PARTITION BY content_type, external_id ORDER BY line_no DESC) AS position
+        FROM {SCHEMA}.content_import_rows
+        WHERE job_id = %(job_id)s AND error IS NULL AND external_id IS NOT NULL
+    ) d
+    WHERE r.job_id = %(job_id)s AND r.line_no = d.line_no AND d.position > 1
+"""
+
+# type -> (target columns, staging expressions) beyond external_id and name; blank cells keep the current value on update
+UPSERT_COLUMNS = {
+    'shops': [('description', 'r.description'), ('category', 'r.category'), ('image', 'r.image'),
+              ('rating', 'r.rating::numeric'), ('location', 'r.location'), ('phone', 'r.phone'),
+              ('website', 'r.website'), ('latitude', 'r.latitude::numeric'), ('longitude', 'r.longitude::numeric'),
+              ('working_hours', 'r.hours')],
+    'schools': [('description', 'r.description'), ('category', 'r.category'), ('image', 'r.image'),
+                ('rating', 'r.rating::numeric'), ('hours', 'r.hours'), ('location', 'r.location'),
+                ('phone', 'r.phone'), ('price', 'r.price'), ('website', 'r.website')],
+    'services': [('description', 'r.description'), ('category', 'r.category'), ('image', 'r.image'),
+                 ('rating', 'r.rating::numeric'), ('hours', 'r.hours'), ('location', 'r.location'),
+                 ('phone', 'r.phone'), ('website', 'r.website'), ('latitude', 'r.latitude::numeric'),
+                 ('longitude', 'r.longitude::numeric')]
+}
+
+# type -> (child table, foreign key, name column)
+CHILD_TABLES = {
+    'schools': ('school_courses', 'school_id', 'course_name'),
+    'services': ('service_items', 'service_id', 'service_name')
+}
+
+class InvalidImport(Exception):
+    pass
+
+def parse_rows(text: str, file_format: str, default_type: Optional[str]) -> Iterator[Tuple[int, Dict[str, Any], Optional[str]]]:
+    """(line number, staging row, parse error) for every record of the file"""
+    if file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        for record in reader:
+            yield reader.line_num, normalize_record(record, default_type, split_lists=True), None
+        return
+
+    for line_no, line in enumerate(io.StringIO(text), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('not an object')
+        except ValueError:
+            yield line_no, {}, 'line is not a JSON object'
+            continue
+        yield line_no, normalize_record(record, default_type, split_lists=False), None
+
+def normalize_record(record: Dict[str, Any], default_type: Optional[str], split_lists: bool) -> Dict[str, Any]:
+    row: Dict[str, Any] = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        column = FIELD_ALIASES.get(key.strip().lower(), key.strip().lower())
+        if column in STAGING_COLUMNS and value is not None and value != '':
+            row[column] = value
+    row.setdefault('content_type', default_type)
+
+    items = row.pop('items', None)
+    if isinstance(items, str) and split_lists:
+        items = items.split(LIST_SEPARATOR)
+    if isinstance(items, list):
+        row['items'] = json.dumps([str(item).strip() for item in items if str(item).strip()], ensure_ascii=False)
+    for column, value in row.items():
+        if column != 'items' and value is not None and not isinstance(value, str):
+            row[column] = str(value)
+    return row
+
+def update_job(cur, job_id: int, **fields: Any) -> None:
+    assignments = ', '.join(f"{name} = %({name})s" for name in fields)
+    cur.execute(f"UPDATE {SCHEMA}.content_import_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = %(job_id)s",
+                {**fields, 'job_id': job_id})
+
+def stage_rows(conn, cur, job_id: int, rows: Iterator[Tuple[int, Dict[str, Any], Optional[str]]]) -> int:
+    """COPY the file into content_import_rows chunk by chunk, committing progress after each chunk"""
+    copy_sql = f"COPY {SCHEMA}.content_import_rows (job_id, line_no, {', '.join(STAGING_COLUMNS)}, error) FROM STDIN WITH (FORMAT csv)"
+    staged = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+
+    for line_no, row, error in rows:
+        if staged + pending >= CONTENT_IMPORT_MAX_ROWS:
+            raise InvalidImport(f'File has more than {CONTENT_IMPORT_MAX_ROWS} rows')
+        writer.writerow([job_id, line_no] + [row.get(column) for column in STAGING_COLUMNS] + [error])
+        pending += 1
+        if pending >= CONTENT_IMPORT_CHUNK_ROWS:
+            staged += pending
+            flush_chunk(conn, cur, job_id, copy_sql, buffer, staged)
+            buffer, pending = io.StringIO(), 0
+            writer = csv.writer(buffer)
+
+    if pending:
+        staged += pending
+        flush_chunk(conn, cur, job_id, copy_sql, buffer, staged)
+    return staged
+
+def flush_chunk(conn, cur, job_id: int, copy_sql: str, buffer: io.StringIO, staged: int) -> None:
+    buffer.seek(0)
+    cur.copy_expert(copy_sql, buffer)
+    update_job(cur, job_id, staged_rows=staged)
+    conn.commit()
+
+def validate_rows(cur, job_id: int) -> Tuple[int, int]:
+    params = {'job_id': job_id}
+    cur.execute(VALIDATE_SQL, params)
+    cur.execute(DUPLICATES_SQL, params)
+    # Rows without a key still need one to find their new id for child rows and for the next sync
+    cur.execute(f"""
+        UPDATE {SCHEMA}.content_import_rows SET external_id = 'import-' || job_id || '-' || line_no
+        WHERE job_id = %(job_id)s AND error IS NULL AND external_id IS NULL
+    """, params)
+    cur.execute(f"""
+        SELECT count(*) FILTER (WHERE error IS NULL) AS valid, count(*) FILTER (WHERE error IS NOT NULL) AS invalid
+        FROM {SCHEMA}.content_import_rows WHERE job_id = %(job_id)s
+    """, params)
+    row = cur.fetchone()
+    return row['valid'], row['invalid']
+
+def upsert_rows(cur, job_id: int, content_type: str) -> Tuple[int, int]:
+    """One INSERT .. ON CONFLICT (external_id) per type, then children replaced for rows that listed any"""
+    columns = UPSERT_COLUMNS[content_type]
+    params = {'job_id': job_id, 'content_type': content_type}
+    staged = f"""
+        FROM {SCHEMA}.content_import_rows r
+        WHERE r.job_id = %(job_id)s AND r.content_type = %(content_type)s AND r.error IS NULL
+    """
+    cur.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {SCHEMA}.{content_type} AS t (external_id, name, {', '.join(name for name, _ in columns)})
+            SELECT r.external_id, btrim(r.name), {', '.join(expression for _, expression in columns)}
+            {staged}
+            ON CONFLICT (external_id) DO UPDATE SET
+                name = EXCLUDED.name,
+                {', '.join(f"{name} = COALESCE(EXCLUDED.{name}, t.{name})" for name, _ in columns)},
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM upserted
+    """, params)
+    counts = cur.fetchone()
+
+    if content_type in CHILD_TABLES:
+        child_table, foreign_key, name_column = CHILD_TABLES[content_type]
+        cur.execute(f"""
+            DELETE FROM {SCHEMA}.{child_table} c
+            USING {SCHEMA}.{content_type} p, {SCHEMA}.content_import_rows r
+            WHERE r.job_id = %(job_id)s AND r.content_type = %(content_type)s AND r.error IS NULL AND r.items IS NOT NULL
+              AND p.external_id = r.external_id AND c.{foreign_key} = p.id
+        """, params)
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.{child_table} ({foreign_key}, {name_column})
+            SELECT p.id, left(item.value, 255)
+            FROM {SCHEMA}.content_import_rows r
+            JOIN {SCHEMA}.{content_type} p ON p.external_id = r.external_id
+            CROSS JOIN LATERAL jsonb_array_elements_text(r.items::jsonb) WITH ORDINALITY AS item(value, position)
+            WHERE r.job_id = %(job_id)s AND r.content_type = %(content_type)s AND r.error IS NULL AND r.items IS NOT NULL
+            ORDER BY p.id, item.position
+        """, params)
+    return counts['inserted'], counts['updated']
+
+def run_import(conn, text: str, file_format: str, default_type: Optional[str]) -> Dict[str, Any]:
+    """Stage, validate and upsert; each phase is committed so import_status shows progress from another request"""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"INSERT INTO {SCHEMA}.content_import_jobs (format) VALUES (%s) RETURNING id", (file_format,))
+        job_id = cur.fetchone()['id']
+        conn.commit()
+
+        try:
+            staged = stage_rows(conn, cur, job_id, parse_rows(text, file_format, default_type))
+
+            update_job(cur, job_id, status='validating')
+            conn.commit()
+            valid, invalid = validate_rows(cur, job_id)
+            update_job(cur, job_id, status='upserting', staged_rows=staged, valid_rows=valid, invalid_rows=invalid)
+            conn.commit()
+
+            inserted = updated = 0
+            for content_type in IMPORT_TYPES:
+                type_inserted, type_updated = upsert_rows(cur, job_id, content_type)
+                inserted += type_inserted
+                updated += type_updated
+            # Accepted rows live in the catalog now; only rejected ones stay for the error report
+            cur.execute(f"DELETE FROM {SCHEMA}.content_import_rows WHERE job_id = %s AND error IS NULL", (job_id,))
+            update_job(cur, job_id, status='done', inserted_rows=inserted, updated_rows=updated)
+            cur.execute(f"UPDATE {SCHEMA}.content_import_jobs SET finished_at = CURRENT_TIMESTAMP WHERE id = %s", (job_id,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            cur.execute(f"DELETE FROM {SCHEMA}.content_import_rows WHERE job_id = %s AND error IS NULL", (job_id,))
+            update_job(cur, job_id, status='failed', error=str(e))
+            conn.commit()
+            if isinstance(e, InvalidImport):
+                return get_import_job(cur, job_id)
+            raise
+
+        return get_import_job(cur, job_id)
+    finally:
+        cur.close()
+
+def get_import_job(cur, job_id: int) -> Optional[Dict[str, Any]]:
+    cur.execute(f"SELECT * FROM {SCHEMA}.content_import_jobs WHERE id = %s", (job_id,))
+    job = cur.fetchone()
+    if not job:
+        return None
+    cur.execute(f"""
+        SELECT line_no AS line, error FROM {SCHEMA}.content_import_rows
+        WHERE job_id = %s AND error IS NOT NULL ORDER BY line_no LIMIT {IMPORT_ERRORS_SAMPLE}
+    """, (job_id,))
+    errors: List[Dict[str, Any]] = [dict(row) for row in cur.fetchall()]
+    return {
+        'jobId': job['id'],
+        'status': job['status'],
+        'staged': job['staged_rows'],
+        'valid': job['valid_rows'],
+        'invalid': job['invalid_rows'],
+        'inserted': job['inserted_rows'],
+        'updated': job['updated_rows'],
+        'error': job['error'],
+        'errors': errors
+    }
@@ -1,12 +1,63 @@
+import base64
 import json
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Dict, Any
+from db import get_db_connection, release_db_connection
+from typing import Dict, Any, Optional
+from response_cache import content_version, invalidate_content_version, cache_key, get_cached_response, cache_response, get_cache_stats
+from http_cache import etag_for_version, matches_if_none_match, cached_response
+from listings import LISTINGS, CONTENT_UNPAGED_LIMIT, InvalidCursor, fetch_facets, fetch_listing, page_size, public_row
+from nearby import NEARBY_TYPES, fetch_nearby, parse_point, parse_radius
+from map_clusters import fetch_clusters, parse_bbox, parse_zoom
+from bulk_import import IMPORT_FORMATS, IMPORT_TYPES, run_import, get_import_job
+from session_cache import get_cached_session, cache_session
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+CONTENT_CACHE_CONTROL = f"public, max-age={os.environ.get('CONTENT_HTTP_MAX_AGE', '30')}"
+IMPORT_ROLES = ['admin', 'ceo']
+
+def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
+    name_lower = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name_lower:
+            return value
+    return None
+
+def get_user_from_token(cur, token: str) -> Optional[Dict]:
+    """Same X-Auth-Token lookup as auth and admin, served from the session cache on warm containers"""
+    cached_user = get_cached_session(token)
+    if cached_user:
+        return cached_user
+    
+    cur.execute(
+        """
+        SELECT u.id, u.email, u.name, u.role,
+               EXTRACT(EPOCH FROM s.expires_at - NOW()) AS expires_in
+        FROM users u
+        JOIN user_sessions s ON u.id = s.user_id
+        WHERE s.token = %s AND s.expires_at > NOW()
+        """,
+        (token,)
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    
+    session_user = dict(row)
+    cache_session(token, session_user, session_user.pop('expires_in'))
+    return session_user
+
+def import_access_error(cur, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """401/403 response unless X-Auth-Token belongs to an admin or CEO"""
+    token = get_header(event.get('headers') or {}, 'X-Auth-Token')
+    user = get_user_from_token(cur, token) if token else None
+    if user and user['role'] in IMPORT_ROLES:
+        return None
+    return {
+        'statusCode': 403 if user else 401,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Admin access required' if user else 'Invalid or expired token'}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -36,7 +87,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
+    conn = get_db_connection(RealDictCursor)
     cur = conn.cursor()
     
     try:
@@ -88,87 +139,186 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        if method == 'GET':
-            category = query_params.get('category')
-            search = query_params.get('search')
-            
-            if content_type == 'shops':
-                query = """
-                    SELECT id, name, description, category, image, rating, 
-                           location as address, phone, phones, website, organization_id, 
-                           is_open, working_hours, latitude, longitude, email, created_at
-                    FROM shops WHERE 1=1
-                """
-                
-                if category and category != 'Все':
-                    escaped_cat = category.replace("'", "''")
-                    query += f" AND category = '{escaped_cat}'"
-                
-                if search:
-                    escaped_search = search.replace("'", "''")
-                    query += f" AND (name ILIKE '%{escaped_search}%' OR description ILIKE '%{escaped_search}%')"
-                
-                query += " ORDER BY created_at DESC"
-                cur.execute(query)
-                
-            elif content_type == 'schools':
-                query = "SELECT s.*, array_agg(sc.course_name) as courses FROM schools s LEFT JOIN school_courses sc ON s.id = sc.school_id WHERE 1=1"
-                
-                if category and category != 'Все':
-                    escaped_cat = category.replace("'", "''")
-                    query += f" AND s.category = '{escaped_cat}'"
-                
-                if search:
-                    escaped_search = search.replace("'", "''")
-                    query += f" AND (s.name ILIKE '%{escaped_search}%' OR s.description ILIKE '%{escaped_search}%')"
-                
-                query += " GROUP BY s.id ORDER BY s.created_at DESC"
-                cur.execute(query)
-                
-            elif content_type == 'services':
-                query = "SELECT s.*, array_agg(si.service_name) as services FROM services s LEFT JOIN service_items si ON s.id = si.service_id WHERE 1=1"
-                
-                if category and category != 'Все':
-                    escaped_cat = category.replace("'", "''")
-                    query += f" AND s.category = '{escaped_cat}'"
-                
-                if search:
-                    escaped_search = search.replace("'", "''")
-                    query += f" AND (s.name ILIKE '%{escaped_search}%' OR s.description ILIKE '%{escaped_search}%')"
-                
-                query += " GROUP BY s.id ORDER BY s.created_at DESC"
-                cur.execute(query)
-                
-            elif content_type == 'announcements':
-                query = "SELECT * FROM announcements WHERE status = 'active'"
-                
-                if category and category != 'Все':
-                    escaped_cat = category.replace("'", "''")
-                    query += f" AND category = '{escaped_cat}'"
-                
-                if search:
-                    escaped_search = search.replace("'", "''")
-                    query += f" AND (title ILIKE '%{escaped_search}%' OR description ILIKE '%{escaped_search}%')"
-                
-                query += " ORDER BY created_at DESC"
-                cur.execute(query)
-            else:
+        if content_type in ('import', 'import_status', 'cache_stats'):
+            # Bulk import can insert or overwrite up to CONTENT_IMPORT_MAX_ROWS catalog rows per request;
+            # cache stats are internal counters, not for the public site
+            access_error = import_access_error(cur, event)
+            if access_error:
+                return access_error
+        
+        if method == 'GET' and content_type == 'cache_stats':
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(get_cache_stats()),
+                'isBase64Encoded': False
+            }
+        
+        if method == 'POST' and content_type == 'import':
+            # ?type=import&format=csv|ndjson[&defaultType=shops] with the file as the request body
+            file_format = query_params.get('format', 'csv')
+            default_type = query_params.get('defaultType')
+            if file_format not in IMPORT_FORMATS or (default_type and default_type not in IMPORT_TYPES):
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid content type'}),
+                    'body': json.dumps({'error': f"format must be one of {', '.join(IMPORT_FORMATS)}, defaultType one of {', '.join(IMPORT_TYPES)}"}),
                     'isBase64Encoded': False
                 }
             
-            results = cur.fetchall()
+            text = event.get('body') or ''
+            if event.get('isBase64Encoded'):
+                text = base64.b64decode(text).decode('utf-8-sig')
+            
+            job = run_import(conn, text.lstrip('\ufeff'), file_format, default_type)
+            for imported_type in IMPORT_TYPES:
+                invalidate_content_version(imported_type)
+            print(f"[CONTENT IMPORT] job={job['jobId']} status={job['status']} staged={job['staged']} inserted={job['inserted']} updated={job['updated']} invalid={job['invalid']}")
             
             return {
-                'statusCode': 200,
+                'statusCode': 200 if job['status'] == 'done' else 422,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(row) for row in results], default=str),
+                'body': json.dumps(job, default=str),
                 'isBase64Encoded': False
             }
         
+        if method == 'GET' and content_type == 'import_status':
+            job = get_import_job(cur, int(query_params.get('id', 0)))
+            return {
+                'statusCode': 200 if job else 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(job or {'error': 'Import job not found'}, default=str),
+                'isBase64Encoded': False
+            }
+        
+        if method == 'GET' and content_type == 'shop_clusters':
+            # ?type=shop_clusters&bbox=west,south,east,north&zoom=N -> map markers clustered on the server
+            try:
+                bbox = parse_bbox(query_params.get('bbox'))
+                zoom = parse_zoom(query_params.get('zoom'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            # Cluster cells are maintained by triggers on shops, so the shops version covers them too
+            clusters_key = lambda version: cache_key('shop_clusters', version, bbox=bbox, zoom=zoom)
+            key = clusters_key(content_version(cur, 'shops'))
+            etag = etag_for_version(key)
+            clusters_headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+            if matches_if_none_match(event, etag):
+                return cached_response(event, etag, CONTENT_CACHE_CONTROL, clusters_headers, '')
+            
+            cached = get_cached_response(key)
+            cache_status = 'HIT' if cached is not None else 'MISS'
+            body = cached[0] if cached else None
+            if body is None:
+                # Rows are read right after a fresh version, so the body is never older than the version it is stored under
+                key = clusters_key(content_version(cur, 'shops', fresh=True))
+                etag = etag_for_version(key)
+                body = json.dumps(fetch_clusters(cur, bbox, zoom))
+                cache_response(key, body)
+            
+            return cached_response(event, etag, CONTENT_CACHE_CONTROL, {**clusters_headers, 'X-Cache': cache_status}, body)
+        
+        if method == 'GET':
+            if content_type not in LISTINGS:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid content type'}),
+                    'isBase64Encoded': False
+                }
+            
+            category = query_params.get('category')
+            search = query_params.get('search')
+            cursor = query_params.get('cursor')
+            paginated = bool(cursor or query_params.get('limit'))
+            # ?facets=1 answers category counts for the current search instead of the rows themselves
+            facets = query_params.get('facets') in ('1', 'true')
+            # ?lat=..&lng=..[&radius=km] switches shops/services to "near me" ordering by distance
+            near = not facets and ('lat' in query_params or 'lng' in query_params)
+            
+            if near and content_type not in NEARBY_TYPES:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': f"Nearby search is available for {', '.join(NEARBY_TYPES)}"}),
+                    'isBase64Encoded': False
+                }
+            
+            if near and cursor:
+                # Distance order has no keyset to continue from; a wider radius or limit replaces paging
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'cursor cannot be combined with lat/lng'}),
+                    'isBase64Encoded': False
+                }
+            
+            listing_key = lambda version: cache_key(
+                content_type, version, facets=facets,
+                category=category, search=search, cursor=cursor, limit=query_params.get('limit'),
+                lat=query_params.get('lat'), lng=query_params.get('lng'), radius=query_params.get('radius')
+            )
+            # The key already carries the table version, so the ETag is known before touching the listing
+            key = listing_key(content_version(cur, content_type))
+            etag = etag_for_version(key)
+            listing_headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+            if matches_if_none_match(event, etag):
+                return cached_response(event, etag, CONTENT_CACHE_CONTROL, listing_headers, '')
+            
+            cached = get_cached_response(key)
+            cache_status = 'HIT' if cached is not None else 'MISS'
+            body, body_headers = cached if cached else (None, {})
+            
+            if body is None:
+                # The local version may be up to CONTENT_VERSION_TTL behind; rows read right after a fresh one
+                # are never older than the version they are cached and tagged under
+                key = listing_key(content_version(cur, content_type, fresh=True))
+                etag = etag_for_version(key)
+            
+            if body is None and facets:
+                body = json.dumps(fetch_facets(cur, content_type, search))
+                cache_response(key, body)
+            
+            if body is None:
+                try:
+                    if near:
+                        lat, lng = parse_point(query_params.get('lat'), query_params.get('lng'))
+                        radius = parse_radius(query_params.get('radius'))
+                        results = fetch_nearby(cur, content_type, lat, lng, radius, category, search, page_size(query_params.get('limit')))
+                    else:
+                        limit = page_size(query_params.get('limit')) if paginated else CONTENT_UNPAGED_LIMIT
+                        results, next_cursor = fetch_listing(cur, content_type, category, search, cursor, limit)
+                except (InvalidCursor, ValueError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+                
+                items = [public_row(row) for row in results]
+                if near:
+                    payload = {'items': items, 'radiusKm': radius}
+                elif paginated:
+                    payload = {'items': items, 'nextCursor': next_cursor}
+                else:
+                    # Without limit/cursor the response stays a bare array for existing clients;
+                    # past CONTENT_UNPAGED_LIMIT rows the headers say so and where to continue with ?cursor=
+                    payload = items
+                    if next_cursor:
+                        body_headers = {'X-Truncated': 'true', 'X-Next-Cursor': next_cursor,
+                                        'Access-Control-Expose-Headers': 'X-Truncated, X-Next-Cursor'}
+                body = json.dumps(payload, default=str)
+                cache_response(key, body, body_headers)
+            
+            return cached_response(event, etag, CONTENT_CACHE_CONTROL, {**listing_headers, **body_headers, 'X-Cache': cache_status}, body)
+        
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             
@@ -182,11 +332,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if content_type == 'shops':
                 cur.execute(f"""
-                    INSERT INTO shops (name, description, category, image, rating, location, phone, website) 
+                    INSERT INTO shops (name, description, category, image, rating, location, phone, website, latitude, longitude) 
                     VALUES ({escape(body_data.get('name'))}, {escape(body_data.get('description'))}, 
                             {escape(body_data.get('category'))}, {escape(body_data.get('image'))}, 
                             {body_data.get('rating', 0)}, {escape(body_data.get('location'))},
-                            {escape(body_data.get('phone'))}, {escape(body_data.get('website'))})
+                            {escape(body_data.get('phone'))}, {escape(body_data.get('website'))},
+                            {escape(body_data.get('latitude'))}, {escape(body_data.get('longitude'))})
                     RETURNING id
                 """)
                 
@@ -207,12 +358,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     
             elif content_type == 'services':
                 cur.execute(f"""
-                    INSERT INTO services (name, description, category, image, rating, hours, location, phone, website) 
+                    INSERT INTO services (name, description, category, image, rating, hours, location, phone, website, latitude, longitude) 
                     VALUES ({escape(body_data.get('name'))}, {escape(body_data.get('description'))}, 
                             {escape(body_data.get('category'))}, {escape(body_data.get('image'))}, 
                             {body_data.get('rating', 0)}, {escape(body_data.get('hours'))},
                             {escape(body_data.get('location'))}, {escape(body_data.get('phone'))}, 
-                            {escape(body_data.get('website'))})
+                            {escape(body_data.get('website'))}, {escape(body_data.get('latitude'))},
+                            {escape(body_data.get('longitude'))})
                     RETURNING id
                 """)
                 service_id = cur.fetchone()['id']
@@ -231,6 +383,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 """)
             
             conn.commit()
+            invalidate_content_version(content_type)
             
             return {
                 'statusCode': 201,
@@ -259,6 +412,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 escaped = str(val).replace("'", "''")
                 return f"'{escaped}'"
             
+            # Coordinates are only touched when both are sent, so older clients don't drop a shop or service
+            # out of "near me" and off the map; the shops triggers move its marker between cluster cells (V0045, V0049)
+            coordinates = ''
+            if 'latitude' in body_data and 'longitude' in body_data:
+                coordinates = f"latitude={escape(body_data.get('latitude'))}, longitude={escape(body_data.get('longitude'))},"
+            
             if content_type == 'shops':
                 cur.execute(f"""
                     UPDATE shops SET 
@@ -270,6 +429,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         location={escape(body_data.get('location'))},
                         phone={escape(body_data.get('phone'))}, 
                         website={escape(body_data.get('website'))}, 
+                        {coordinates}
                         updated_at=CURRENT_TIMESTAMP 
                     WHERE id={item_id}
                 """)
@@ -303,6 +463,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         location={escape(body_data.get('location'))}, 
                         phone={escape(body_data.get('phone'))}, 
                         website={escape(body_data.get('website'))}, 
+                        {coordinates}
                         updated_at=CURRENT_TIMESTAMP 
                     WHERE id={item_id}
                 """)
@@ -322,6 +483,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 """)
             
             conn.commit()
+            invalidate_content_version(content_type)
             
             return {
                 'statusCode': 200,
@@ -347,4 +509,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
\ No newline at end of file
@@ -0,0 +1,152 @@
+'''
+Business: Листинги каталога (магазины, школы, сервисы, объявления): фильтр по категории, полнотекстовый поиск и keyset-пагинация по (created_at, id)
+Args: курсор БД, тип контента, категория, поисковая строка, непрозрачный курсор страницы и размер страницы
+Returns: fetch_listing -> (строки страницы, курсор следующей страницы или None); fetch_facets -> счётчики по категориям
+'''
+
+import base64
+import json
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+SEARCH_CONFIG = 'russian'
+MAX_SEARCH_TERMS = 8
+
+CONTENT_PAGE_SIZE = int(os.environ.get('CONTENT_PAGE_SIZE', '20'))
+CONTENT_PAGE_SIZE_MAX = int(os.environ.get('CONTENT_PAGE_SIZE_MAX', '100'))
+CONTENT_UNPAGED_LIMIT = int(os.environ.get('CONTENT_UNPAGED_LIMIT', '1000'))
+
+# Same shape the old LEFT JOIN + array_agg produced: a school without courses had [null]
+def child_names(column: str, field: str) -> str:
+    return f"CASE WHEN cardinality(s.{column}) = 0 THEN ARRAY[NULL]::varchar[] ELSE s.{column} END AS {field}"
+
+# Every listing is read as "s"; course/service names are materialized on the row (V0047), so each listing is one table
+LISTINGS = {
+    'shops': {
+        'table': 'shops',
+        'columns': """s.id, s.name, s.description, s.category, s.image, s.rating,
+                      s.location as address, s.phone, s.phones, s.website, s.organization_id,
+                      s.is_open, s.working_hours, s.latitude, s.longitude, s.email, s.created_at""",
+        'where': 'TRUE'
+    },
+    'schools': {
+        'table': 'schools',
+        'columns': f"s.*, {child_names('course_names', 'courses')}",
+        'where': 'TRUE'
+    },
+    'services': {
+        'table': 'services',
+        'columns': f"s.*, {child_names('service_names', 'services')}",
+        'where': 'TRUE'
+    },
+    'announcements': {
+        'table': 'announcements',
+        'columns': 's.*',
+        'where': "s.status = 'active'"
+    }
+}
+
+# external_id is the importer's sync key (V0048), not something the public listing should expose
+HIDDEN_COLUMNS = ('search_vector', 'search_rank', 'course_names', 'service_names', 'external_id')
+
+class InvalidCursor(Exception):
+    pass
+
+def build_tsquery(search: str) -> Optional[str]:
+    """'мотошкола тюм' -> 'мотошкола:* & тюм:*' so half-typed words still match, as ILIKE did"""
+    terms = re.findall(r'\w+', search.lower())[:MAX_SEARCH_TERMS]
+    return ' & '.join(f"{term}:*" for term in terms) or None
+
+def public_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    item = dict(row)
+    for column in HIDDEN_COLUMNS:
+        item.pop(column, None)
+    return item
+
+def encode_cursor(row: Dict[str, Any], ranked: bool) -> str:
+    position = {'c': row['created_at'].isoformat() if row['created_at'] else None, 'i': row['id']}
+    if ranked:
+        position['r'] = row['search_rank']
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(token: str, ranked: bool) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        cursor = {'cursor_created_at': position['c'], 'cursor_id': int(position['i'])}
+        if ranked:
+            cursor['cursor_rank'] = float(position['r'])
+        return cursor
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+def page_size(limit: Optional[str]) -> int:
+    if not limit:
+        return CONTENT_PAGE_SIZE
+    return max(1, min(int(limit), CONTENT_PAGE_SIZE_MAX))
+
+def fetch_listing(cur, content_type: str, category: Optional[str], search: Optional[str],
+                  cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page in (rank,) created_at, id order; the keyset predicate makes page N as cheap as page 1"""
+    listing = LISTINGS[content_type]
+    tsquery = build_tsquery(search) if search else None
+    params: Dict[str, Any] = {'limit': limit + 1}
+    conditions = [listing['where']]
+    order = ['s.created_at DESC', 's.id DESC']
+    columns = listing['columns']
+
+    if category and category != 'Все':
+        conditions.append('s.category = %(category)s')
+        params['category'] = category
+
+    if tsquery:
+        params['tsquery'] = tsquery
+        rank = f"ts_rank_cd(s.search_vector, to_tsquery('{SEARCH_CONFIG}', %(tsquery)s))"
+        conditions.append(f"s.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)")
+        columns += f", {rank} AS search_rank"
+        order.insert(0, 'search_rank DESC')
+
+    if cursor:
+        params.update(decode_cursor(cursor, bool(tsquery)))
+        if tsquery:
+            conditions.append(f"({rank}, s.created_at, s.id) < (%(cursor_rank)s::real, %(cursor_created_at)s, %(cursor_id)s)")
+        else:
+            conditions.append('(s.created_at, s.id) < (%(cursor_created_at)s, %(cursor_id)s)')
+
+    query = f"""
+        SELECT {columns}
+        FROM {listing['table']} s
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {', '.join(order)}
+        LIMIT %(limit)s
+    """
+
+    cur.execute(query, params)
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], bool(tsquery))
+    return rows, next_cursor
+
+def fetch_facets(cur, content_type: str, search: Optional[str]) -> Dict[str, Any]:
+    """Category counts under the current search in one grouped query; the category filter itself is not applied, so every chip keeps its count"""
+    listing = LISTINGS[content_type]
+    tsquery = build_tsquery(search) if search else None
+    params: Dict[str, Any] = {}
+    conditions = [listing['where']]
+
+    if tsquery:
+        params['tsquery'] = tsquery
+        conditions.append(f"s.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)")
+
+    cur.execute(f"""
+        SELECT s.category AS value, count(*) AS count
+        FROM {listing['table']} s
+        WHERE {' AND '.join(conditions)}
+        GROUP BY s.category
+        ORDER BY count(*) DESC, s.category
+    """, params)
+    category = [{'value': row['value'], 'count': row['count']} for row in cur.fetchall()]
+    return {'total': sum(item['count'] for item in category), 'facets': {'category': category}}
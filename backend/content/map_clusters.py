@@ -0,0 +1,104 @@
+'''
+Business: Кластеры маркеров карты магазинов на сервере: количество и центроид по ячейкам сетки для видимой области и зума
+Args: курсор БД, bbox "west,south,east,north" в градусах и зум карты
+Returns: fetch_clusters -> {zoom, clustered, markers}; на крупных зумах вместо кластеров отдаются сами магазины
+'''
+
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from nearby import GEO_POINT
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+# Must match shop_cluster_zooms() in V0045; the grid at zoom z is the tile grid of zoom z + MAP_CLUSTER_CELL_SHIFT
+MAP_CLUSTER_MIN_ZOOM = 3
+MAP_CLUSTER_MAX_ZOOM = 15
+MAP_CLUSTER_CELL_SHIFT = 2
+MAX_LATITUDE = 85.05112878
+
+MAP_MARKERS_MAX = int(os.environ.get('MAP_MARKERS_MAX', '2000'))
+
+def parse_bbox(value: Optional[str]) -> Tuple[float, float, float, float]:
+    try:
+        west, south, east, north = (float(part) for part in (value or '').split(','))
+    except ValueError:
+        raise ValueError('bbox must be "west,south,east,north"')
+    if not all(map(math.isfinite, (west, south, east, north))):
+        raise ValueError('bbox must be "west,south,east,north"')
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError('bbox out of range')
+    return west, south, east, north
+
+def parse_zoom(value: Optional[str]) -> int:
+    zoom = int(value) if value else MAP_CLUSTER_MIN_ZOOM
+    if not 0 <= zoom <= 22:
+        raise ValueError('zoom must be between 0 and 22')
+    return zoom
+
+def cell_x(lng: float, level: int) -> int:
+    n = 2 ** level
+    return min(max(math.floor((lng + 180) / 360 * n), 0), n - 1)
+
+def cell_y(lat: float, level: int) -> int:
+    """Same formula as map_cluster_cell() in V0045; y grows southwards"""
+    n = 2 ** level
+    lat = math.radians(min(max(lat, -MAX_LATITUDE), MAX_LATITUDE))
+    return min(max(math.floor((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n), 0), n - 1)
+
+def longitude_ranges(west: float, east: float) -> List[Tuple[float, float]]:
+    """A viewport across the antimeridian (west > east) is two ranges"""
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+def fetch_clusters(cur, bbox: Tuple[float, float, float, float], zoom: int) -> Dict[str, Any]:
+    west, south, east, north = bbox
+    if zoom > MAP_CLUSTER_MAX_ZOOM:
+        return {'zoom': zoom, 'clustered': False, 'markers': fetch_markers(cur, bbox)}
+
+    grid_zoom = max(zoom, MAP_CLUSTER_MIN_ZOOM)
+    level = grid_zoom + MAP_CLUSTER_CELL_SHIFT
+    params: Dict[str, Any] = {'zoom': grid_zoom, 'min_y': cell_y(north, level), 'max_y': cell_y(south, level)}
+    ranges = []
+    for index, (range_west, range_east) in enumerate(longitude_ranges(west, east)):
+        params[f'min_x{index}'] = cell_x(range_west, level)
+        params[f'max_x{index}'] = cell_x(range_east, level)
+        ranges.append(f"c.cell_x BETWEEN %(min_x{index})s AND %(max_x{index})s")
+
+    # Primary key range scan: (zoom, cell_x, cell_y)
+    cur.execute(f"""
+        SELECT c.shop_count, c.lat_sum / c.shop_count AS lat, c.lng_sum / c.shop_count AS lng
+        FROM {SCHEMA}.shop_map_clusters c
+        WHERE c.zoom = %(zoom)s AND c.shop_count > 0
+          AND ({' OR '.join(ranges)})
+          AND c.cell_y BETWEEN %(min_y)s AND %(max_y)s
+    """, params)
+    markers = [
+        {'lat': round(row['lat'], 6), 'lng': round(row['lng'], 6), 'count': row['shop_count']}
+        for row in cur.fetchall()
+    ]
+    return {'zoom': grid_zoom, 'clustered': True, 'markers': markers}
+
+def fetch_markers(cur, bbox: Tuple[float, float, float, float]) -> List[Dict[str, Any]]:
+    """Street-level zooms: individual shops through the GiST point index from V0044"""
+    west, south, east, north = bbox
+    params: Dict[str, Any] = {'south': south, 'north': north, 'limit': MAP_MARKERS_MAX}
+    boxes = []
+    for index, (range_west, range_east) in enumerate(longitude_ranges(west, east)):
+        params[f'west{index}'] = range_west
+        params[f'east{index}'] = range_east
+        boxes.append(f"{GEO_POINT} <@ box(point(%(west{index})s, %(south)s), point(%(east{index})s, %(north)s))")
+
+    cur.execute(f"""
+        SELECT s.id, s.name, s.category, s.latitude::float8 AS lat, s.longitude::float8 AS lng
+        FROM shops s
+        WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL AND ({' OR '.join(boxes)})
+        ORDER BY s.id
+        LIMIT %(limit)s
+    """, params)
+    return [
+        {'id': row['id'], 'name': row['name'], 'category': row['category'],
+         'lat': row['lat'], 'lng': row['lng'], 'count': 1}
+        for row in cur.fetchall()
+    ]
@@ -0,0 +1,95 @@
+'''
+Business: Режим "рядом со мной" для магазинов и сервисов: точки в радиусе от пользователя, отсортированные по расстоянию
+Args: курсор БД, тип контента, широта и долгота пользователя, радиус в км, категория, поисковая строка и размер выдачи
+Returns: fetch_nearby -> строки с distance_km, ближайшие первыми
+'''
+
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from listings import LISTINGS, SEARCH_CONFIG, build_tsquery
+
+EARTH_RADIUS_KM = 6371.0
+
+NEARBY_RADIUS_KM = float(os.environ.get('NEARBY_RADIUS_KM', '10'))
+NEARBY_RADIUS_MAX_KM = float(os.environ.get('NEARBY_RADIUS_MAX_KM', '100'))
+
+NEARBY_TYPES = ('shops', 'services')
+
+# Must stay identical to the expression of idx_shops_geo_point / idx_services_geo_point (V0044)
+GEO_POINT = 'point(s.longitude::float8, s.latitude::float8)'
+
+HAVERSINE_KM = f"""(2 * {EARTH_RADIUS_KM} * asin(sqrt(
+    power(sin(radians(s.latitude::float8 - %(lat)s) / 2), 2) +
+    cos(radians(%(lat)s)) * cos(radians(s.latitude::float8)) *
+    power(sin(radians(s.longitude::float8 - %(lng)s) / 2), 2)
+)))"""
+
+def parse_point(lat: Optional[str], lng: Optional[str]) -> Tuple[float, float]:
+    try:
+        point = (float(lat), float(lng))
+    except (TypeError, ValueError):
+        raise ValueError('lat and lng must both be numbers')
+    if not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180) or not all(map(math.isfinite, point)):
+        raise ValueError('lat/lng out of range')
+    return point
+
+def parse_radius(radius: Optional[str]) -> float:
+    if not radius:
+        return NEARBY_RADIUS_KM
+    value = float(radius)
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError('radius must be a positive number of kilometers')
+    return min(value, NEARBY_RADIUS_MAX_KM)
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Dict[str, float]:
+    """Smallest lat/lng rectangle containing the circle, so the index pre-filter never drops a point inside the radius"""
+    angular = radius_km / EARTH_RADIUS_KM
+    delta_lat = math.degrees(angular)
+    min_lat, max_lat = max(lat - delta_lat, -90.0), min(lat + delta_lat, 90.0)
+
+    spread = math.sin(angular) / max(math.cos(math.radians(lat)), 1e-12)
+    if spread >= 1 or min_lat == -90.0 or max_lat == 90.0:
+        return {'min_lat': min_lat, 'max_lat': max_lat, 'min_lng': -180.0, 'max_lng': 180.0}
+
+    delta_lng = math.degrees(math.asin(spread))
+    if lng - delta_lng < -180 or lng + delta_lng > 180:
+        # Crossing the antimeridian: take the full longitude band, the exact distance filter trims it
+        return {'min_lat': min_lat, 'max_lat': max_lat, 'min_lng': -180.0, 'max_lng': 180.0}
+    return {'min_lat': min_lat, 'max_lat': max_lat, 'min_lng': lng - delta_lng, 'max_lng': lng + delta_lng}
+
+def fetch_nearby(cur, content_type: str, lat: float, lng: float, radius_km: float,
+                 category: Optional[str], search: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """GiST box lookup first, exact haversine only for the rows inside the box; search only filters, distance still orders"""
+    listing = LISTINGS[content_type]
+    tsquery = build_tsquery(search) if search else None
+    params: Dict[str, Any] = {'lat': lat, 'lng': lng, 'radius': radius_km, 'limit': limit,
+                              **bounding_box(lat, lng, radius_km)}
+    conditions = [
+        listing['where'],
+        's.latitude IS NOT NULL AND s.longitude IS NOT NULL',
+        f"{GEO_POINT} <@ box(point(%(min_lng)s, %(min_lat)s), point(%(max_lng)s, %(max_lat)s))",
+        f"{HAVERSINE_KM} <= %(radius)s"
+    ]
+    order = ['distance_km', 's.id']
+
+    if category and category != 'Все':
+        conditions.append('s.category = %(category)s')
+        params['category'] = category
+
+    if tsquery:
+        params['tsquery'] = tsquery
+        conditions.append(f"s.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)")
+
+    query = f"""
+        SELECT {listing['columns']}, {HAVERSINE_KM} AS distance_km
+        FROM {listing['table']} s
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {', '.join(order)}
+        LIMIT %(limit)s
+    """
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    for row in rows:
+        row['distance_km'] = round(float(row['distance_km']), 3)
+    return rows
@@ -0,0 +1,111 @@
+'''
+Business: Кэш готовых JSON-ответов листингов content между тёплыми вызовами, с версией на тип контента из content_versions
+Args: CONTENT_CACHE_MAX_SIZE, CONTENT_CACHE_TTL, CONTENT_VERSION_TTL из окружения
+Returns: get/put ответа по ключу (тип, версия, параметры), сброс версии после записи, счётчики попаданий и замена хранилища
+'''
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CONTENT_CACHE_MAX_SIZE = int(os.environ.get('CONTENT_CACHE_MAX_SIZE', '512'))
+CONTENT_CACHE_TTL = float(os.environ.get('CONTENT_CACHE_TTL', '300'))
+CONTENT_VERSION_TTL = float(os.environ.get('CONTENT_VERSION_TTL', '2'))
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+class MemoryCacheBackend:
+    """In-process TTL+LRU store; anything with the same get/set/clear/size methods (e.g. a Redis wrapper) can replace it"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def size(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+_backend = MemoryCacheBackend(CONTENT_CACHE_MAX_SIZE)
+_versions: Dict[str, Tuple[float, int]] = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'version_reads': 0, 'invalidations': 0}
+
+def set_cache_backend(backend: Any) -> None:
+    """Swap the response store, e.g. for an external cache shared by all containers"""
+    global _backend
+    _backend = backend
+
+def content_version(cur, content_type: str, fresh: bool = False) -> int:
+    """Version of a listing type; re-read from the database at most every CONTENT_VERSION_TTL seconds.
+    The local copy may lag other containers' writes by up to that TTL, so fresh=True is used right before reading the rows themselves"""
+    now = time.monotonic()
+    with _lock:
+        cached = _versions.get(content_type)
+        if cached and cached[0] > now and not fresh:
+            return cached[1]
+
+    cur.execute(f"SELECT version FROM {SCHEMA}.content_versions WHERE content_type = %s", (content_type,))
+    row = cur.fetchone()
+    version = int(row['version']) if row else 0
+    with _lock:
+        _versions[content_type] = (now + CONTENT_VERSION_TTL, version)
+        _stats['version_reads'] += 1
+    return version
+
+def invalidate_content_version(content_type: str) -> None:
+    """Forget the local version after a write so this container sees the trigger's bump on the next read"""
+    with _lock:
+        if _versions.pop(content_type, None) is not None:
+            _stats['invalidations'] += 1
+
+def cache_key(content_type: str, version: int, **params: Any) -> str:
+    return json.dumps([content_type, version, params], sort_keys=True, ensure_ascii=False)
+
+def get_cached_response(key: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """(body, response headers that belong to the body) or None"""
+    entry = _backend.get(key)
+    with _lock:
+        _stats['hits' if entry is not None else 'misses'] += 1
+    return entry
+
+def cache_response(key: str, body: str, headers: Optional[Dict[str, str]] = None) -> None:
+    _backend.set(key, (body, headers or {}), CONTENT_CACHE_TTL)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters plus current size"""
+    with _lock:
+        total = _stats['hits'] + _stats['misses']
+        stats = {
+            **_stats,
+            'hit_ratio': round(_stats['hits'] / total, 4) if total else 0.0
+        }
+    stats['size'] = _backend.size()
+    return stats
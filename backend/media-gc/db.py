@@ -0,0 +1,72 @@
+'''
+Business: Пул соединений с Postgres, переживающий тёплые вызовы функции
+Args: DATABASE_URL, DB_POOL_MAX_SIZE, DB_POOL_PING_AFTER из окружения
+Returns: get_db_connection / release_db_connection для обработчиков
+'''
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+_released_at: Dict[int, float] = {}
+
+def _get_pool() -> pg_pool.ThreadedConnectionPool:
+    """Create the module-level pool once per container"""
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                _pool = pg_pool.ThreadedConnectionPool(0, DB_POOL_MAX_SIZE, os.environ.get('DATABASE_URL'))
+    return _pool
+
+def _is_healthy(conn) -> bool:
+    """Cheap state check, plus SELECT 1 for connections idle longer than DB_POOL_PING_AFTER"""
+    if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    released_at = _released_at.get(id(conn))
+    if released_at is None or time.monotonic() - released_at < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error as e:
+        print(f"[DB POOL] Dropping stale connection: {e}")
+        return False
+
+def get_db_connection(cursor_factory: Any = None):
+    """Borrow a healthy connection from the pool; pair every call with release_db_connection"""
+    pool = _get_pool()
+    for _ in range(DB_POOL_MAX_SIZE + 1):
+        conn = pool.getconn()
+        if _is_healthy(conn):
+            conn.cursor_factory = cursor_factory
+            return conn
+        _released_at.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_db_connection(conn) -> None:
+    """Return a connection to the pool, rolling back any open transaction"""
+    broken = bool(conn.closed)
+    if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    if broken:
+        _released_at.pop(id(conn), None)
+    else:
+        _released_at[id(conn)] = time.monotonic()
+    _get_pool().putconn(conn, close=broken)
@@ -0,0 +1,291 @@
+"""
+Business: Batch garbage collector deleting bucket objects no longer referenced by avatars, garage photos, products, shops and other catalog images
+Args: event from a timer trigger or HTTP call with header X-Media-Gc-Secret, body {"dryRun": true|false, "prefix": "garage/", "limit": N}; context with request_id
+Returns: HTTP response with a report of scanned, live, orphaned and deleted objects and aborted stale multipart uploads
+"""
+import hmac
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set
+from urllib.parse import unquote
+from botocore.exceptions import ClientError
+from db import get_db_connection, release_db_connection
+from storage import get_s3_client, get_bucket_name
+from variants import VARIANT_SPECS, variant_key
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+MEDIA_GC_GRACE_DAYS = int(os.environ.get('MEDIA_GC_GRACE_DAYS', '7'))
+MEDIA_GC_MAX_DELETES = int(os.environ.get('MEDIA_GC_MAX_DELETES', '1000'))
+# Well above MULTIPART_SIGN_EXPIRES_IN: an upload untouched this long holds no valid part URLs anymore
+MULTIPART_STALE_HOURS = int(os.environ.get('MULTIPART_STALE_HOURS', '24'))
+MULTIPART_ABORT_BATCH = int(os.environ.get('MULTIPART_ABORT_BATCH', '200'))
+DELETE_BATCH_SIZE = 1000
+REPORT_SAMPLE_SIZE = 50
+
+# Every column that may hold a bucket URL; user_vehicles.photo_url is a JSON array, the rest are plain URLs
+REFERENCE_COLUMNS = [
+    ('user_profiles', 'avatar_url'),
+    ('user_vehicles', 'photo_url'),
+    ('products', 'image_url'),
+    ('shops', 'image'),
+    ('schools', 'image'),
+    ('services', 'image'),
+    ('announcements', 'image'),
+    ('organizations', 'logo'),
+    ('organizations', 'cover_image'),
+    ('badges', 'image_url')
+]
+
+def reference_pattern(bucket_name: str) -> re.Pattern:
+    """Match keys in both path-style (host/bucket/key) and virtual-host (bucket.host/key) URLs"""
+    bucket = re.escape(bucket_name)
+    key = r'([^\s"\'<>?#,\]]+)'
+    return re.compile(rf'(?://{bucket}\.[^/\s"\']+|/{bucket})/{key}')
+
+def load_live_keys(conn, bucket_name: str) -> Set[str]:
+    """Stream every referencing value through a server-side cursor and collect the keys plus their variants"""
+    pattern = reference_pattern(bucket_name)
+    query = ' UNION ALL '.join(
+        f"SELECT {column}::text FROM {SCHEMA}.{table} WHERE {column} IS NOT NULL AND {column}::text <> ''"
+        for table, column in REFERENCE_COLUMNS
+    )
+
+    live: Set[str] = set()
+    cur = conn.cursor('media_gc_references')
+    cur.itersize = 5000
+    try:
+        cur.execute(query)
+        for (value,) in cur:
+            for match in pattern.finditer(value):
+                live.add(unquote(match.group(1)))
+    finally:
+        cur.close()
+
+    for key in list(live):
+        for name in VARIANT_SPECS:
+            live.add(variant_key(key, name))
+    return live
+
+# A deduplicated re-upload only touches the media_objects row, never the old blob's LastModified.
+# ref_count is not consulted: nothing lowers it, so it would keep every abandoned upload forever
+PROTECTED_MEDIA_SQL = f"""
+    SELECT object_key FROM {SCHEMA}.media_objects
+    WHERE last_referenced_at >= CURRENT_TIMESTAMP - make_interval(days => %(grace_days)s)
+"""
+
+def load_protected_keys(conn, keys: Optional[List[str]] = None) -> Set[str]:
+    """Content-addressed blobs (re-)uploaded within the grace period, plus their variants; rows in use are covered by load_live_keys"""
+    query = PROTECTED_MEDIA_SQL + (' AND object_key = ANY(%(keys)s)' if keys is not None else '')
+    cur = conn.cursor()
+    cur.execute(query, {'grace_days': MEDIA_GC_GRACE_DAYS, 'keys': keys})
+    protected = {row[0] for row in cur.fetchall()}
+    cur.close()
+    for key in list(protected):
+        for name in VARIANT_SPECS:
+            protected.add(variant_key(key, name))
+    return protected
+
+def list_bucket(prefix: str) -> Iterator[Dict[str, Any]]:
+    paginator = get_s3_client().get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=prefix):
+        yield from page.get('Contents', [])
+
+def find_orphans(objects: Iterable[Dict[str, Any]], live: Set[str], protected: Set[str], limit: int) -> Dict[str, Any]:
+    """Walk the bucket listing; only unprotected objects older than the grace period can be orphans"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=MEDIA_GC_GRACE_DAYS)
+
+    scanned = 0
+    orphans: List[str] = []
+    orphan_bytes = 0
+    for obj in objects:
+        scanned += 1
+        if obj['Key'] in live or obj['Key'] in protected or obj['LastModified'] > cutoff:
+            continue
+        orphans.append(obj['Key'])
+        orphan_bytes += obj['Size']
+        if len(orphans) >= limit:
+            return {'scanned': scanned, 'orphans': orphans, 'orphanBytes': orphan_bytes, 'truncated': True}
+
+    return {'scanned': scanned, 'orphans': orphans, 'orphanBytes': orphan_bytes, 'truncated': False}
+
+def delete_objects(conn, keys: List[str]) -> int:
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+    deleted = 0
+
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        # An upload may have re-referenced a blob since the scan: check the batch again right before deleting
+        recent = load_protected_keys(conn, keys[start:start + DELETE_BATCH_SIZE])
+        batch = [key for key in keys[start:start + DELETE_BATCH_SIZE] if key not in recent]
+        if not batch:
+            continue
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        for error in response.get('Errors', []):
+            print(f"[MEDIA GC ERROR] {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        failed = {error.get('Key') for error in response.get('Errors', [])}
+        removed = [key for key in batch if key not in failed]
+        deleted += len(removed)
+
+        # Forget deleted blobs so dedup and the variant queue never point at missing objects
+        cur = conn.cursor()
+        cur.execute(f"DELETE FROM {SCHEMA}.media_objects WHERE object_key = ANY(%s)", (removed,))
+        cur.execute(f"DELETE FROM {SCHEMA}.media_variant_jobs WHERE object_key = ANY(%s)", (removed,))
+        cur.close()
+        conn.commit()
+
+    return deleted
+
+def abort_stale_uploads(conn, dry_run: bool) -> Dict[str, Any]:
+    """Abort multipart uploads nobody touched for MULTIPART_STALE_HOURS: their parts are billed but never listed as objects"""
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT upload_id, object_key FROM {SCHEMA}.media_multipart_uploads
+        WHERE status = 'uploading' AND updated_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+        ORDER BY updated_at
+        LIMIT %s
+        """,
+        (MULTIPART_STALE_HOURS, MULTIPART_ABORT_BATCH)
+    )
+    stale = cur.fetchall()
+    conn.commit()
+    if dry_run:
+        cur.close()
+        return {'stale': len(stale), 'aborted': 0}
+
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+    aborted = 0
+    for upload_id, object_key in stale:
+        try:
+            s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_key, UploadId=upload_id)
+        except ClientError as e:
+            # Already aborted or completed on the bucket side: only the row is left to close
+            if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                print(f"[MEDIA GC ERROR] abort {upload_id}: {str(e)}")
+                continue
+        cur.execute(f"DELETE FROM {SCHEMA}.media_multipart_parts WHERE upload_id = %s", (upload_id,))
+        cur.execute(
+            f"""
+            UPDATE {SCHEMA}.media_multipart_uploads SET status = 'aborted', updated_at = CURRENT_TIMESTAMP
+            WHERE upload_id = %s AND status = 'uploading'
+            """,
+            (upload_id,)
+        )
+        conn.commit()
+        aborted += 1
+    cur.close()
+    return {'stale': len(stale), 'aborted': aborted}
+
+def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
+    name_lower = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name_lower:
+            return value
+    return None
+
+def access_error(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Timer invocations carry no httpMethod; every HTTP call must present MEDIA_GC_SECRET"""
+    if 'httpMethod' not in event:
+        return None
+    secret = os.environ.get('MEDIA_GC_SECRET')
+    if not secret:
+        print("[MEDIA GC ERROR] MEDIA_GC_SECRET not set, rejecting HTTP call")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'MEDIA_GC_SECRET not set'}),
+            'isBase64Encoded': False
+        }
+    if not hmac.compare_digest(get_header(event.get('headers') or {}, 'X-Media-Gc-Secret') or '', secret):
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid secret'}),
+            'isBase64Encoded': False
+        }
+    return None
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    # Deletes objects and rows and lists object keys even on a dry run, so nobody else gets in
+    denied = access_error(event)
+    if denied:
+        return denied
+
+    body_str = event.get('body') or '{}'
+    body = json.loads(body_str) if body_str.strip() else {}
+    dry_run = body.get('dryRun', True) is not False
+    prefix = body.get('prefix') or ''
+    limit = min(int(body.get('limit') or MEDIA_GC_MAX_DELETES), MEDIA_GC_MAX_DELETES)
+
+    try:
+        conn = get_db_connection()
+        bucket_name = get_bucket_name()
+
+        live = load_live_keys(conn, bucket_name)
+        conn.commit()
+        if not live:
+            raise Exception('No live references found, refusing to collect garbage')
+
+        protected = load_protected_keys(conn)
+        conn.commit()
+        found = find_orphans(list_bucket(prefix), live, protected, limit)
+        deleted = 0 if dry_run else delete_objects(conn, found['orphans'])
+
+        uploads = abort_stale_uploads(conn, dry_run)
+
+        report = {
+            'dryRun': dry_run,
+            'graceDays': MEDIA_GC_GRACE_DAYS,
+            'liveReferences': len(live),
+            'protectedMedia': len(protected),
+            'scanned': found['scanned'],
+            'orphaned': len(found['orphans']),
+            'orphanedBytes': found['orphanBytes'],
+            'truncated': found['truncated'],
+            'deleted': deleted,
+            'sample': found['orphans'][:REPORT_SAMPLE_SIZE],
+            'staleMultipartUploads': uploads['stale'],
+            'abortedMultipartUploads': uploads['aborted']
+        }
+        print(f"[MEDIA GC] dryRun={dry_run} scanned={found['scanned']} orphaned={len(found['orphans'])} deleted={deleted} abortedUploads={uploads['aborted']}")
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(report),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        print(f"[MEDIA GC ERROR] {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,165 @@
+"""
+Business: Background worker building WebP thumbnails and resized variants for uploaded images from the media_variant_jobs queue
+Args: event from a timer trigger or HTTP call, optional body {"limit": N}; context with request_id
+Returns: HTTP response with claimed/built/failed counts
+"""
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from PIL import Image, ImageOps
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from storage import get_s3_client, get_bucket_name
+from variants import VARIANT_SPECS, variant_key
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+MEDIA_VARIANTS_BATCH_SIZE = int(os.environ.get('MEDIA_VARIANTS_BATCH_SIZE', '10'))
+MEDIA_VARIANTS_WORKERS = int(os.environ.get('MEDIA_VARIANTS_WORKERS', '4'))
+MEDIA_VARIANTS_MAX_ATTEMPTS = int(os.environ.get('MEDIA_VARIANTS_MAX_ATTEMPTS', '5'))
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', '80'))
+MAX_SOURCE_PIXELS = 50_000_000
+
+Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+
+def claim_jobs(cur, limit: int) -> List[Dict[str, Any]]:
+    """Take due jobs (and ones stuck in processing) so parallel workers never pick the same object"""
+    cur.execute(
+        f"""
+        UPDATE {SCHEMA}.media_variant_jobs
+        SET status = 'processing', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE object_key IN (
+            SELECT object_key FROM {SCHEMA}.media_variant_jobs
+            WHERE (status = 'pending' AND available_at <= CURRENT_TIMESTAMP)
+               OR (status = 'processing' AND updated_at < CURRENT_TIMESTAMP - INTERVAL '10 minutes')
+            ORDER BY available_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING object_key, attempts
+        """,
+        (limit,)
+    )
+    return cur.fetchall()
+
+def render_variant(source: Image.Image, max_side: int) -> bytes:
+    image = source.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+def build_variants(object_key: str) -> Optional[str]:
+    """Download one original and upload every variant; returns an error message or None"""
+    try:
+        s3_client = get_s3_client()
+        bucket_name = get_bucket_name()
+        original = s3_client.get_object(Bucket=bucket_name, Key=object_key)['Body'].read()
+
+        with Image.open(io.BytesIO(original)) as opened:
+            source = ImageOps.exif_transpose(opened)
+            source = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        for name, max_side in VARIANT_SPECS.items():
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=variant_key(object_key, name),
+                Body=render_variant(source, max_side),
+                ContentType='image/webp',
+                CacheControl='public, max-age=31536000, immutable',
+                ACL='public-read'
+            )
+        return None
+    except Exception as e:
+        return str(e)
+
+def finish_job(cur, object_key: str, error: Optional[str]) -> None:
+    """Mark done, or reschedule with linear backoff"""
+    if error is None:
+        cur.execute(
+            f"UPDATE {SCHEMA}.media_variant_jobs SET status = 'done', last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE object_key = %s AND status = 'processing'",
+            (object_key,)
+        )
+        return
+
+    cur.execute(
+        f"""
+        UPDATE {SCHEMA}.media_variant_jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+            available_at = CURRENT_TIMESTAMP + attempts * INTERVAL '1 minute',
+            last_error = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE object_key = %s AND status = 'processing'
+        """,
+        (MEDIA_VARIANTS_MAX_ATTEMPTS, error[:500], object_key)
+    )
+
+def process_batch(conn, cur, limit: int) -> Dict[str, int]:
+    jobs = claim_jobs(cur, limit)
+    conn.commit()
+    result = {'claimed': len(jobs), 'built': 0, 'failed': 0}
+    if not jobs:
+        return result
+
+    with ThreadPoolExecutor(max_workers=MEDIA_VARIANTS_WORKERS) as executor:
+        errors = list(executor.map(lambda job: build_variants(job['object_key']), jobs))
+
+    for job, error in zip(jobs, errors):
+        if error is None:
+            result['built'] += 1
+        else:
+            print(f"[MEDIA VARIANTS ERROR] {job['object_key']}: {error}")
+            result['failed'] += 1
+        finish_job(cur, job['object_key'], error)
+    conn.commit()
+
+    return result
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    body_str = event.get('body') or '{}'
+    body = json.loads(body_str) if body_str.strip() else {}
+    limit = min(int(body.get('limit') or MEDIA_VARIANTS_BATCH_SIZE), 50)
+
+    try:
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
+
+        result = process_batch(conn, cur, limit)
+        print(f"[MEDIA VARIANTS] {result}")
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        print(f"[MEDIA VARIANTS ERROR] {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -6,16 +6,12 @@ Returns: HTTP response with success status
 import json
 import os
 from typing import Dict, Any, List
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
 import requests
 
 SCHEMA = 't_p21120869_mototumen_community_'
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
-
 def get_ceo_telegram_ids(cur) -> List[int]:
     cur.execute(
         f"SELECT telegram_id FROM {SCHEMA}.users WHERE role = 'ceo' AND telegram_id IS NOT NULL"
@@ -55,7 +51,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(RealDictCursor)
         cur = conn.cursor()
         
         body = json.loads(event.get('body', '{}'))
@@ -126,3 +122,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
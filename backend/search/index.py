@@ -0,0 +1,174 @@
+'''
+Business: Глобальный поиск по магазинам, школам, сервисам, объявлениям, товарам и райдерам одним запросом с бюджетом по времени
+Args: event с httpMethod, queryStringParameters {q, limit, perType} или {suggest, limit} для автодополнения; context с request_id
+Returns: HTTP response {query, results, counts, timedOut, failed} и Server-Timing; результаты слиты по релевантности, медленные источники отменяются
+'''
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from http_cache import etag_for_body, cached_response
+from sources import SOURCES
+from suggest import fetch_suggestions
+
+SEARCH_BUDGET_MS = int(os.environ.get('SEARCH_BUDGET_MS', '800'))
+SEARCH_PER_TYPE_LIMIT = int(os.environ.get('SEARCH_PER_TYPE_LIMIT', '5'))
+SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT', '20'))
+SEARCH_MIN_QUERY_LENGTH = 2
+SEARCH_CACHE_CONTROL = 'public, max-age=30'
+SUGGEST_LIMIT = int(os.environ.get('SUGGEST_LIMIT', '8'))
+SUGGEST_CACHE_CONTROL = 'public, max-age=60'
+
+# One worker and one pooled connection per source (DB_POOL_MAX_SIZE defaults to 4)
+_executor = ThreadPoolExecutor(max_workers=len(SOURCES), thread_name_prefix='search')
+
+class SourceRun:
+    """A running source query; cancel() aborts it on the server only while it still holds its connection"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def run(self, search: str, per_type: int, budget_ms: int) -> List[Dict[str, Any]]:
+        conn = get_db_connection(RealDictCursor)
+        with self.lock:
+            self.conn = conn
+        try:
+            cur = conn.cursor()
+            # The server gives up on its own even if the handler is gone by then
+            cur.execute("SET LOCAL statement_timeout = %s", (max(budget_ms, 1),))
+            rows = SOURCES[self.name](cur, search, per_type)
+            cur.close()
+            return rows
+        finally:
+            with self.lock:
+                self.conn = None
+            release_db_connection(conn)
+
+    def cancel(self) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.cancel()
+
+def merge_results(rows: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Ranks from different sources aren't comparable, so each type's scores are scaled to its own best hit before interleaving"""
+    best: Dict[str, float] = {}
+    for row in rows:
+        best[row['type']] = max(best.get(row['type'], 0.0), float(row['score']))
+    for position, row in enumerate(rows):
+        top = best[row['type']]
+        row['score'] = round(float(row['score']) / top, 4) if top > 0 else 0.0
+        row['position'] = position
+    merged = sorted(rows, key=lambda row: (-row['score'], row['position']))[:limit]
+    for row in merged:
+        row.pop('position')
+    return merged
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    query_params = event.get('queryStringParameters') or {}
+    search = (query_params.get('q') or '').strip()
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    
+    if 'suggest' in query_params:
+        # ?suggest=мот[&limit=8] -> name completions for the search box while typing
+        try:
+            limit = max(1, min(int(query_params.get('limit') or SUGGEST_LIMIT), 20))
+        except ValueError:
+            limit = SUGGEST_LIMIT
+        try:
+            conn = get_db_connection(RealDictCursor)
+            cur = conn.cursor()
+            suggestions = fetch_suggestions(cur, query_params.get('suggest') or '', limit)
+            body = json.dumps({'suggestions': suggestions}, ensure_ascii=False)
+            return cached_response(event, etag_for_body(body), SUGGEST_CACHE_CONTROL, headers, body)
+        except Exception as e:
+            print(f"[SEARCH ERROR] suggest: {str(e)}")
+            return {
+                'statusCode': 500,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        finally:
+            if 'cur' in locals():
+                cur.close()
+            if 'conn' in locals():
+                release_db_connection(conn)
+
+    if len(search) < SEARCH_MIN_QUERY_LENGTH:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'q must be at least {SEARCH_MIN_QUERY_LENGTH} characters'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        per_type = max(1, min(int(query_params.get('perType') or SEARCH_PER_TYPE_LIMIT), 20))
+        limit = max(1, min(int(query_params.get('limit') or SEARCH_RESULTS_LIMIT), 50))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'limit and perType must be numbers'}),
+            'isBase64Encoded': False
+        }
+
+    started = time.monotonic()
+    runs = {name: SourceRun(name) for name in SOURCES}
+    futures = {_executor.submit(run.run, search, per_type, SEARCH_BUDGET_MS): name for name, run in runs.items()}
+    done, pending = wait(futures, timeout=SEARCH_BUDGET_MS / 1000)
+
+    rows: List[Dict[str, Any]] = []
+    timed_out: List[str] = []
+    failed: List[str] = []
+    for future in done:
+        try:
+            rows.extend(future.result())
+        except Exception as e:
+            # A source cancelled by statement_timeout right at the deadline lands here too
+            print(f"[SEARCH ERROR] {futures[future]}: {str(e)}")
+            failed.append(futures[future])
+    for future in pending:
+        runs[futures[future]].cancel()
+        timed_out.append(futures[future])
+
+    results = merge_results(rows, limit)
+    counts: Dict[str, int] = {}
+    for row in results:
+        counts[row['type']] = counts.get(row['type'], 0) + 1
+    took_ms = round((time.monotonic() - started) * 1000, 1)
+    print(f"[SEARCH] q={search!r} results={len(results)} timedOut={timed_out} failed={failed} tookMs={took_ms}")
+
+    payload = {
+        'query': search,
+        'results': results,
+        'counts': counts,
+        'timedOut': sorted(timed_out),
+        'failed': sorted(failed)
+    }
+    body = json.dumps(payload, default=str)
+    # Partial answers are not worth keeping around
+    cache_control = SEARCH_CACHE_CONTROL if not timed_out and not failed else 'no-store'
+    return cached_response(event, etag_for_body(body), cache_control, {**headers, 'Server-Timing': f'search;dur={took_ms}'}, body)
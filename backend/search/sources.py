@@ -0,0 +1,84 @@
+'''
+Business: Источники глобального поиска: каталог content (полнотекстовый индекс), товары ZM Store и публичные профили райдеров
+Args: курсор БД, поисковая строка и лимит на тип
+Returns: search_content / search_products / search_riders -> строки {type, id, title, subtitle, image, score}
+'''
+
+import re
+from typing import Dict, Any, List, Optional
+
+SCHEMA = 't_p21120869_mototumen_community_'
+SEARCH_CONFIG = 'russian'
+MAX_SEARCH_TERMS = 8
+
+def build_tsquery(search: str) -> Optional[str]:
+    """Same prefix query as content listings: 'мотошкола тюм' -> 'мотошкола:* & тюм:*'"""
+    terms = re.findall(r'\w+', search.lower())[:MAX_SEARCH_TERMS]
+    return ' & '.join(f"{term}:*" for term in terms) or None
+
+def like_pattern(search: str) -> str:
+    return search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# type -> (table, title column, subtitle column, extra condition); each branch is limited on its own so one type can't crowd out the rest
+CONTENT_SOURCES = {
+    'shops': ('shops', 'name', 'category', 'TRUE'),
+    'schools': ('schools', 'name', 'category', 'TRUE'),
+    'services': ('services', 'name', 'category', 'TRUE'),
+    'announcements': ('announcements', 'title', 'category', "status = 'active'")
+}
+
+def search_content(cur, search: str, per_type: int) -> List[Dict[str, Any]]:
+    """All four catalog types in one UNION ALL over the search_vector GIN indexes"""
+    tsquery = build_tsquery(search)
+    if not tsquery:
+        return []
+    branches = [
+        f"""(SELECT '{content_type}' AS type, id, {title} AS title, {subtitle} AS subtitle, image,
+                    ts_rank_cd(search_vector, to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)) AS score
+             FROM {SCHEMA}.{table}
+             WHERE {condition} AND search_vector @@ to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)
+             ORDER BY score DESC, created_at DESC
+             LIMIT %(per_type)s)"""
+        for content_type, (table, title, subtitle, condition) in CONTENT_SOURCES.items()
+    ]
+    cur.execute(' UNION ALL '.join(branches), {'tsquery': tsquery, 'per_type': per_type})
+    return [dict(row) for row in cur.fetchall()]
+
+def search_products(cur, search: str, per_type: int) -> List[Dict[str, Any]]:
+    """ZM Store products over their search_vector GIN index (V0050)"""
+    tsquery = build_tsquery(search)
+    if not tsquery:
+        return []
+    cur.execute(f"""
+        SELECT 'products' AS type, id, name AS title, concat_ws(' ', brand, model) AS subtitle, image_url AS image,
+               price, in_stock, ts_rank_cd(search_vector, to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)) AS score
+        FROM {SCHEMA}.products
+        WHERE search_vector @@ to_tsquery('{SEARCH_CONFIG}', %(tsquery)s)
+        ORDER BY score DESC, created_at DESC
+        LIMIT %(per_type)s
+    """, {'tsquery': tsquery, 'per_type': per_type})
+    return [dict(row) for row in cur.fetchall()]
+
+def search_riders(cur, search: str, per_type: int) -> List[Dict[str, Any]]:
+    """Public profiles only; an exact or prefix match on name/username ranks above a substring match.
+    The substring ILIKE is served by the pg_trgm indexes on users.name/username (V0050)"""
+    params = {'exact': search.lower(), 'prefix': like_pattern(search) + '%',
+              'contains': '%' + like_pattern(search) + '%', 'per_type': per_type}
+    cur.execute(f"""
+        SELECT 'riders' AS type, u.id, u.name AS title, u.username AS subtitle, p.avatar_url AS image,
+               CASE WHEN lower(u.name) = %(exact)s OR lower(u.username) = %(exact)s THEN 1.0
+                    WHEN u.name ILIKE %(prefix)s OR u.username ILIKE %(prefix)s THEN 0.8
+                    ELSE 0.5 END AS score
+        FROM {SCHEMA}.users u
+        JOIN {SCHEMA}.user_profiles p ON p.user_id = u.id
+        WHERE p.is_public = true AND (u.name ILIKE %(contains)s OR u.username ILIKE %(contains)s)
+        ORDER BY score DESC, u.created_at DESC
+        LIMIT %(per_type)s
+    """, params)
+    return [dict(row) for row in cur.fetchall()]
+
+SOURCES = {
+    'content': search_content,
+    'products': search_products,
+    'riders': search_riders
+}
@@ -0,0 +1,43 @@
+'''
+Business: Автодополнение названий магазинов, товаров и имён райдеров по началу строки
+Args: курсор БД, введённый префикс и число подсказок
+Returns: fetch_suggestions -> [{type, id, title}], короткие совпадения первыми
+'''
+
+from typing import Dict, Any, List
+from sources import SCHEMA, like_pattern
+
+SUGGEST_MAX_PREFIX_LENGTH = 64
+
+# Every branch is an ordered range scan of a V0046 text_pattern_ops index stopped after N rows;
+# USING ~<~ is that index's own ordering, a plain ORDER BY would sort every match under the database collation
+SUGGEST_BRANCHES = [
+    f"""(SELECT 'shops' AS type, id, name AS title FROM {SCHEMA}.shops
+         WHERE lower(name) LIKE %(prefix)s ORDER BY lower(name) USING ~<~ LIMIT %(limit)s)""",
+    f"""(SELECT 'products' AS type, id, name AS title FROM {SCHEMA}.products
+         WHERE lower(name) LIKE %(prefix)s ORDER BY lower(name) USING ~<~ LIMIT %(limit)s)""",
+    f"""(SELECT 'riders' AS type, u.id, u.name AS title FROM {SCHEMA}.users u
+         JOIN {SCHEMA}.user_profiles p ON p.user_id = u.id AND p.is_public = true
+         WHERE lower(u.name) LIKE %(prefix)s ORDER BY lower(u.name) USING ~<~ LIMIT %(limit)s)""",
+    f"""(SELECT 'riders' AS type, u.id, u.name AS title FROM {SCHEMA}.users u
+         JOIN {SCHEMA}.user_profiles p ON p.user_id = u.id AND p.is_public = true
+         WHERE lower(u.username) LIKE %(prefix)s ORDER BY lower(u.username) USING ~<~ LIMIT %(limit)s)"""
+]
+
+def fetch_suggestions(cur, prefix: str, limit: int) -> List[Dict[str, Any]]:
+    """One round trip for all sources; riders found by both name and username appear once"""
+    prefix = prefix.strip().lower()[:SUGGEST_MAX_PREFIX_LENGTH]
+    if not prefix:
+        return []
+    cur.execute(' UNION ALL '.join(SUGGEST_BRANCHES), {'prefix': like_pattern(prefix) + '%', 'limit': limit})
+
+    seen = set()
+    suggestions = []
+    for row in cur.fetchall():
+        if (row['type'], row['id']) in seen:
+            continue
+        seen.add((row['type'], row['id']))
+        suggestions.append({'type': row['type'], 'id': row['id'], 'title': row['title']})
+    # Closest completion first: "Мото" suggests "Мотоцентр" before "Мотоэкипировка Тюмень"
+    suggestions.sort(key=lambda item: (len(item['title'] or ''), (item['title'] or '').lower()))
+    return suggestions[:limit]
@@ -5,14 +5,9 @@ Returns: HTTP response с данными о продавцах/товарах и
 '''
 
 import json
-import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
-
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+from db import get_db_connection, release_db_connection
 
 def is_ceo(user_id: int, conn) -> bool:
     with conn.cursor() as cur:
@@ -45,7 +40,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    conn = get_db_connection()
+    conn = get_db_connection(RealDictCursor)
     
     try:
         params = event.get('queryStringParameters') or {}
@@ -79,7 +74,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 cur.execute("""
-                    SELECT * FROM t_p21120869_mototumen_community_.products
+                    SELECT id, name, description, price, image_url, category, in_stock,
+                           brand, model, shop_id, created_at, updated_at
+                    FROM t_p21120869_mototumen_community_.products
                     WHERE shop_id = %s
                     ORDER BY created_at DESC
                 """, (shop['id'],))
@@ -240,4 +237,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
         
     finally:
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Business: Keep a local copy of @MotoTyumen group membership from Telegram chat_member updates and periodic reconciliation
+Args: event with httpMethod POST, body with a Telegram Update, {"updates": [...]} feed or {"action": "reconcile"}; header X-Telegram-Bot-Api-Secret-Token
+Returns: HTTP response with applied/skipped counts
+"""
+import hmac
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+TELEGRAM_GROUP_CHAT_ID = os.environ.get('TELEGRAM_GROUP_CHAT_ID', '-1002441055201')
+TELEGRAM_GROUP_USERNAME = 'MotoTyumen'
+MEMBER_STATUSES = ['member', 'administrator', 'creator']
+
+RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', '200'))
+RECONCILE_WORKERS = int(os.environ.get('RECONCILE_WORKERS', '8'))
+
+def get_header(headers: Dict[str, Any], name: str) -> Optional[str]:
+    name_lower = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name_lower:
+            return value
+    return None
+
+def is_group_chat(chat: Dict[str, Any]) -> bool:
+    return str(chat.get('id')) == TELEGRAM_GROUP_CHAT_ID or chat.get('username') == TELEGRAM_GROUP_USERNAME
+
+def extract_membership_events(update: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn one Telegram Update into membership changes for the group (chat_member and join/leave service messages)"""
+    events = []
+
+    chat_member = update.get('chat_member')
+    if chat_member and is_group_chat(chat_member.get('chat', {})):
+        new_member = chat_member.get('new_chat_member', {})
+        member_user = new_member.get('user', {})
+        if member_user.get('id'):
+            events.append({
+                'telegram_id': member_user['id'],
+                'username': member_user.get('username'),
+                'status': new_member.get('status', 'left'),
+                'event_at': chat_member.get('date') or time.time()
+            })
+
+    message = update.get('message')
+    if message and is_group_chat(message.get('chat', {})):
+        for joined in message.get('new_chat_members') or []:
+            events.append({
+                'telegram_id': joined['id'],
+                'username': joined.get('username'),
+                'status': 'member',
+                'event_at': message.get('date') or time.time()
+            })
+        left = message.get('left_chat_member')
+        if left:
+            events.append({
+                'telegram_id': left['id'],
+                'username': left.get('username'),
+                'status': 'left',
+                'event_at': message.get('date') or time.time()
+            })
+
+    return events
+
+def record_membership(cur, telegram_id: int, username: Optional[str], status: str, event_at: float, source: str) -> bool:
+    """Upsert one membership row; older events never overwrite newer ones. Returns True if the row changed"""
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.telegram_group_members (telegram_id, username, status, is_member, event_at, source, updated_at)
+        VALUES (%s, %s, %s, %s, to_timestamp(%s) AT TIME ZONE 'UTC', %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (telegram_id) DO UPDATE SET
+            username = COALESCE(EXCLUDED.username, telegram_group_members.username),
+            status = EXCLUDED.status,
+            is_member = EXCLUDED.is_member,
+            event_at = EXCLUDED.event_at,
+            source = EXCLUDED.source,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE telegram_group_members.event_at <= EXCLUDED.event_at
+        """,
+        (telegram_id, username, status, status in MEMBER_STATUSES, event_at, source)
+    )
+    return cur.rowcount > 0
+
+def apply_updates(cur, updates: List[Dict[str, Any]]) -> Dict[str, int]:
+    applied = 0
+    skipped = 0
+    for update in updates:
+        for membership in extract_membership_events(update):
+            if record_membership(cur, membership['telegram_id'], membership['username'],
+                                 membership['status'], membership['event_at'], 'update'):
+                applied += 1
+            else:
+                skipped += 1
+    return {'applied': applied, 'skipped': skipped}
+
+def fetch_member_status(bot_token: str, telegram_id: int) -> Optional[str]:
+    url = f"https://api.telegram.org/bot{bot_token}/getChatMember?chat_id={TELEGRAM_GROUP_CHAT_ID}&user_id={telegram_id}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url), timeout=5) as response:
+            data = json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        print(f"[RECONCILE] HTTPError for {telegram_id}: code={e.code}")
+        return None
+    except Exception as e:
+        print(f"[RECONCILE] Error for {telegram_id}: {e}")
+        return None
+    if not data.get('ok'):
+        return None
+    return data.get('result', {}).get('status')
+
+def reconcile(cur, bot_token: str, limit: int) -> Dict[str, int]:
+    """Re-check the least recently verified registered users against getChatMember"""
+    cur.execute(
+        f"""
+        SELECT u.telegram_id, u.username
+        FROM {SCHEMA}.users u
+        LEFT JOIN {SCHEMA}.telegram_group_members m ON m.telegram_id = u.telegram_id
+        WHERE u.telegram_id IS NOT NULL
+        ORDER BY m.updated_at ASC NULLS FIRST
+        LIMIT %s
+        """,
+        (limit,)
+    )
+    candidates = cur.fetchall()
+    checked_at = time.time()
+
+    with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS) as executor:
+        statuses = list(executor.map(lambda row: fetch_member_status(bot_token, row['telegram_id']), candidates))
+
+    updated = 0
+    failed = 0
+    for row, status in zip(candidates, statuses):
+        if status is None:
+            failed += 1
+            continue
+        if record_membership(cur, row['telegram_id'], row['username'], status, checked_at, 'reconcile'):
+            updated += 1
+    return {'checked': len(candidates), 'updated': updated, 'failed': failed}
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': '*',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    secret = os.environ.get('TELEGRAM_MEMBERSHIP_SECRET')
+    if not secret:
+        # Unsigned updates could mark any telegram_id as a member, so without a secret nothing is accepted
+        print("[TELEGRAM MEMBERSHIP ERROR] TELEGRAM_MEMBERSHIP_SECRET not set, rejecting request")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'TELEGRAM_MEMBERSHIP_SECRET not set'}),
+            'isBase64Encoded': False
+        }
+    if not hmac.compare_digest(get_header(event.get('headers') or {}, 'X-Telegram-Bot-Api-Secret-Token') or '', secret):
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid secret token'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        if not isinstance(body, dict):
+            raise ValueError('body must be a JSON object')
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Invalid JSON body: {str(e)}'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
+
+        if body.get('action') == 'reconcile':
+            bot_token = os.environ.get('TELEGRAM_BOT_TOKEN_AUTH')
+            if not bot_token:
+                return {
+                    'statusCode': 500,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'TELEGRAM_BOT_TOKEN_AUTH not set'}),
+                    'isBase64Encoded': False
+                }
+
+            limit = min(int(body.get('limit') or RECONCILE_BATCH_SIZE), 1000)
+            result = reconcile(cur, bot_token, limit)
+            conn.commit()
+            print(f"[RECONCILE] {result}")
+        else:
+            # Webhook delivers one Update; a replayed feed comes as {"updates": [...]} or a raw getUpdates response
+            updates = body.get('updates') or body.get('result') or [body]
+            result = apply_updates(cur, updates)
+            conn.commit()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        print(f"[TELEGRAM MEMBERSHIP ERROR] {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,56 @@
+'''
+Business: Валидаторы HTTP-кэша для публичных GET: сильный ETag по телу или слабый по версии данных, ответ 304 Not Modified без тела и Cache-Control для браузера и CDN
+Args: event с заголовком If-None-Match, готовое тело ответа или версия данных, из которой оно строится
+Returns: etag_for_body, etag_for_version, cached_response для обработчиков
+'''
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Union
+
+def get_request_header(event: Dict[str, Any], name: str) -> str:
+    name_lower = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name_lower:
+            return value or ''
+    return ''
+
+def etag_for_body(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def etag_for_version(*parts: Any) -> str:
+    """Weak ETag from the table version + query, computable before any query runs.
+    Weak because a version read and the rows read after it are separate statements: a write landing in between
+    can put slightly newer rows under the same version, so the ETag promises an equivalent body, not identical bytes"""
+    stamp = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return 'W/"v' + hashlib.sha256(stamp.encode('utf-8')).hexdigest()[:32] + '"'
+
+def strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+def matches_if_none_match(event: Dict[str, Any], etag: str) -> bool:
+    header = get_request_header(event, 'If-None-Match')
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    # If-None-Match uses weak comparison: W/ is ignored on both sides, so a CDN-weakened tag still matches
+    return '*' in candidates or strip_weak(etag) in [strip_weak(c) for c in candidates]
+
+def cached_response(event: Dict[str, Any], etag: str, cache_control: str, headers: Dict[str, str],
+                    body: Union[str, Callable[[], str]]) -> Dict[str, Any]:
+    """200 with validators, or an empty 304 if the client already has this ETag; body may be a callable so a 304 never builds it"""
+    headers = {
+        **headers,
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        # Callers may expose their own headers (X-Next-Cursor) next to ETag
+        'Access-Control-Expose-Headers': ', '.join(filter(None, ['ETag', headers.get('Access-Control-Expose-Headers')]))
+    }
+    if matches_if_none_match(event, etag):
+        return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body() if callable(body) else body,
+        'isBase64Encoded': False
+    }
@@ -8,6 +8,7 @@ import os
 from typing import Dict, Any
 import urllib.request
 import urllib.error
+from http_cache import etag_for_body, cached_response
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -18,7 +19,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -66,20 +67,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         member_count = members_data.get('result', 400) if members_data.get('ok') else 400
         title = chat_data.get('result', {}).get('title', channel)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Cache-Control': 'public, max-age=600'
-            },
-            'body': json.dumps({
-                'memberCount': member_count,
-                'title': title,
-                'channel': channel
-            }),
-            'isBase64Encoded': False
-        }
+        body = json.dumps({
+            'memberCount': member_count,
+            'title': title,
+            'channel': channel
+        })
+        return cached_response(
+            event, etag_for_body(body), 'public, max-age=600, stale-while-revalidate=3600',
+            {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, body
+        )
     
     except Exception as e:
         return {
@@ -0,0 +1,91 @@
+'''
+Business: Пакетная загрузка нескольких файлов за один вызов: PUT в бакет идут параллельно в ограниченном пуле потоков, работа с БД остаётся в основном потоке
+Args: список файлов [{file, fileName, contentType}] в base64 и курсор БД
+Returns: upload_batch(cur, files) -> результаты по каждому файлу в исходном порядке
+'''
+
+import base64
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+from storage import public_url
+from content_store import content_key, find_media, add_reference, put_content, index_content
+from variants import supports_variants, variant_urls, enqueue_variants
+
+UPLOAD_BATCH_WORKERS = int(os.environ.get('UPLOAD_BATCH_WORKERS', '4'))
+UPLOAD_BATCH_MAX_FILES = int(os.environ.get('UPLOAD_BATCH_MAX_FILES', '10'))
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_BATCH_WORKERS, thread_name_prefix='upload-batch')
+
+def upload_batch(cur, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One result per input file; a failed file carries 'error' and does not fail the others"""
+    results: List[Dict[str, Any]] = [{} for _ in files]
+    pending: Dict[str, Dict[str, Any]] = {}
+
+    for index, item in enumerate(files):
+        file_name = item.get('fileName', 'upload')
+        content_type = item.get('contentType', 'image/jpeg')
+        try:
+            data = base64.b64decode(item.get('file') or '')
+        except Exception:
+            data = b''
+        if not data:
+            results[index] = {'fileName': file_name, 'error': 'No file provided'}
+            continue
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        existing = find_media(cur, sha256)
+        if existing:
+            add_reference(cur, sha256)
+            results[index] = {'key': existing['object_key'], 'sha256': sha256, 'size': existing['size'],
+                              'contentType': existing['content_type'], 'deduplicated': True}
+            continue
+
+        # The same photo picked twice in one gallery is sent to the bucket once
+        entry = pending.setdefault(sha256, {
+            'key': content_key(sha256, content_type, file_name),
+            'data': data,
+            'contentType': content_type,
+            'indexes': []
+        })
+        entry['indexes'].append(index)
+
+    entries = list(pending.items())
+    outcomes = list(_executor.map(lambda pair: put_entry(pair[1]), entries))
+
+    for (sha256, entry), error in zip(entries, outcomes):
+        if error is not None:
+            for index in entry['indexes']:
+                results[index] = {'fileName': files[index].get('fileName', 'upload'), 'error': error}
+            continue
+
+        for position, index in enumerate(entry['indexes']):
+            key = index_content(cur, sha256, entry['key'], entry['contentType'], len(entry['data']))
+            if position == 0 and supports_variants(entry['contentType']):
+                enqueue_variants(cur, key)
+            results[index] = {'key': key, 'sha256': sha256, 'size': len(entry['data']),
+                              'contentType': entry['contentType'], 'deduplicated': position > 0}
+
+    return [public_result(result) for result in results]
+
+def put_entry(entry: Dict[str, Any]) -> Any:
+    try:
+        put_content(entry['data'], entry['key'], entry['contentType'])
+        return None
+    except Exception as e:
+        print(f"[UPLOAD BATCH ERROR] {entry['key']}: {str(e)}")
+        return str(e)
+
+def public_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    if 'error' in result:
+        return result
+    key = result['key']
+    return {
+        'url': public_url(key),
+        'fileName': key,
+        'size': result['size'],
+        'sha256': result['sha256'],
+        'deduplicated': result['deduplicated'],
+        'variants': variant_urls(key) if supports_variants(result['contentType']) else {}
+    }
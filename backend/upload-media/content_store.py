@@ -0,0 +1,106 @@
+'''
+Business: Контентно-адресуемое хранение медиа: ключ объекта выводится из полного SHA-256, повторная загрузка того же файла не пишет в бакет, а увеличивает счётчик ссылок
+Args: байты файла, content-type и курсор БД с таблицей media_objects
+Returns: store_content, store_hashed, put_content, index_content, find_media, add_reference для upload-media
+'''
+
+import hashlib
+import re
+from typing import Dict, Any, Optional, Union, IO
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from storage import get_s3_client, get_bucket_name
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+CONTENT_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/heic': 'heic',
+    'video/mp4': 'mp4',
+    'video/quicktime': 'mov',
+    'video/webm': 'webm'
+}
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Streamed bodies go up in 8 MB parts, two at a time, so memory stays bounded for big videos
+STREAM_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=2
+)
+
+def content_key(sha256: str, content_type: str, file_name: str) -> str:
+    """media/ab/ab12...ef.jpg: the same bytes always map to the same key"""
+    ext = CONTENT_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+    if not ext:
+        ext = re.sub(r'[^a-z0-9]', '', file_name.rsplit('.', 1)[-1].lower())[:10] if '.' in file_name else ''
+    return f"media/{sha256[:2]}/{sha256}.{ext or 'bin'}"
+
+def find_media(cur, sha256: str) -> Optional[Dict[str, Any]]:
+    cur.execute(
+        f"SELECT sha256, object_key, content_type, size, ref_count FROM {SCHEMA}.media_objects WHERE sha256 = %s",
+        (sha256,)
+    )
+    return cur.fetchone()
+
+def add_reference(cur, sha256: str) -> None:
+    cur.execute(
+        f"UPDATE {SCHEMA}.media_objects SET ref_count = ref_count + 1, last_referenced_at = CURRENT_TIMESTAMP WHERE sha256 = %s",
+        (sha256,)
+    )
+
+def object_exists(key: str) -> bool:
+    try:
+        get_s3_client().head_object(Bucket=get_bucket_name(), Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def put_content(body: Union[bytes, IO[bytes]], key: str, content_type: str) -> bool:
+    """PUT under the content key unless the bucket already has it; returns True if bytes were sent"""
+    # The index can lag behind the bucket (concurrent upload, restored table): HEAD before paying for the PUT
+    if object_exists(key):
+        return False
+    extra_args = {'ContentType': content_type, 'CacheControl': 'public, max-age=31536000, immutable'}
+    if isinstance(body, bytes):
+        get_s3_client().put_object(Bucket=get_bucket_name(), Key=key, Body=body, **extra_args)
+    else:
+        get_s3_client().upload_fileobj(body, get_bucket_name(), key, ExtraArgs=extra_args, Config=STREAM_TRANSFER_CONFIG)
+    return True
+
+def index_content(cur, sha256: str, key: str, content_type: str, size: int) -> str:
+    """Register stored bytes (or take one more reference if another upload won the race); returns the canonical key"""
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.media_objects (sha256, object_key, content_type, size)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (sha256) DO UPDATE SET
+            ref_count = media_objects.ref_count + 1,
+            last_referenced_at = CURRENT_TIMESTAMP
+        RETURNING object_key
+        """,
+        (sha256, key, content_type, size)
+    )
+    return cur.fetchone()['object_key']
+
+def store_content(cur, data: bytes, content_type: str, file_name: str) -> Dict[str, Any]:
+    """Put bytes into the bucket once per distinct content; duplicates only bump ref_count"""
+    return store_hashed(cur, data, hashlib.sha256(data).hexdigest(), len(data), content_type, file_name)
+
+def store_hashed(cur, body: Union[bytes, IO[bytes]], sha256: str, size: int, content_type: str, file_name: str) -> Dict[str, Any]:
+    """Same as store_content for a body hashed while it was being decoded (bytes or a readable stream)"""
+    existing = find_media(cur, sha256)
+    if existing:
+        add_reference(cur, sha256)
+        return {'key': existing['object_key'], 'sha256': sha256, 'size': existing['size'], 'created': False, 'indexed': True}
+
+    key = content_key(sha256, content_type, file_name)
+    created = put_content(body, key, content_type)
+    key = index_content(cur, sha256, key, content_type, size)
+    return {'key': key, 'sha256': sha256, 'size': size, 'created': created, 'indexed': False}
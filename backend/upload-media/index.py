@@ -1,16 +1,167 @@
 import json
 import base64
-import boto3
 import os
-from typing import Dict, Any
+import re
+import secrets
+from typing import Dict, Any, Optional
 from datetime import datetime
-import hashlib
+from botocore.exceptions import ClientError
+from storage import get_s3_client, get_bucket_name, public_url
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from content_store import SHA256_PATTERN, store_content, store_hashed, find_media, add_reference
+from multipart import handle_multipart_action
+from streaming import parse_upload_body, decode_file_field
+from batch_upload import upload_batch, UPLOAD_BATCH_MAX_FILES
+from variants import supports_variants, variant_urls, enqueue_variants
+
+PRESIGN_EXPIRES_IN = int(os.environ.get('PRESIGN_EXPIRES_IN', '900'))
+MAX_DIRECT_UPLOAD_SIZE = int(os.environ.get('MAX_DIRECT_UPLOAD_SIZE', str(500 * 1024 * 1024)))
+ALLOWED_CONTENT_PREFIXES = ('image/', 'video/')
+DIRECT_UPLOAD_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-]+)*/\d{8}_\d{6}_[0-9a-f]{16}\.[a-z0-9]{1,10}$')
+
+def json_response(status_code: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def safe_folder(folder: str) -> str:
+    """Keep client-supplied folder inside a flat [A-Za-z0-9_-/] namespace"""
+    parts = [re.sub(r'[^A-Za-z0-9_\-]', '', part) for part in (folder or '').split('/')]
+    return '/'.join(part for part in parts if part) or 'general'
+
+def file_extension(file_name: str) -> str:
+    ext = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+    ext = re.sub(r'[^a-z0-9]', '', ext)[:10]
+    return ext or 'jpg'
+
+def new_direct_upload_key(folder: str, file_name: str) -> str:
+    """Random key for a presigned upload: the signed URL can only ever create this one new object"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{safe_folder(folder)}/{timestamp}_{secrets.token_hex(8)}.{file_extension(file_name)}"
+
+def schedule_variants(object_key: str, content_type: str) -> Dict[str, str]:
+    """Queue thumbnails/WebP for an image; keys are deterministic so the URLs can be returned right away"""
+    if not supports_variants(content_type):
+        return {}
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        enqueue_variants(cur, object_key)
+        conn.commit()
+        return variant_urls(object_key)
+    except Exception as e:
+        print(f"[UPLOAD] Could not queue variants for {object_key}: {str(e)}")
+        return {}
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
+
+def reuse_existing_media(sha256: str) -> Optional[Dict[str, Any]]:
+    """If these bytes are already stored, take a reference instead of uploading them again"""
+    try:
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
+        existing = find_media(cur, sha256)
+        if not existing:
+            return None
+        add_reference(cur, sha256)
+        conn.commit()
+        return existing
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
+
+def presign_upload(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Issue a signed PUT URL (or POST form with size policy) for uploading straight to the bucket"""
+    content_type = body_data.get('contentType', 'image/jpeg')
+    size = body_data.get('size')
+
+    if not content_type.startswith(ALLOWED_CONTENT_PREFIXES):
+        return json_response(400, {'error': 'Only images and videos are allowed'})
+    if size is not None and (int(size) <= 0 or int(size) > MAX_DIRECT_UPLOAD_SIZE):
+        return json_response(413, {'error': f'File size must be between 1 and {MAX_DIRECT_UPLOAD_SIZE} bytes'})
+
+    sha256 = str(body_data.get('sha256') or '').lower()
+    if SHA256_PATTERN.match(sha256):
+        existing = reuse_existing_media(sha256)
+        if existing:
+            print(f"[UPLOAD] Presign skipped, {existing['object_key']} already stored")
+            return json_response(200, {
+                'exists': True,
+                'url': public_url(existing['object_key']),
+                'fileName': existing['object_key'],
+                'size': existing['size'],
+                'variants': variant_urls(existing['object_key']) if supports_variants(existing['content_type']) else {}
+            })
+
+    key = new_direct_upload_key(body_data.get('folder', 'general'), body_data.get('fileName', 'upload'))
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+
+    if str(body_data.get('method', 'PUT')).upper() == 'POST':
+        post = s3_client.generate_presigned_post(
+            Bucket=bucket_name,
+            Key=key,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, MAX_DIRECT_UPLOAD_SIZE]],
+            ExpiresIn=PRESIGN_EXPIRES_IN
+        )
+        target = {'method': 'POST', 'uploadUrl': post['url'], 'fields': post['fields']}
+    else:
+        upload_url = s3_client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket_name, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=PRESIGN_EXPIRES_IN,
+            HttpMethod='PUT'
+        )
+        target = {'method': 'PUT', 'uploadUrl': upload_url, 'headers': {'Content-Type': content_type}}
+
+    print(f"[UPLOAD] Presigned {target['method']} for {key}")
+    return json_response(200, {**target, 'fileName': key, 'url': public_url(key), 'expiresIn': PRESIGN_EXPIRES_IN})
+
+def confirm_upload(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Check that a presigned upload landed and is within limits, then hand back its public URL"""
+    key = body_data.get('fileName') or ''
+    if not DIRECT_UPLOAD_KEY_PATTERN.match(key):
+        return json_response(400, {'error': 'Invalid fileName'})
+
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return json_response(404, {'error': 'Upload not found'})
+        raise
+
+    size = head.get('ContentLength', 0)
+    content_type = head.get('ContentType', '')
+    if size > MAX_DIRECT_UPLOAD_SIZE or not content_type.startswith(ALLOWED_CONTENT_PREFIXES):
+        s3_client.delete_object(Bucket=bucket_name, Key=key)
+        return json_response(422, {'error': 'Uploaded object rejected: size or content type not allowed'})
+
+    print(f"[UPLOAD] Confirmed {key} ({size} bytes)")
+    return json_response(200, {
+        'url': public_url(key),
+        'fileName': key,
+        'size': size,
+        'contentType': content_type,
+        'variants': schedule_variants(key, content_type)
+    })
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Загрузка медиафайлов в Yandex Object Storage
-    Args: event - POST с base64 файлом, context - объект с request_id
-    Returns: HTTP response с URL загруженного файла
+    Args: event - POST с base64 файлом или action=presign/confirm для прямой загрузки в бакет, action=multipart_* для многочастной, action=batch с files[] для пакетной загрузки, context - объект с request_id
+    Returns: HTTP response с URL загруженного файла или подписанной целью загрузки
     Updated: 2025-10-28 20:22 force redeploy with storage.admin rights
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -38,13 +189,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     body_str = event.get('body', '{}')
     if not body_str or body_str.strip() == '':
         body_str = '{}'
-    body_data = json.loads(body_str)
-    file_base64 = body_data.get('file')
+    body_data, file_span = parse_upload_body(body_str)
+    
+    action = body_data.get('action')
+    if action == 'batch':
+        files = body_data.get('files') or []
+        if not isinstance(files, list) or not files:
+            return json_response(400, {'error': 'No files provided'})
+        if len(files) > UPLOAD_BATCH_MAX_FILES:
+            return json_response(413, {'error': f'At most {UPLOAD_BATCH_MAX_FILES} files per batch'})
+        try:
+            conn = get_db_connection(RealDictCursor)
+            cur = conn.cursor()
+            results = upload_batch(cur, files)
+            conn.commit()
+            failed = sum(1 for result in results if 'error' in result)
+            print(f"[UPLOAD] Batch of {len(files)}: {len(files) - failed} stored, {failed} failed")
+            return json_response(200, {'files': results, 'uploaded': len(files) - failed, 'failed': failed})
+        except Exception as e:
+            print(f"[UPLOAD ERROR] batch: {str(e)}")
+            return json_response(500, {'error': str(e)})
+        finally:
+            if 'cur' in locals():
+                cur.close()
+            if 'conn' in locals():
+                release_db_connection(conn)
+    
+    if action in ('presign', 'confirm'):
+        try:
+            return presign_upload(body_data) if action == 'presign' else confirm_upload(body_data)
+        except Exception as e:
+            print(f"[UPLOAD ERROR] {action}: {str(e)}")
+            return json_response(500, {'error': str(e)})
+    
+    if isinstance(action, str) and action.startswith('multipart_'):
+        if action == 'multipart_initiate' and not body_data.get('contentType', 'video/mp4').startswith(ALLOWED_CONTENT_PREFIXES):
+            return json_response(400, {'error': 'Only images and videos are allowed'})
+        try:
+            object_key = new_direct_upload_key(body_data.get('folder', 'general'), body_data.get('fileName', 'upload'))
+            status_code, payload = handle_multipart_action(action, body_data, object_key)
+            return json_response(status_code, payload)
+        except Exception as e:
+            print(f"[UPLOAD ERROR] {action}: {str(e)}")
+            return json_response(500, {'error': str(e)})
+    
     file_name = body_data.get('fileName', 'upload')
     content_type = body_data.get('contentType', 'image/jpeg')
-    folder = body_data.get('folder', 'general')
     
-    if not file_base64:
+    if file_span is None and not body_data.get('file'):
         return {
             'statusCode': 400,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -53,44 +245,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        file_bytes = base64.b64decode(file_base64)
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
         
-        file_hash = hashlib.md5(file_bytes).hexdigest()[:8]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_ext = file_name.split('.')[-1] if '.' in file_name else 'jpg'
-        unique_name = f"{folder}/{timestamp}_{file_hash}.{file_ext}"
+        if file_span is not None:
+            # Decode and hash straight from the raw body: the file is never held whole as str and bytes at once
+            file_stream, file_sha256, file_size = decode_file_field(body_str, file_span)
+            stored = store_hashed(cur, file_stream, file_sha256, file_size, content_type, file_name)
+        else:
+            file_bytes = base64.b64decode(body_data['file'])
+            file_size = len(file_bytes)
+            stored = store_content(cur, file_bytes, content_type, file_name)
+        unique_name = stored['key']
         
-        print(f"[UPLOAD] folder='{folder}', unique_name='{unique_name}'")
+        variants = {}
+        if supports_variants(content_type):
+            if not stored['indexed']:
+                enqueue_variants(cur, unique_name)
+            variants = variant_urls(unique_name)
+        conn.commit()
         
-        access_key = os.environ.get('YC_ACCESS_KEY_ID')
-        secret_key = os.environ.get('YC_SECRET_ACCESS_KEY')
-        bucket_name = os.environ.get('YC_STORAGE_BUCKET')
+        file_url = public_url(unique_name)
         
-        print(f"[UPLOAD] access_key={access_key[:10] if access_key else None}..., bucket={bucket_name}")
-        
-        if not access_key or not secret_key or not bucket_name:
-            raise Exception(f"Missing S3 credentials: access_key={bool(access_key)}, secret_key={bool(secret_key)}, bucket={bool(bucket_name)}")
-        
-        s3_client = boto3.client(
-            's3',
-            endpoint_url='https://storage.yandexcloud.net',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name='eu-central-1'
-        )
-        
-        print(f"[UPLOAD] Uploading {unique_name} ({len(file_bytes)} bytes) to {bucket_name}")
-        
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=unique_name,
-            Body=file_bytes,
-            ContentType=content_type
-        )
-        
-        file_url = f"https://storage.yandexcloud.net/{bucket_name}/{unique_name}"
-        
-        print(f"[UPLOAD] Success! URL: {file_url}")
+        if stored['created']:
+            print(f"[UPLOAD] Stored {unique_name} ({file_size} bytes)")
+        else:
+            print(f"[UPLOAD] Duplicate of {unique_name}, PUT skipped")
         
         return {
             'statusCode': 200,
@@ -102,7 +282,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({
                 'url': file_url,
                 'fileName': unique_name,
-                'size': len(file_bytes)
+                'size': file_size,
+                'sha256': stored['sha256'],
+                'deduplicated': not stored['created'],
+                'variants': variants
             })
         }
     except Exception as e:
@@ -117,4 +300,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             },
             'isBase64Encoded': False,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+    finally:
+        if 'file_stream' in locals():
+            file_stream.close()
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,245 @@
+'''
+Business: Многочастная загрузка больших видео и фото в Object Storage с учётом принятых частей в БД, чтобы повторять только упавшие части
+Args: тело запроса upload-media с action=multipart_initiate/multipart_sign/multipart_part/multipart_status/multipart_complete/multipart_abort
+Returns: handle_multipart_action(action, body) -> (statusCode, payload)
+'''
+
+import base64
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection, release_db_connection
+from storage import get_s3_client, get_bucket_name, public_url
+from variants import supports_variants, variant_urls, enqueue_variants
+
+SCHEMA = 't_p21120869_mototumen_community_'
+
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024)))
+MAX_MULTIPART_UPLOAD_SIZE = int(os.environ.get('MAX_MULTIPART_UPLOAD_SIZE', str(5 * 1024 * 1024 * 1024)))
+MULTIPART_SIGN_EXPIRES_IN = int(os.environ.get('MULTIPART_SIGN_EXPIRES_IN', '3600'))
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_COUNT = 10000
+
+def plan_parts(total_size: int) -> Tuple[int, int]:
+    """Pick a part size above the S3 minimum that keeps the upload within 10000 parts"""
+    part_size = max(MULTIPART_PART_SIZE, MIN_PART_SIZE, -(-total_size // MAX_PART_COUNT))
+    return part_size, max(1, -(-total_size // part_size))
+
+def expected_part_size(upload: Dict[str, Any], part_number: int) -> int:
+    if part_number < upload['part_count']:
+        return upload['part_size']
+    return upload['total_size'] - upload['part_size'] * (upload['part_count'] - 1)
+
+def load_upload(cur, upload_id: str) -> Optional[Dict[str, Any]]:
+    cur.execute(f"SELECT * FROM {SCHEMA}.media_multipart_uploads WHERE upload_id = %s", (upload_id,))
+    return cur.fetchone()
+
+def record_part(cur, upload_id: str, part_number: int, etag: str, size: int) -> None:
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.media_multipart_parts (upload_id, part_number, etag, size)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (upload_id, part_number) DO UPDATE SET etag = EXCLUDED.etag, size = EXCLUDED.size, uploaded_at = CURRENT_TIMESTAMP
+        """,
+        (upload_id, part_number, etag, size)
+    )
+    cur.execute(
+        f"UPDATE {SCHEMA}.media_multipart_uploads SET updated_at = CURRENT_TIMESTAMP WHERE upload_id = %s",
+        (upload_id,)
+    )
+
+def sync_parts_from_storage(cur, upload: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """Parts PUT straight to presigned URLs never pass through us, so take the bucket's list as the source of truth"""
+    s3_client = get_s3_client()
+    parts: Dict[int, Dict[str, Any]] = {}
+    marker = 0
+    while True:
+        page = s3_client.list_parts(
+            Bucket=get_bucket_name(),
+            Key=upload['object_key'],
+            UploadId=upload['upload_id'],
+            PartNumberMarker=marker
+        )
+        for part in page.get('Parts', []):
+            parts[part['PartNumber']] = {'etag': part['ETag'], 'size': part['Size']}
+        if not page.get('IsTruncated'):
+            break
+        marker = page['NextPartNumberMarker']
+
+    for part_number, part in parts.items():
+        record_part(cur, upload['upload_id'], part_number, part['etag'], part['size'])
+    return parts
+
+def missing_parts(upload: Dict[str, Any], parts: Dict[int, Dict[str, Any]]) -> List[int]:
+    return [
+        number for number in range(1, upload['part_count'] + 1)
+        if number not in parts or parts[number]['size'] != expected_part_size(upload, number)
+    ]
+
+def sign_parts(upload: Dict[str, Any], part_numbers: List[int]) -> List[Dict[str, Any]]:
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+    return [
+        {
+            'partNumber': number,
+            'uploadUrl': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': bucket_name, 'Key': upload['object_key'], 'UploadId': upload['upload_id'], 'PartNumber': number},
+                ExpiresIn=MULTIPART_SIGN_EXPIRES_IN,
+                HttpMethod='PUT'
+            ),
+            'size': expected_part_size(upload, number)
+        }
+        for number in part_numbers
+    ]
+
+def initiate(cur, body: Dict[str, Any], object_key: str) -> Tuple[int, Dict[str, Any]]:
+    content_type = body.get('contentType', 'video/mp4')
+    total_size = int(body.get('size') or 0)
+    if total_size <= 0 or total_size > MAX_MULTIPART_UPLOAD_SIZE:
+        return 413, {'error': f'File size must be between 1 and {MAX_MULTIPART_UPLOAD_SIZE} bytes'}
+
+    part_size, part_count = plan_parts(total_size)
+    created = get_s3_client().create_multipart_upload(
+        Bucket=get_bucket_name(),
+        Key=object_key,
+        ContentType=content_type
+    )
+    upload_id = created['UploadId']
+
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.media_multipart_uploads (upload_id, object_key, content_type, total_size, part_size, part_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        (upload_id, object_key, content_type, total_size, part_size, part_count)
+    )
+    print(f"[MULTIPART] Initiated {object_key}: {part_count} x {part_size} bytes")
+
+    upload = {'upload_id': upload_id, 'object_key': object_key, 'total_size': total_size,
+              'part_size': part_size, 'part_count': part_count}
+    payload = {'uploadId': upload_id, 'fileName': object_key, 'partSize': part_size, 'partCount': part_count}
+    if body.get('sign', True):
+        payload['parts'] = sign_parts(upload, list(range(1, min(part_count, 100) + 1)))
+    return 200, payload
+
+def upload_part_through_function(cur, upload: Dict[str, Any], body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    """Fallback for clients that cannot PUT to the bucket: one part per request as base64"""
+    part_number = int(body.get('partNumber') or 0)
+    if part_number < 1 or part_number > upload['part_count']:
+        return 400, {'error': 'Invalid partNumber'}
+    if not body.get('file'):
+        return 400, {'error': 'No file provided'}
+
+    part_bytes = base64.b64decode(body['file'])
+    if len(part_bytes) != expected_part_size(upload, part_number):
+        return 400, {'error': f'Part {part_number} must be {expected_part_size(upload, part_number)} bytes'}
+
+    result = get_s3_client().upload_part(
+        Bucket=get_bucket_name(),
+        Key=upload['object_key'],
+        UploadId=upload['upload_id'],
+        PartNumber=part_number,
+        Body=part_bytes
+    )
+    record_part(cur, upload['upload_id'], part_number, result['ETag'], len(part_bytes))
+    return 200, {'partNumber': part_number, 'etag': result['ETag'], 'size': len(part_bytes)}
+
+def complete(cur, upload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    parts = sync_parts_from_storage(cur, upload)
+    missing = missing_parts(upload, parts)
+    if missing:
+        return 409, {'error': 'Upload is incomplete', 'missingParts': missing}
+
+    get_s3_client().complete_multipart_upload(
+        Bucket=get_bucket_name(),
+        Key=upload['object_key'],
+        UploadId=upload['upload_id'],
+        MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': parts[number]['etag']} for number in range(1, upload['part_count'] + 1)]}
+    )
+    cur.execute(
+        f"""
+        UPDATE {SCHEMA}.media_multipart_uploads
+        SET status = 'completed', completed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE upload_id = %s
+        """,
+        (upload['upload_id'],)
+    )
+    variants = {}
+    if supports_variants(upload['content_type']):
+        enqueue_variants(cur, upload['object_key'])
+        variants = variant_urls(upload['object_key'])
+    print(f"[MULTIPART] Completed {upload['object_key']} ({upload['total_size']} bytes)")
+    return 200, {'url': public_url(upload['object_key']), 'fileName': upload['object_key'], 'size': upload['total_size'], 'variants': variants}
+
+def abort(cur, upload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    get_s3_client().abort_multipart_upload(
+        Bucket=get_bucket_name(),
+        Key=upload['object_key'],
+        UploadId=upload['upload_id']
+    )
+    cur.execute(f"DELETE FROM {SCHEMA}.media_multipart_parts WHERE upload_id = %s", (upload['upload_id'],))
+    cur.execute(
+        f"UPDATE {SCHEMA}.media_multipart_uploads SET status = 'aborted', updated_at = CURRENT_TIMESTAMP WHERE upload_id = %s",
+        (upload['upload_id'],)
+    )
+    return 200, {'uploadId': upload['upload_id'], 'status': 'aborted'}
+
+def handle_multipart_action(action: str, body: Dict[str, Any], object_key: str) -> Tuple[int, Dict[str, Any]]:
+    """Dispatch one multipart step; object_key is only used by multipart_initiate"""
+    try:
+        conn = get_db_connection(RealDictCursor)
+        cur = conn.cursor()
+
+        if action == 'multipart_initiate':
+            result = initiate(cur, body, object_key)
+            conn.commit()
+            return result
+
+        upload = load_upload(cur, body.get('uploadId') or '')
+        if not upload:
+            return 404, {'error': 'Upload not found'}
+        if upload['status'] != 'uploading':
+            return 409, {'error': f"Upload is {upload['status']}"}
+
+        if action == 'multipart_sign':
+            requested = body.get('partNumbers')
+            if requested is None:
+                requested = missing_parts(upload, sync_parts_from_storage(cur, upload))
+            numbers = [int(n) for n in requested if 1 <= int(n) <= upload['part_count']][:100]
+            # Fresh part URLs mean the client is still at it: keep media-gc's stale-upload sweep away
+            cur.execute(
+                f"UPDATE {SCHEMA}.media_multipart_uploads SET updated_at = CURRENT_TIMESTAMP WHERE upload_id = %s",
+                (upload['upload_id'],)
+            )
+            conn.commit()
+            return 200, {'uploadId': upload['upload_id'], 'parts': sign_parts(upload, numbers)}
+
+        if action == 'multipart_status':
+            parts = sync_parts_from_storage(cur, upload)
+            conn.commit()
+            return 200, {
+                'uploadId': upload['upload_id'],
+                'fileName': upload['object_key'],
+                'partSize': upload['part_size'],
+                'partCount': upload['part_count'],
+                'uploadedParts': sorted(parts),
+                'missingParts': missing_parts(upload, parts)
+            }
+
+        handlers = {
+            'multipart_part': lambda: upload_part_through_function(cur, upload, body),
+            'multipart_complete': lambda: complete(cur, upload),
+            'multipart_abort': lambda: abort(cur, upload)
+        }
+        if action not in handlers:
+            return 400, {'error': f'Unknown action: {action}'}
+
+        result = handlers[action]()
+        conn.commit()
+        return result
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -0,0 +1,50 @@
+'''
+Business: Потоковая обработка base64-файла из тела запроса: декодирование и SHA-256 кусками без полной копии файла в памяти
+Args: сырое тело запроса (JSON-строка) с полем file в base64
+Returns: parse_upload_body, decode_file_field для загрузки одиночного файла в upload-media
+'''
+
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Dict, Any, Optional, Tuple, IO
+
+UPLOAD_STREAM_CHUNK_SIZE = int(os.environ.get('UPLOAD_STREAM_CHUNK_SIZE', str(1024 * 1024)))
+UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', str(8 * 1024 * 1024)))
+
+FILE_FIELD_PATTERN = re.compile(r'"file"\s*:\s*"')
+# JSON escapes (\/, \n from line-wrapping encoders) or anything else outside plain base64 needs the full json.loads path
+NOT_BASE64_PATTERN = re.compile(r'[^A-Za-z0-9+/=]')
+
+def parse_upload_body(body_str: str) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+    """json.loads everything except the base64 payload, which is only located as a (start, end) span of body_str"""
+    match = FILE_FIELD_PATTERN.search(body_str)
+    end = body_str.find('"', match.end()) if match else -1
+    if match and end > match.end() and not NOT_BASE64_PATTERN.search(body_str, match.end(), end):
+        body_data = json.loads(body_str[:match.end()] + body_str[end:])
+        # The match must be the top-level field: a nested "file" (batch items) leaves no empty top-level value
+        if body_data.get('file') == '':
+            return body_data, (match.end(), end)
+    return json.loads(body_str), None
+
+def decode_file_field(body_str: str, span: Tuple[int, int]) -> Tuple[IO[bytes], str, int]:
+    """Decode chunk by chunk into a spooled file (in memory up to UPLOAD_SPOOL_MAX_SIZE, then /tmp) while hashing"""
+    start, end = span
+    step = max(UPLOAD_STREAM_CHUNK_SIZE // 3, 1) * 4
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+    try:
+        for pos in range(start, end, step):
+            chunk = base64.b64decode(body_str[pos:min(pos + step, end)], validate=True)
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
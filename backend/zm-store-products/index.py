@@ -6,11 +6,15 @@ Returns: HTTP response с данными товаров или результа
 
 import json
 import os
-import psycopg2
+from db import get_db_connection, release_db_connection
+from http_cache import etag_for_body, cached_response
 import jwt
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
-def verify_zm_store_access(token: Optional[str], dsn: str) -> Optional[Tuple[int, bool]]:
+# Seller-only data: browsers may keep it but must revalidate every time, shared caches must not store it
+PRODUCTS_CACHE_CONTROL = 'private, no-cache'
+
+def verify_zm_store_access(token: Optional[str]) -> Optional[Tuple[int, bool]]:
     """Проверка доступа к ZM Store. Возвращает (user_id, is_ceo)"""
     if not token:
         return None
@@ -22,7 +26,7 @@ def verify_zm_store_access(token: Optional[str], dsn: str) -> Optional[Tuple[int
         if not user_id:
             return None
         
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -33,8 +37,6 @@ def verify_zm_store_access(token: Optional[str], dsn: str) -> Optional[Tuple[int
         is_ceo = cur.fetchone() is not None
         
         if is_ceo:
-            cur.close()
-            conn.close()
             return (user_id, True)
         
         cur.execute("""
@@ -44,12 +46,42 @@ def verify_zm_store_access(token: Optional[str], dsn: str) -> Optional[Tuple[int
         """, (user_id,))
         
         is_seller = cur.fetchone() is not None
-        cur.close()
-        conn.close()
         
         return (user_id, False) if is_seller else None
     except:
         return None
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
+
+def product_facets(cur, conditions: List[str], params: List[Any]) -> Dict[str, Any]:
+    """Category, brand and in-stock counts for the current filter in a single GROUPING SETS query"""
+    cur.execute(f"""
+        SELECT category, brand, in_stock,
+               GROUPING(category) = 0 AS by_category,
+               GROUPING(brand) = 0 AS by_brand,
+               GROUPING(in_stock) = 0 AS by_in_stock,
+               count(*)
+        FROM t_p21120869_mototumen_community_.products
+        WHERE {' AND '.join(conditions)}
+        GROUP BY GROUPING SETS ((category), (brand), (in_stock), ())
+        ORDER BY count(*) DESC
+    """, params)
+    
+    total = 0
+    facets: Dict[str, List[Dict[str, Any]]] = {'category': [], 'brand': [], 'inStock': []}
+    for category, brand, in_stock, by_category, by_brand, by_in_stock, count in cur.fetchall():
+        if by_category:
+            facets['category'].append({'value': category, 'count': count})
+        elif by_brand:
+            facets['brand'].append({'value': brand, 'count': count})
+        elif by_in_stock:
+            facets['inStock'].append({'value': in_stock, 'count': count})
+        else:
+            total = count
+    return {'total': total, 'facets': facets}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -57,7 +89,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cors_headers = {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+        'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, If-None-Match',
         'Access-Control-Max-Age': '86400'
     }
     
@@ -69,10 +101,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
     
     auth_token = event.get('headers', {}).get('X-Auth-Token') or event.get('headers', {}).get('x-auth-token')
-    access = verify_zm_store_access(auth_token, dsn)
+    access = verify_zm_store_access(auth_token)
     
     if not access:
         return {
@@ -84,7 +115,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     user_id, is_ceo = access
     
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -135,20 +166,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'createdAt': row[9].isoformat() if row[9] else None
                 }
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps(product),
-                    'isBase64Encoded': False
-                }
+                body = json.dumps(product)
+                return cached_response(event, etag_for_body(body), PRODUCTS_CACHE_CONTROL, {**cors_headers, 'Content-Type': 'application/json'}, body)
+            
+            conditions = ['shop_id = %s']
+            params = [zm_store_id]
+            search = (query_params.get('search') or '').strip()
+            if search:
+                pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                conditions.append('(name ILIKE %s OR brand ILIKE %s OR model ILIKE %s)')
+                params.extend([pattern, pattern, pattern])
+            
+            if query_params.get('facets') in ('1', 'true'):
+                body = json.dumps(product_facets(cur, conditions, params))
+                return cached_response(event, etag_for_body(body), PRODUCTS_CACHE_CONTROL, {**cors_headers, 'Content-Type': 'application/json'}, body)
             else:
-                cur.execute("""
+                cur.execute(f"""
                     SELECT id, name, description, price, image_url, category, 
                            in_stock, brand, model, created_at
                     FROM t_p21120869_mototumen_community_.products
-                    WHERE shop_id = %s
+                    WHERE {' AND '.join(conditions)}
                     ORDER BY created_at DESC
-                """, (zm_store_id,))
+                """, params)
                 rows = cur.fetchall()
                 
                 products = []
@@ -166,12 +205,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'createdAt': row[9].isoformat() if row[9] else None
                     })
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({'products': products}),
-                    'isBase64Encoded': False
-                }
+                body = json.dumps({'products': products})
+                return cached_response(event, etag_for_body(body), PRODUCTS_CACHE_CONTROL, {**cors_headers, 'Content-Type': 'application/json'}, body)
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
@@ -279,4 +314,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
\ No newline at end of file
@@ -5,9 +5,8 @@ Returns: JSON со списком продавцов или результато
 '''
 
 import json
-import os
 from typing import Dict, Any
-import psycopg2
+from db import get_db_connection, release_db_connection
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -37,8 +36,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     telegram_id = token
     
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection()
         cur = conn.cursor()
         
         # Проверяем что пользователь - CEO
@@ -49,8 +47,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_role = cur.fetchone()
         
         if not user_role or user_role[0] != 'ceo':
-            cur.close()
-            conn.close()
             return {
                 'statusCode': 403,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -78,8 +74,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'assigned_at': row[6].isoformat() if row[6] else None
                 })
             
-            cur.close()
-            conn.close()
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -93,8 +87,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             full_name = body.get('full_name')
             
             if not new_telegram_id or not full_name:
-                cur.close()
-                conn.close()
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -109,8 +101,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             new_id = cur.fetchone()[0]
             conn.commit()
-            cur.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -125,8 +115,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             is_active = body.get('is_active')
             
             if seller_id is None or is_active is None:
-                cur.close()
-                conn.close()
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -140,8 +128,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             """, (is_active, seller_id))
             
             conn.commit()
-            cur.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -149,8 +135,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True})
             }
         
-        cur.close()
-        conn.close()
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -163,3 +147,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
@@ -6,11 +6,11 @@ Returns: HTTP response с данными продавцов или резуль
 
 import json
 import os
-import psycopg2
+from db import get_db_connection, release_db_connection
 import jwt
 from typing import Dict, Any, Optional
 
-def verify_ceo_token(token: Optional[str], dsn: str) -> Optional[int]:
+def verify_ceo_token(token: Optional[str]) -> Optional[int]:
     """Проверка что пользователь - CEO"""
     if not token:
         return None
@@ -22,7 +22,7 @@ def verify_ceo_token(token: Optional[str], dsn: str) -> Optional[int]:
         if not user_id:
             return None
         
-        conn = psycopg2.connect(dsn)
+        conn = get_db_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -31,12 +31,15 @@ def verify_ceo_token(token: Optional[str], dsn: str) -> Optional[int]:
         """, (user_id,))
         
         result = cur.fetchone()
-        cur.close()
-        conn.close()
         
         return user_id if result else None
     except:
         return None
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_db_connection(conn)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -56,10 +59,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
     
     auth_token = event.get('headers', {}).get('X-Auth-Token') or event.get('headers', {}).get('x-auth-token')
-    ceo_id = verify_ceo_token(auth_token, dsn)
+    ceo_id = verify_ceo_token(auth_token)
     
     if not ceo_id:
         return {
@@ -69,7 +71,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(dsn)
+    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -193,4 +195,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
@@ -0,0 +1,108 @@
+-- Денормализованные счётчики профиля: одна строка на пользователя вместо COUNT(*) по пяти таблицам
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.user_counters (
+    user_id INTEGER PRIMARY KEY,
+    friends_count INTEGER NOT NULL DEFAULT 0,
+    pending_friend_requests INTEGER NOT NULL DEFAULT 0,
+    vehicles_count INTEGER NOT NULL DEFAULT 0,
+    favorites_count INTEGER NOT NULL DEFAULT 0,
+    achievements_count INTEGER NOT NULL DEFAULT 0,
+    badges_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Атомарный инкремент/декремент счётчика (UPDATE x = x + delta сериализуется блокировкой строки)
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.bump_user_counter(p_user_id INTEGER, p_column TEXT, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    EXECUTE format(
+        'INSERT INTO t_p21120869_mototumen_community_.user_counters (user_id, %1$I) VALUES ($1, GREATEST($2, 0))
+         ON CONFLICT (user_id) DO UPDATE
+         SET %1$I = GREATEST(t_p21120869_mototumen_community_.user_counters.%1$I + $2, 0), updated_at = CURRENT_TIMESTAMP',
+        p_column
+    ) USING p_user_id, p_delta;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Гараж, избранное, достижения, бейджи: счётчик по user_id, имя колонки передаётся аргументом триггера
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.user_counters_by_owner()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p21120869_mototumen_community_.bump_user_counter(OLD.user_id, TG_ARGV[0], -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM t_p21120869_mototumen_community_.bump_user_counter(NEW.user_id, TG_ARGV[0], 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Друзья: accepted считается обоим, pending — только получателю заявки
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.user_counters_by_friendship()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = 'accepted' THEN
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(OLD.user_id, 'friends_count', -1);
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(OLD.friend_id, 'friends_count', -1);
+        ELSIF OLD.status = 'pending' THEN
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(OLD.friend_id, 'pending_friend_requests', -1);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = 'accepted' THEN
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(NEW.user_id, 'friends_count', 1);
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(NEW.friend_id, 'friends_count', 1);
+        ELSIF NEW.status = 'pending' THEN
+            PERFORM t_p21120869_mototumen_community_.bump_user_counter(NEW.friend_id, 'pending_friend_requests', 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_vehicles_counters
+    AFTER INSERT OR DELETE OR UPDATE OF user_id ON t_p21120869_mototumen_community_.user_vehicles
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.user_counters_by_owner('vehicles_count');
+
+CREATE TRIGGER trg_user_favorites_counters
+    AFTER INSERT OR DELETE OR UPDATE OF user_id ON t_p21120869_mototumen_community_.user_favorites
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.user_counters_by_owner('favorites_count');
+
+CREATE TRIGGER trg_user_achievements_counters
+    AFTER INSERT OR DELETE OR UPDATE OF user_id ON t_p21120869_mototumen_community_.user_achievements
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.user_counters_by_owner('achievements_count');
+
+CREATE TRIGGER trg_user_badges_counters
+    AFTER INSERT OR DELETE OR UPDATE OF user_id ON t_p21120869_mototumen_community_.user_badges
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.user_counters_by_owner('badges_count');
+
+CREATE TRIGGER trg_user_friends_counters
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, friend_id, status ON t_p21120869_mototumen_community_.user_friends
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.user_counters_by_friendship();
+
+-- Начальное заполнение из текущих данных
+INSERT INTO t_p21120869_mototumen_community_.user_counters
+    (user_id, friends_count, pending_friend_requests, vehicles_count, favorites_count, achievements_count, badges_count)
+SELECT
+    u.id,
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_friends f
+     WHERE (f.user_id = u.id OR f.friend_id = u.id) AND f.status = 'accepted'),
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_friends f
+     WHERE f.friend_id = u.id AND f.status = 'pending'),
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_vehicles v WHERE v.user_id = u.id),
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_favorites f WHERE f.user_id = u.id),
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_achievements a WHERE a.user_id = u.id),
+    (SELECT COUNT(*) FROM t_p21120869_mototumen_community_.user_badges b WHERE b.user_id = u.id)
+FROM t_p21120869_mototumen_community_.users u
+ON CONFLICT (user_id) DO UPDATE SET
+    friends_count = EXCLUDED.friends_count,
+    pending_friend_requests = EXCLUDED.pending_friend_requests,
+    vehicles_count = EXCLUDED.vehicles_count,
+    favorites_count = EXCLUDED.favorites_count,
+    achievements_count = EXCLUDED.achievements_count,
+    badges_count = EXCLUDED.badges_count,
+    updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,14 @@
+-- Локальная копия членства в группе @MotoTyumen, наполняется апдейтами chat_member и сверкой
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.telegram_group_members (
+    telegram_id BIGINT PRIMARY KEY,
+    username VARCHAR(255),
+    status VARCHAR(20) NOT NULL,
+    is_member BOOLEAN NOT NULL,
+    event_at TIMESTAMP NOT NULL,
+    source VARCHAR(20) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Для выбора давно не сверявшихся пользователей
+CREATE INDEX IF NOT EXISTS idx_telegram_group_members_updated_at
+    ON t_p21120869_mototumen_community_.telegram_group_members(updated_at);
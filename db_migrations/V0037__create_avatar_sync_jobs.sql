@@ -0,0 +1,19 @@
+-- Очередь копирования аватаров Telegram в Object Storage (outbox): одна запись на пользователя
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.avatar_sync_jobs (
+    user_id INTEGER PRIMARY KEY,
+    source_url TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_avatar_sync_jobs_pending
+    ON t_p21120869_mototumen_community_.avatar_sync_jobs(available_at)
+    WHERE status = 'pending';
+
+-- Откуда и с каким содержимым был скопирован текущий аватар, чтобы не копировать его повторно
+ALTER TABLE t_p21120869_mototumen_community_.user_profiles ADD COLUMN IF NOT EXISTS avatar_source_url TEXT;
+ALTER TABLE t_p21120869_mototumen_community_.user_profiles ADD COLUMN IF NOT EXISTS avatar_source_hash VARCHAR(64);
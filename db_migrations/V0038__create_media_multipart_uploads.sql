@@ -0,0 +1,26 @@
+-- Многочастные (multipart) загрузки больших медиафайлов: одна запись на загрузку и по записи на каждую принятую часть
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.media_multipart_uploads (
+    upload_id TEXT PRIMARY KEY,
+    object_key TEXT NOT NULL,
+    content_type VARCHAR(100) NOT NULL,
+    total_size BIGINT NOT NULL,
+    part_size BIGINT NOT NULL,
+    part_count INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'uploading',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_multipart_uploads_stale
+    ON t_p21120869_mototumen_community_.media_multipart_uploads(updated_at)
+    WHERE status = 'uploading';
+
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.media_multipart_parts (
+    upload_id TEXT NOT NULL REFERENCES t_p21120869_mototumen_community_.media_multipart_uploads(upload_id) ON DELETE CASCADE,
+    part_number INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (upload_id, part_number)
+);
@@ -0,0 +1,14 @@
+-- Очередь построения превью и WebP-вариантов для загруженных изображений: одна запись на исходный объект
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.media_variant_jobs (
+    object_key TEXT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_variant_jobs_pending
+    ON t_p21120869_mototumen_community_.media_variant_jobs(available_at)
+    WHERE status = 'pending';
@@ -0,0 +1,14 @@
+-- Индекс контентно-адресуемых медиа: один объект в бакете на уникальный SHA-256, ссылки считаются в ref_count
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.media_objects (
+    sha256 CHAR(64) PRIMARY KEY,
+    object_key TEXT NOT NULL UNIQUE,
+    content_type VARCHAR(100) NOT NULL,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_referenced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_objects_unreferenced
+    ON t_p21120869_mototumen_community_.media_objects(last_referenced_at)
+    WHERE ref_count = 0;
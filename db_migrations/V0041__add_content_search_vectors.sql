@@ -0,0 +1,33 @@
+-- Полнотекстовый поиск по каталогу: русская морфология, вектор пересчитывается самим Postgres при каждой записи
+ALTER TABLE t_p21120869_mototumen_community_.shops ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED;
+
+ALTER TABLE t_p21120869_mototumen_community_.schools ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED;
+
+ALTER TABLE t_p21120869_mototumen_community_.services ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED;
+
+ALTER TABLE t_p21120869_mototumen_community_.announcements ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_shops_search_vector ON t_p21120869_mototumen_community_.shops USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_schools_search_vector ON t_p21120869_mototumen_community_.schools USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_services_search_vector ON t_p21120869_mototumen_community_.services USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_announcements_search_vector ON t_p21120869_mototumen_community_.announcements USING GIN (search_vector);
@@ -0,0 +1,11 @@
+-- Индексы для keyset-пагинации листингов по (created_at, id): глубокие страницы читаются так же дёшево, как первая
+CREATE INDEX IF NOT EXISTS idx_shops_created_id ON t_p21120869_mototumen_community_.shops(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_schools_created_id ON t_p21120869_mototumen_community_.schools(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_services_created_id ON t_p21120869_mototumen_community_.services(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_announcements_active_created_id ON t_p21120869_mototumen_community_.announcements(created_at DESC, id DESC) WHERE status = 'active';
+
+-- С фильтром по категории
+CREATE INDEX IF NOT EXISTS idx_shops_category_created_id ON t_p21120869_mototumen_community_.shops(category, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_schools_category_created_id ON t_p21120869_mototumen_community_.schools(category, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_services_category_created_id ON t_p21120869_mototumen_community_.services(category, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_announcements_active_category_created_id ON t_p21120869_mototumen_community_.announcements(category, created_at DESC, id DESC) WHERE status = 'active';
@@ -0,0 +1,45 @@
+-- Версии листингов каталога для кэша ответов content: любая запись в таблицу типа (из любого бэкенда) увеличивает его версию
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.content_versions (
+    content_type VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p21120869_mototumen_community_.content_versions (content_type)
+VALUES ('shops'), ('schools'), ('services'), ('announcements')
+ON CONFLICT (content_type) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.bump_content_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE t_p21120869_mototumen_community_.content_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE content_type = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры уровня оператора: одна инкрементация на INSERT/UPDATE/DELETE, сколько бы строк он ни затронул
+CREATE TRIGGER trg_shops_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.shops
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('shops');
+
+CREATE TRIGGER trg_schools_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.schools
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('schools');
+
+CREATE TRIGGER trg_school_courses_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.school_courses
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('schools');
+
+CREATE TRIGGER trg_services_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.services
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('services');
+
+CREATE TRIGGER trg_service_items_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.service_items
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('services');
+
+CREATE TRIGGER trg_announcements_content_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p21120869_mototumen_community_.announcements
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.bump_content_version('announcements');
@@ -0,0 +1,14 @@
+-- Координаты для сервисов, как у магазинов (V0025)
+ALTER TABLE t_p21120869_mototumen_community_.services
+  ADD COLUMN IF NOT EXISTS latitude DECIMAL(10, 8),
+  ADD COLUMN IF NOT EXISTS longitude DECIMAL(11, 8);
+
+-- Пространственные индексы для режима "рядом со мной": GiST по точке (долгота, широта) отбирает строки
+-- по ограничивающему прямоугольнику вокруг пользователя, точное расстояние считается только для них
+CREATE INDEX IF NOT EXISTS idx_shops_geo_point ON t_p21120869_mototumen_community_.shops
+  USING gist (point(longitude::float8, latitude::float8))
+  WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_services_geo_point ON t_p21120869_mototumen_community_.services
+  USING gist (point(longitude::float8, latitude::float8))
+  WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
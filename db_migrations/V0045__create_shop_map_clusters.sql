@@ -0,0 +1,102 @@
+-- Предрасчитанные кластеры маркеров карты магазинов: для каждого зума из shop_cluster_zooms() точки собраны в ячейки
+-- сетки Web Mercator (тайл зума + 2, т.е. ячейка 64px на тайле 256px); хранятся количество и суммы координат для центроида
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.shop_map_clusters (
+    zoom SMALLINT NOT NULL,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    shop_count INTEGER NOT NULL DEFAULT 0,
+    lat_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    lng_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (zoom, cell_x, cell_y)
+);
+
+-- Должно совпадать с MAP_CLUSTER_MIN_ZOOM/MAP_CLUSTER_MAX_ZOOM в backend/content/map_clusters.py
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.shop_cluster_zooms()
+RETURNS SETOF INTEGER AS $$
+    SELECT generate_series(3, 15)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.map_cluster_cell(
+    lat DOUBLE PRECISION, lng DOUBLE PRECISION, zoom INTEGER, OUT cell_x INTEGER, OUT cell_y INTEGER
+) AS $$
+    SELECT least(greatest(floor((lng + 180) / 360 * n), 0), n - 1)::integer,
+           least(greatest(floor((1 - ln(tan(radians(c)) + 1 / cos(radians(c))) / pi()) / 2 * n), 0), n - 1)::integer
+    FROM (SELECT least(greatest(lat, -85.05112878), 85.05112878) AS c, 2 ^ (zoom + 2) AS n) cell
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Сдвиг счётчиков ячеек одной точки на всех зумах: +1 при появлении магазина, -1 при удалении или переносе
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.shift_shop_map_clusters(
+    p_lat DOUBLE PRECISION, p_lng DOUBLE PRECISION, p_delta INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    IF p_lat IS NULL OR p_lng IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO t_p21120869_mototumen_community_.shop_map_clusters AS c (zoom, cell_x, cell_y, shop_count, lat_sum, lng_sum)
+    SELECT z.zoom, cell.cell_x, cell.cell_y, p_delta, p_delta * p_lat, p_delta * p_lng
+    FROM t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+         t_p21120869_mototumen_community_.map_cluster_cell(p_lat, p_lng, z.zoom) AS cell
+    ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+        shop_count = c.shop_count + EXCLUDED.shop_count,
+        lat_sum = c.lat_sum + EXCLUDED.lat_sum,
+        lng_sum = c.lng_sum + EXCLUDED.lng_sum;
+
+    IF p_delta < 0 THEN
+        DELETE FROM t_p21120869_mototumen_community_.shop_map_clusters c
+        USING t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+              t_p21120869_mototumen_community_.map_cluster_cell(p_lat, p_lng, z.zoom) AS cell
+        WHERE c.zoom = z.zoom AND c.cell_x = cell.cell_x AND c.cell_y = cell.cell_y AND c.shop_count <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.latitude IS NOT DISTINCT FROM NEW.latitude AND OLD.longitude IS NOT DISTINCT FROM NEW.longitude THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p21120869_mototumen_community_.shift_shop_map_clusters(OLD.latitude::float8, OLD.longitude::float8, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM t_p21120869_mototumen_community_.shift_shop_map_clusters(NEW.latitude::float8, NEW.longitude::float8, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полная пересборка: начальное заполнение и восстановление после TRUNCATE или ручных правок
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.rebuild_shop_map_clusters()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM t_p21120869_mototumen_community_.shop_map_clusters;
+    INSERT INTO t_p21120869_mototumen_community_.shop_map_clusters (zoom, cell_x, cell_y, shop_count, lat_sum, lng_sum)
+    SELECT z.zoom, cell.cell_x, cell.cell_y, count(*), sum(s.latitude::float8), sum(s.longitude::float8)
+    FROM t_p21120869_mototumen_community_.shops s,
+         t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+         t_p21120869_mototumen_community_.map_cluster_cell(s.latitude::float8, s.longitude::float8, z.zoom) AS cell
+    WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL
+    GROUP BY z.zoom, cell.cell_x, cell.cell_y;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Инкрементальное обновление по строкам: создание, перенос и удаление магазина из content, admin и любых других бэкендов
+CREATE TRIGGER trg_shops_map_clusters
+    AFTER INSERT OR UPDATE OF latitude, longitude OR DELETE ON t_p21120869_mototumen_community_.shops
+    FOR EACH ROW EXECUTE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters();
+
+CREATE TRIGGER trg_shops_map_clusters_truncate
+    AFTER TRUNCATE ON t_p21120869_mototumen_community_.shops
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.rebuild_shop_map_clusters();
+
+-- Начальное заполнение из уже существующих магазинов
+INSERT INTO t_p21120869_mototumen_community_.shop_map_clusters (zoom, cell_x, cell_y, shop_count, lat_sum, lng_sum)
+SELECT z.zoom, cell.cell_x, cell.cell_y, count(*), sum(s.latitude::float8), sum(s.longitude::float8)
+FROM t_p21120869_mototumen_community_.shops s,
+     t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+     t_p21120869_mototumen_community_.map_cluster_cell(s.latitude::float8, s.longitude::float8, z.zoom) AS cell
+WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL
+GROUP BY z.zoom, cell.cell_x, cell.cell_y;
@@ -0,0 +1,6 @@
+-- Индексы для автодополнения по началу названия: LIKE 'префикс%' по lower(...) с text_pattern_ops
+-- читает диапазон индекса в алфавитном порядке, так что top-N берётся без сортировки и без полного сканирования
+CREATE INDEX IF NOT EXISTS idx_shops_name_prefix ON t_p21120869_mototumen_community_.shops (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_products_name_prefix ON t_p21120869_mototumen_community_.products (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_prefix ON t_p21120869_mototumen_community_.users (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix ON t_p21120869_mototumen_community_.users (lower(username) text_pattern_ops);
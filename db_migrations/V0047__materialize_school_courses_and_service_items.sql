@@ -0,0 +1,117 @@
+-- Названия курсов школ и услуг сервисов хранятся прямо в родительской строке, чтобы листинги content
+-- читали одну таблицу без array_agg по дочерним; массивы поддерживаются триггерами на дочерних таблицах
+ALTER TABLE t_p21120869_mototumen_community_.schools
+  ADD COLUMN IF NOT EXISTS course_names VARCHAR[] NOT NULL DEFAULT '{}';
+
+ALTER TABLE t_p21120869_mototumen_community_.services
+  ADD COLUMN IF NOT EXISTS service_names VARCHAR[] NOT NULL DEFAULT '{}';
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.materialize_course_names(p_school_ids INTEGER[])
+RETURNS VOID AS $$
+    UPDATE t_p21120869_mototumen_community_.schools s
+    SET course_names = COALESCE((
+        SELECT array_agg(c.course_name ORDER BY c.id)
+        FROM t_p21120869_mototumen_community_.school_courses c
+        WHERE c.school_id = s.id
+    ), '{}')
+    WHERE s.id = ANY(p_school_ids)
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.materialize_service_names(p_service_ids INTEGER[])
+RETURNS VOID AS $$
+    UPDATE t_p21120869_mototumen_community_.services s
+    SET service_names = COALESCE((
+        SELECT array_agg(i.service_name ORDER BY i.id)
+        FROM t_p21120869_mototumen_community_.service_items i
+        WHERE i.service_id = s.id
+    ), '{}')
+    WHERE s.id = ANY(p_service_ids)
+$$ LANGUAGE sql;
+
+-- Триггеры уровня оператора с таблицами переходов: массовая вставка курсов пересчитывает каждую школу один раз
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.refresh_course_names()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM t_p21120869_mototumen_community_.materialize_course_names(ARRAY(SELECT DISTINCT school_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM t_p21120869_mototumen_community_.materialize_course_names(ARRAY(SELECT DISTINCT school_id FROM old_rows));
+    ELSE
+        PERFORM t_p21120869_mototumen_community_.materialize_course_names(ARRAY(
+            SELECT school_id FROM new_rows UNION SELECT school_id FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.refresh_service_names()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM t_p21120869_mototumen_community_.materialize_service_names(ARRAY(SELECT DISTINCT service_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM t_p21120869_mototumen_community_.materialize_service_names(ARRAY(SELECT DISTINCT service_id FROM old_rows));
+    ELSE
+        PERFORM t_p21120869_mototumen_community_.materialize_service_names(ARRAY(
+            SELECT service_id FROM new_rows UNION SELECT service_id FROM old_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.clear_materialized_names()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'school_courses' THEN
+        UPDATE t_p21120869_mototumen_community_.schools SET course_names = '{}' WHERE course_names <> '{}';
+    ELSE
+        UPDATE t_p21120869_mototumen_community_.services SET service_names = '{}' WHERE service_names <> '{}';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов допускают только одно событие на триггер
+CREATE TRIGGER trg_school_courses_names_insert
+    AFTER INSERT ON t_p21120869_mototumen_community_.school_courses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_course_names();
+
+CREATE TRIGGER trg_school_courses_names_update
+    AFTER UPDATE ON t_p21120869_mototumen_community_.school_courses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_course_names();
+
+CREATE TRIGGER trg_school_courses_names_delete
+    AFTER DELETE ON t_p21120869_mototumen_community_.school_courses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_course_names();
+
+CREATE TRIGGER trg_school_courses_names_truncate
+    AFTER TRUNCATE ON t_p21120869_mototumen_community_.school_courses
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.clear_materialized_names();
+
+CREATE TRIGGER trg_service_items_names_insert
+    AFTER INSERT ON t_p21120869_mototumen_community_.service_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_service_names();
+
+CREATE TRIGGER trg_service_items_names_update
+    AFTER UPDATE ON t_p21120869_mototumen_community_.service_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_service_names();
+
+CREATE TRIGGER trg_service_items_names_delete
+    AFTER DELETE ON t_p21120869_mototumen_community_.service_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.refresh_service_names();
+
+CREATE TRIGGER trg_service_items_names_truncate
+    AFTER TRUNCATE ON t_p21120869_mototumen_community_.service_items
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.clear_materialized_names();
+
+-- Заполнение для уже существующих школ и сервисов
+SELECT t_p21120869_mototumen_community_.materialize_course_names(ARRAY(SELECT id FROM t_p21120869_mototumen_community_.schools));
+SELECT t_p21120869_mototumen_community_.materialize_service_names(ARRAY(SELECT id FROM t_p21120869_mototumen_community_.services));
@@ -0,0 +1,47 @@
+-- Внешний ключ записи из источника импорта: повторный импорт того же файла обновляет строки, а не дублирует их
+ALTER TABLE t_p21120869_mototumen_community_.shops ADD COLUMN IF NOT EXISTS external_id VARCHAR(100);
+ALTER TABLE t_p21120869_mototumen_community_.schools ADD COLUMN IF NOT EXISTS external_id VARCHAR(100);
+ALTER TABLE t_p21120869_mototumen_community_.services ADD COLUMN IF NOT EXISTS external_id VARCHAR(100);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_shops_external_id ON t_p21120869_mototumen_community_.shops(external_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_schools_external_id ON t_p21120869_mototumen_community_.schools(external_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_services_external_id ON t_p21120869_mototumen_community_.services(external_id);
+
+-- Задание импорта и его прогресс по фазам: staging -> validating -> upserting -> done / failed
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.content_import_jobs (
+    id SERIAL PRIMARY KEY,
+    format VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'staging',
+    staged_rows INTEGER NOT NULL DEFAULT 0,
+    valid_rows INTEGER NOT NULL DEFAULT 0,
+    invalid_rows INTEGER NOT NULL DEFAULT 0,
+    inserted_rows INTEGER NOT NULL DEFAULT 0,
+    updated_rows INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Сырые строки импорта: всё текстом, чтобы COPY не падал на плохих данных; ошибки проверки пишутся в error
+CREATE TABLE IF NOT EXISTS t_p21120869_mototumen_community_.content_import_rows (
+    job_id INTEGER NOT NULL REFERENCES t_p21120869_mototumen_community_.content_import_jobs(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    content_type TEXT,
+    external_id TEXT,
+    name TEXT,
+    description TEXT,
+    category TEXT,
+    image TEXT,
+    rating TEXT,
+    location TEXT,
+    phone TEXT,
+    website TEXT,
+    latitude TEXT,
+    longitude TEXT,
+    hours TEXT,
+    price TEXT,
+    items TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, line_no)
+);
@@ -0,0 +1,77 @@
+-- Кластеры карты магазинов обновляются одним запросом на оператор вместо 13 upsert'ов на каждую строку:
+-- массовый импорт (content ?type=import) вставляет тысячи магазинов одним INSERT .. ON CONFLICT
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.apply_shop_map_cluster_deltas(
+    p_lat DOUBLE PRECISION[], p_lng DOUBLE PRECISION[], p_delta INTEGER[]
+) RETURNS VOID AS $$
+BEGIN
+    -- Сдвиги всех точек оператора сложены по ячейкам: перенос внутри ячейки меняет только суммы координат
+    INSERT INTO t_p21120869_mototumen_community_.shop_map_clusters AS c (zoom, cell_x, cell_y, shop_count, lat_sum, lng_sum)
+    SELECT z.zoom, cell.cell_x, cell.cell_y, sum(p.delta), sum(p.delta * p.lat), sum(p.delta * p.lng)
+    FROM unnest(p_lat, p_lng, p_delta) AS p(lat, lng, delta),
+         t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+         t_p21120869_mototumen_community_.map_cluster_cell(p.lat, p.lng, z.zoom) AS cell
+    WHERE p.lat IS NOT NULL AND p.lng IS NOT NULL
+    GROUP BY z.zoom, cell.cell_x, cell.cell_y
+    ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+        shop_count = c.shop_count + EXCLUDED.shop_count,
+        lat_sum = c.lat_sum + EXCLUDED.lat_sum,
+        lng_sum = c.lng_sum + EXCLUDED.lng_sum;
+
+    -- Опустеть могут только ячейки, из которых точки ушли
+    IF -1 = ANY(p_delta) THEN
+        DELETE FROM t_p21120869_mototumen_community_.shop_map_clusters c
+        USING unnest(p_lat, p_lng, p_delta) AS p(lat, lng, delta),
+              t_p21120869_mototumen_community_.shop_cluster_zooms() AS z(zoom),
+              t_p21120869_mototumen_community_.map_cluster_cell(p.lat, p.lng, z.zoom) AS cell
+        WHERE p.delta < 0 AND p.lat IS NOT NULL AND p.lng IS NOT NULL
+          AND c.zoom = z.zoom AND c.cell_x = cell.cell_x AND c.cell_y = cell.cell_y AND c.shop_count <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters_batch()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- array_agg в одном запросе держит три массива выровненными; пустой оператор даёт NULL и ничего не меняет
+    IF TG_OP = 'INSERT' THEN
+        PERFORM t_p21120869_mototumen_community_.apply_shop_map_cluster_deltas(
+            array_agg(latitude::float8), array_agg(longitude::float8), array_agg(1)
+        ) FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM t_p21120869_mototumen_community_.apply_shop_map_cluster_deltas(
+            array_agg(latitude::float8), array_agg(longitude::float8), array_agg(-1)
+        ) FROM old_rows;
+    ELSE
+        -- Только магазины с изменёнными координатами: -1 на старом месте, +1 на новом
+        PERFORM t_p21120869_mototumen_community_.apply_shop_map_cluster_deltas(
+            array_agg(side.lat), array_agg(side.lng), array_agg(side.delta)
+        )
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        CROSS JOIN LATERAL (VALUES (o.latitude::float8, o.longitude::float8, -1),
+                                   (n.latitude::float8, n.longitude::float8, 1)) AS side(lat, lng, delta)
+        WHERE o.latitude IS DISTINCT FROM n.latitude OR o.longitude IS DISTINCT FROM n.longitude;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_shops_map_clusters ON t_p21120869_mototumen_community_.shops;
+DROP FUNCTION IF EXISTS t_p21120869_mototumen_community_.sync_shop_map_clusters();
+DROP FUNCTION IF EXISTS t_p21120869_mototumen_community_.shift_shop_map_clusters(DOUBLE PRECISION, DOUBLE PRECISION, INTEGER);
+
+-- Таблицы переходов допускают только одно событие на триггер и не работают со списком столбцов в UPDATE OF
+CREATE TRIGGER trg_shops_map_clusters_insert
+    AFTER INSERT ON t_p21120869_mototumen_community_.shops
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters_batch();
+
+CREATE TRIGGER trg_shops_map_clusters_update
+    AFTER UPDATE ON t_p21120869_mototumen_community_.shops
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters_batch();
+
+CREATE TRIGGER trg_shops_map_clusters_delete
+    AFTER DELETE ON t_p21120869_mototumen_community_.shops
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p21120869_mototumen_community_.sync_shop_map_clusters_batch();
@@ -0,0 +1,16 @@
+-- Глобальный поиск по товарам и райдерам без полного сканирования: товарам тот же хранимый вектор и GIN, что каталогу в V0041
+ALTER TABLE t_p21120869_mototumen_community_.products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(brand, '') || ' ' || coalesce(model, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON t_p21120869_mototumen_community_.products USING GIN (search_vector);
+
+-- Райдеры ищутся по подстроке (ILIKE '%...%'), префиксные индексы V0046 её не покрывают: нужны триграммы.
+-- Запросы короче трёх символов триграммный индекс не использует
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON t_p21120869_mototumen_community_.users USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON t_p21120869_mototumen_community_.users USING GIN (username gin_trgm_ops);
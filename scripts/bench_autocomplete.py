@@ -0,0 +1,85 @@
+'''
+Business: Бенчмарк автодополнения search (?suggest=) на 100k названий в каждом источнике: задержка и использование prefix-индексов
+Args: DATABASE_URL в окружении; --entries, --rounds, --budget-ms в командной строке
+Returns: p50/p95/max по префиксам разной длины и планы; код выхода 1, если p95 выше бюджета или индекс не используется. Все вставки откатываются
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'search'))
+from suggest import SUGGEST_BRANCHES, fetch_suggestions  # noqa: E402
+
+SCHEMA = 't_p21120869_mototumen_community_'
+WORDS = ['мото', 'мотоцентр', 'байк', 'шлем', 'масло', 'резина', 'экип', 'ремонт', 'тюмень', 'сибирь',
+         'moto', 'bike', 'helmet', 'motul', 'racing', 'garage', 'service', 'rider', 'custom', 'chopper']
+PREFIXES = ['м', 'мо', 'мото', 'мотоц', 'ш', 'шле', 'mo', 'mot', 'b', 'bik', 'ri', 'zzz']
+INDEXES = ['idx_shops_name_prefix', 'idx_products_name_prefix', 'idx_users_name_prefix', 'idx_users_username_prefix']
+
+def seed(cur, entries: int) -> None:
+    words = '{' + ','.join(WORDS) + '}'
+    name = f"initcap((%(words)s::text[])[1 + (random() * {len(WORDS) - 1})::int]) || ' ' || (%(words)s::text[])[1 + (random() * {len(WORDS) - 1})::int] || ' ' || g"
+    params = {'words': words, 'entries': entries}
+    cur.execute(f"INSERT INTO {SCHEMA}.shops (name) SELECT {name} FROM generate_series(1, %(entries)s) g", params)
+    cur.execute(f"INSERT INTO {SCHEMA}.products (name, price) SELECT {name}, 100 FROM generate_series(1, %(entries)s) g", params)
+    cur.execute(f"""
+        WITH new_users AS (
+            INSERT INTO {SCHEMA}.users (email, password_hash, name, username)
+            SELECT 'suggest-bench-' || g || '@example.invalid', '-', {name}, 'rider_' || g
+            FROM generate_series(1, %(entries)s) g
+            RETURNING id
+        )
+        INSERT INTO {SCHEMA}.user_profiles (user_id, is_public) SELECT id, true FROM new_users
+    """, params)
+    for table in ('shops', 'products', 'users', 'user_profiles'):
+        cur.execute(f"ANALYZE {SCHEMA}.{table}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    failures = []
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT setseed(0.42)")
+        seed(cur, args.entries)
+
+        cur.execute(f"EXPLAIN {' UNION ALL '.join(SUGGEST_BRANCHES)}", {'prefix': 'мо%', 'limit': 8})
+        plan = '\n'.join(row['QUERY PLAN'] for row in cur.fetchall())
+        print(plan + '\n')
+        for index in INDEXES:
+            if index not in plan:
+                failures.append(f"suggest query does not use {index}")
+
+        for prefix in PREFIXES:
+            timings = []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                suggestions = fetch_suggestions(cur, prefix, 8)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{prefix!r:>10}: {len(suggestions)} suggestions, p50 {statistics.median(timings):.2f} ms, "
+                  f"p95 {p95:.2f} ms, max {timings[-1]:.2f} ms")
+            if p95 > args.budget_ms:
+                failures.append(f"prefix {prefix!r}: p95 {p95:.2f} ms is over {args.budget_ms} ms")
+        cur.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Business: Бенчмарк GET "мой профиль" в auth: девять последовательных запросов против одного агрегированного
+Args: DATABASE_URL в окружении; --user-id, --rounds в командной строке
+Returns: количество запросов и задержка (p50/p95/mean, мс) для обоих вариантов
+'''
+
+import argparse
+import os
+import statistics
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+LEGACY_QUERIES = [
+    "SELECT u.id, u.email, u.name, u.created_at, u.telegram_id, u.username as telegram_username, p.phone, p.avatar_url, p.bio, p.location, p.gender, p.callsign, p.telegram FROM users u LEFT JOIN user_profiles p ON u.id = p.user_id WHERE u.id = %(user_id)s",
+    "SELECT item_type, item_id, created_at FROM user_favorites WHERE user_id = %(user_id)s ORDER BY created_at DESC",
+    "SELECT COUNT(*) as cnt FROM user_friends WHERE friend_id = %(user_id)s AND status = 'pending'",
+    "SELECT COUNT(*) as cnt FROM user_friends WHERE (user_id = %(user_id)s OR friend_id = %(user_id)s) AND status = 'accepted'",
+    "SELECT COUNT(*) as cnt FROM user_vehicles WHERE user_id = %(user_id)s",
+    "SELECT COUNT(*) as cnt FROM user_favorites WHERE user_id = %(user_id)s",
+    "SELECT COUNT(*) as cnt FROM user_achievements WHERE user_id = %(user_id)s",
+    "SELECT COUNT(*) as cnt FROM achievements",
+    "SELECT COUNT(*) as cnt FROM user_badges WHERE user_id = %(user_id)s",
+]
+
+AGGREGATED_QUERIES = [
+    """
+    SELECT u.id, u.email, u.name, u.created_at, u.telegram_id, u.username as telegram_username,
+           p.phone, p.avatar_url, p.bio, p.location, p.gender, p.callsign, p.telegram,
+           COALESCE(c.pending_friend_requests, 0) as pending_friend_requests,
+           COALESCE(c.friends_count, 0) as friends_count,
+           COALESCE(c.vehicles_count, 0) as vehicles_count,
+           COALESCE(c.favorites_count, 0) as favorites_count,
+           COALESCE(c.achievements_count, 0) as achievements_count,
+           COALESCE(c.badges_count, 0) as badges_count,
+           (SELECT COUNT(*) FROM achievements) as total_achievements,
+           (SELECT COALESCE(json_agg(json_build_object('item_type', f.item_type, 'item_id', f.item_id, 'created_at', f.created_at::text) ORDER BY f.created_at DESC), '[]'::json)
+            FROM user_favorites f WHERE f.user_id = u.id) as favorites
+    FROM users u
+    LEFT JOIN user_profiles p ON u.id = p.user_id
+    LEFT JOIN user_counters c ON u.id = c.user_id
+    WHERE u.id = %(user_id)s
+    """,
+]
+
+def run_variant(cur, queries, user_id: int, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for sql in queries:
+            cur.execute(sql, {'user_id': user_id})
+            cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'queries': len(queries),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+        'mean_ms': round(statistics.mean(timings), 3)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    try:
+        cur = conn.cursor()
+        for name, queries in (('legacy', LEGACY_QUERIES), ('aggregated', AGGREGATED_QUERIES)):
+            run_variant(cur, queries, args.user_id, 5)
+            print(name, run_variant(cur, queries, args.user_id, args.rounds))
+        cur.close()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
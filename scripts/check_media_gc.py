@@ -0,0 +1,78 @@
+'''
+Business: Проверка media-gc на контентно-адресуемых объектах: старый блоб, заново загруженный через дедупликацию, не считается сиротой
+Args: DATABASE_URL в окружении
+Returns: код выхода 1, если сборщик мусора отдаёт на удаление блоб со свежей ссылкой или оставляет заброшенный. Бакет не трогается, все вставки откатываются
+'''
+
+import hashlib
+import os
+import secrets
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import List, Set, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, os.path.join(ROOT, 'upload-media'))
+sys.path.insert(0, os.path.join(ROOT, 'media-gc'))
+from index import SCHEMA, MEDIA_GC_GRACE_DAYS, load_protected_keys, find_orphans  # noqa: E402
+from content_store import content_key, store_hashed  # noqa: E402
+
+def old_blob(cur, age_days: int) -> Tuple[str, str, bytes]:
+    """A deduplicated blob last uploaded long before the grace period; ref_count stays at 1 as nothing lowers it"""
+    data = secrets.token_bytes(64)
+    sha256 = hashlib.sha256(data).hexdigest()
+    key = content_key(sha256, 'image/jpeg', 'photo.jpg')
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.media_objects (sha256, object_key, content_type, size, ref_count, created_at, last_referenced_at)
+        VALUES (%s, %s, 'image/jpeg', %s, 1, CURRENT_TIMESTAMP - make_interval(days => %s), CURRENT_TIMESTAMP - make_interval(days => %s))
+    """, (sha256, key, len(data), age_days, age_days))
+    return sha256, key, data
+
+def orphans(conn, keys: List[str], modified: datetime) -> Set[str]:
+    listing = [{'Key': key, 'LastModified': modified, 'Size': 64} for key in keys]
+    return set(find_orphans(listing, set(), load_protected_keys(conn), len(listing))['orphans'])
+
+def main() -> None:
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    failures = []
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        age_days = MEDIA_GC_GRACE_DAYS * 4
+        modified = datetime.now(timezone.utc) - timedelta(days=age_days)
+        reuploaded_sha, reuploaded, data = old_blob(cur, age_days)
+        _, untouched, _ = old_blob(cur, age_days)
+
+        if orphans(conn, [reuploaded, untouched], modified) != {reuploaded, untouched}:
+            failures.append('unreferenced blobs older than the grace period should be collected')
+
+        # Same bytes uploaded again: store_hashed finds the old blob and only adds a reference, the bucket object keeps its old LastModified
+        stored = store_hashed(cur, data, reuploaded_sha, len(data), 'image/jpeg', 'photo.jpg')
+        if stored['key'] != reuploaded or stored['created']:
+            failures.append(f"re-upload was not deduplicated: {stored}")
+        found = orphans(conn, [reuploaded, untouched], modified)
+        if reuploaded in found:
+            failures.append('blob re-uploaded within the grace period was reported as an orphan')
+        if untouched not in found:
+            failures.append('untouched unreferenced blob was not reported as an orphan')
+
+        # The re-upload was never saved into a row and the grace period ran out: reclaimed despite ref_count > 0
+        cur.execute(f"""
+            UPDATE {SCHEMA}.media_objects SET last_referenced_at = CURRENT_TIMESTAMP - make_interval(days => %s)
+            WHERE sha256 = %s
+        """, (age_days, reuploaded_sha))
+        if reuploaded not in orphans(conn, [reuploaded], modified):
+            failures.append('abandoned deduplicated upload was not reported as an orphan')
+        cur.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+    print('media-gc keeps fresh deduplicated re-uploads and reclaims abandoned ones')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+Business: Проверка режима "рядом со мной" в content на засеянном наборе из десятков тысяч точек: совпадение с полным перебором и использование GiST-индекса
+Args: DATABASE_URL в окружении; --points, --queries, --radius, --seed в командной строке
+Returns: отчёт по времени запросов и планам; код выхода 1 при расхождении результатов или последовательном сканировании. Все вставки откатываются
+'''
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'content'))
+from nearby import NEARBY_TYPES, EARTH_RADIUS_KM, fetch_nearby  # noqa: E402
+
+# Points are scattered over ~300 km around Tyumen so every query box holds only a small share of the table
+CENTER = (57.1530, 65.5343)
+SPREAD_DEG = 2.5
+INDEXES = {'shops': 'idx_shops_geo_point', 'services': 'idx_services_geo_point'}
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def seed(cur, table: str, points: int, seed_value: int) -> None:
+    cur.execute("SELECT setseed(%s)", (seed_value / 2 ** 31,))
+    cur.execute(f"""
+        INSERT INTO {table} (name, category, latitude, longitude)
+        SELECT 'geo-check ' || g, 'geo-check',
+               round((%(lat)s + (random() * 2 - 1) * %(spread)s)::numeric, 6),
+               round((%(lng)s + (random() * 2 - 1) * %(spread)s)::numeric, 6)
+        FROM generate_series(1, %(points)s) g
+    """, {'lat': CENTER[0], 'lng': CENTER[1], 'spread': SPREAD_DEG, 'points': points})
+    cur.execute(f"ANALYZE {table}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--points', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=25)
+    parser.add_argument('--radius', type=float, default=15.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    failures = []
+    try:
+        cur = conn.cursor()
+        for table in NEARBY_TYPES:
+            seed(cur, table, args.points, args.seed)
+            cur.execute(f"SELECT id, latitude::float8 AS lat, longitude::float8 AS lng FROM {table} WHERE category = %s AND latitude IS NOT NULL AND longitude IS NOT NULL", ('geo-check',))
+            everything = cur.fetchall()
+
+            timings = []
+            for _ in range(args.queries):
+                lat = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+                lng = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+                limit = 100
+
+                started = time.perf_counter()
+                rows = fetch_nearby(cur, table, lat, lng, args.radius, 'geo-check', None, limit)
+                timings.append((time.perf_counter() - started) * 1000)
+
+                # Brute force over the whole table is the reference answer
+                expected = sorted(
+                    (haversine_km(lat, lng, p['lat'], p['lng']), p['id']) for p in everything
+                )
+                expected = [(d, i) for d, i in expected if d <= args.radius][:limit]
+                got = [(row['distance_km'], row['id']) for row in rows]
+                distances_sorted = all(a[0] <= b[0] for a, b in zip(got, got[1:]))
+                # Ties at the cut-off may legitimately differ, so compare ids below the last returned distance
+                cutoff = got[-1][0] if len(got) == limit else args.radius
+                same = {i for d, i in got if d < cutoff - 0.001} == {i for d, i in expected if d < cutoff - 0.001}
+                if len(got) != len(expected) or not same or not distances_sorted:
+                    failures.append(f"{table} at ({lat:.5f}, {lng:.5f}): got {len(got)} rows, expected {len(expected)}")
+
+            cur.execute("SAVEPOINT plan")
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute(f"EXPLAIN SELECT id FROM {table} s WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL "
+                        "AND point(s.longitude::float8, s.latitude::float8) <@ box(point(65.3, 57.0), point(65.7, 57.3))")
+            plan = '\n'.join(row['QUERY PLAN'] for row in cur.fetchall())
+            cur.execute("ROLLBACK TO SAVEPOINT plan")
+            uses_index = INDEXES[table] in plan
+            if not uses_index:
+                failures.append(f"{table}: box filter does not use {INDEXES[table]}")
+
+            timings.sort()
+            print(f"--- {table}: {len(everything)} points, {args.queries} queries, radius {args.radius} km, "
+                  f"p50 {timings[len(timings) // 2]:.2f} ms, max {timings[-1]:.2f} ms, index {'OK' if uses_index else 'NOT USED'}\n{plan}\n")
+        cur.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+    print('Nearby search matches brute force on every query')
+
+if __name__ == '__main__':
+    main()
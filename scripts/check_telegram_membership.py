@@ -0,0 +1,99 @@
+'''
+Business: Проверка telegram-membership на локальной фейковой ленте апдейтов: вход, выход, устаревший апдейт и чужой чат через подписанный вызов handler
+Args: DATABASE_URL в окружении
+Returns: код выхода 1, если счётчики applied/skipped или итоговый is_member не совпадают с ожидаемыми. Тестовые telegram_id удаляются в конце
+'''
+
+import json
+import os
+import secrets
+import sys
+from typing import Any, Dict, List, Optional
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'telegram-membership'))
+os.environ.setdefault('TELEGRAM_MEMBERSHIP_SECRET', secrets.token_hex(16))
+from index import SCHEMA, handler  # noqa: E402
+
+GROUP = {'id': -1002441055201, 'username': 'MotoTyumen', 'type': 'supergroup'}
+OTHER_CHAT = {'id': -1000000000001, 'username': 'SomeOtherGroup', 'type': 'supergroup'}
+# Far outside real Telegram ids so the check never touches real rows
+JOINER, LEAVER, STRANGER = 9100000000001, 9100000000002, 9100000000003
+
+def chat_member(update_id: int, chat: Dict[str, Any], telegram_id: int, old: str, new: str, date: int) -> Dict[str, Any]:
+    user = {'id': telegram_id, 'is_bot': False, 'first_name': 'Check', 'username': f'check_{telegram_id}'}
+    return {
+        'update_id': update_id,
+        'chat_member': {
+            'chat': chat,
+            'from': user,
+            'date': date,
+            'old_chat_member': {'user': user, 'status': old},
+            'new_chat_member': {'user': user, 'status': new}
+        }
+    }
+
+def post(updates: List[Dict[str, Any]], secret: Optional[str]) -> Dict[str, Any]:
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    response = handler({'httpMethod': 'POST', 'headers': headers, 'body': json.dumps({'updates': updates})}, None)
+    return {'status': response['statusCode'], **json.loads(response['body'])}
+
+def membership(cur, telegram_id: int) -> Optional[bool]:
+    cur.execute(f"SELECT is_member FROM {SCHEMA}.telegram_group_members WHERE telegram_id = %s", (telegram_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def expect(failures: List[str], name: str, actual: Any, expected: Any) -> None:
+    if actual != expected:
+        failures.append(f"{name}: expected {expected!r}, got {actual!r}")
+
+def main() -> None:
+    secret = os.environ['TELEGRAM_MEMBERSHIP_SECRET']
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    failures: List[str] = []
+    ids = [JOINER, LEAVER, STRANGER]
+    try:
+        cur.execute(f"DELETE FROM {SCHEMA}.telegram_group_members WHERE telegram_id = ANY(%s)", (ids,))
+
+        expect(failures, 'unsigned feed', post([chat_member(1, GROUP, JOINER, 'left', 'member', 1760000000)], None)['status'], 403)
+        expect(failures, 'unsigned feed row', membership(cur, JOINER), None)
+
+        # Join, join then leave, and a member of another chat that must be ignored
+        result = post([
+            chat_member(2, GROUP, JOINER, 'left', 'member', 1760000000),
+            chat_member(3, GROUP, LEAVER, 'left', 'member', 1760000000),
+            chat_member(4, GROUP, LEAVER, 'member', 'left', 1760000100),
+            chat_member(5, OTHER_CHAT, STRANGER, 'left', 'member', 1760000000)
+        ], secret)
+        expect(failures, 'feed', result, {'status': 200, 'applied': 3, 'skipped': 0})
+        expect(failures, 'joined is_member', membership(cur, JOINER), True)
+        expect(failures, 'left is_member', membership(cur, LEAVER), False)
+        expect(failures, 'other chat row', membership(cur, STRANGER), None)
+
+        # A late, older "member" update for someone who already left is skipped
+        result = post([chat_member(6, GROUP, LEAVER, 'left', 'member', 1760000050)], secret)
+        expect(failures, 'stale update', result, {'status': 200, 'applied': 0, 'skipped': 1})
+        expect(failures, 'left is_member after stale update', membership(cur, LEAVER), False)
+
+        # A leave service message in the group flips the joined user back out
+        result = post([{'update_id': 7, 'message': {'message_id': 1, 'chat': GROUP, 'date': 1760000200,
+                                                    'left_chat_member': {'id': JOINER, 'is_bot': False, 'first_name': 'Check'}}}], secret)
+        expect(failures, 'leave message', result, {'status': 200, 'applied': 1, 'skipped': 0})
+        expect(failures, 'joined is_member after leaving', membership(cur, JOINER), False)
+
+        response = handler({'httpMethod': 'POST', 'headers': {'X-Telegram-Bot-Api-Secret-Token': secret}, 'body': '{not json'}, None)
+        expect(failures, 'malformed body', response['statusCode'], 400)
+    finally:
+        cur.execute(f"DELETE FROM {SCHEMA}.telegram_group_members WHERE telegram_id = ANY(%s)", (ids,))
+        cur.close()
+        conn.close()
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+    print('telegram-membership applies the fake feed as expected')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Business: Проверка потокового декодирования upload-media: тело с экранированиями JSON (\/, \n) и без них даёт те же байты, что json.loads + b64decode
+Args: --size, --chunk-size в командной строке
+Returns: код выхода 1 при расхождении байтов или SHA-256 с обычным разбором. Сеть и БД не нужны
+'''
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import secrets
+import sys
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'upload-media'))
+import streaming  # noqa: E402
+
+def bodies(data: bytes) -> Dict[str, str]:
+    """Same file as different encoders put it on the wire"""
+    plain = base64.b64encode(data).decode()
+    wrapped = base64.encodebytes(data).decode()
+    meta = {'fileName': 'ride.jpg', 'contentType': 'image/jpeg', 'folder': 'tests'}
+    return {
+        'plain': json.dumps({**meta, 'file': plain}),
+        'file first': json.dumps({'file': plain, **meta}),
+        'escaped slashes': json.dumps({**meta, 'file': plain}).replace('/', '\\/'),
+        'line-wrapped base64': json.dumps({**meta, 'file': wrapped}),
+        'unicode escapes': json.dumps({**meta, 'file': plain}).replace('+', '\\u002b')
+    }
+
+def decode(body_str: str) -> bytes:
+    """What upload-media's handler ends up storing for this body"""
+    body_data, span = streaming.parse_upload_body(body_str)
+    if span is None:
+        return base64.b64decode(body_data['file'])
+    stream, sha256, size = streaming.decode_file_field(body_str, span)
+    data = stream.read()
+    stream.close()
+    if hashlib.sha256(data).hexdigest() != sha256 or len(data) != size:
+        raise AssertionError('hash or size reported by decode_file_field does not match the bytes')
+    return data
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=300000)
+    parser.add_argument('--chunk-size', type=int, default=4096)
+    args = parser.parse_args()
+    streaming.UPLOAD_STREAM_CHUNK_SIZE = args.chunk_size
+
+    # Random bytes give '+' and '/' in the base64 text, so the slash escaping is exercised
+    data = secrets.token_bytes(args.size)
+    failures = []
+    for name, body_str in bodies(data).items():
+        expected = base64.b64decode(json.loads(body_str)['file'])
+        try:
+            decoded = decode(body_str)
+        except Exception as e:
+            failures.append(f"{name}: {type(e).__name__}: {e}")
+            continue
+        if decoded != expected or decoded != data:
+            failures.append(f"{name}: decoded bytes differ from json.loads + b64decode")
+        else:
+            print(f"{name}: ok, {'streamed' if streaming.parse_upload_body(body_str)[1] else 'json.loads fallback'}")
+
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
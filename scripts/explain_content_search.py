@@ -0,0 +1,49 @@
+'''
+Business: Проверка, что поиск в content идёт по GIN-индексам search_vector, а не последовательным сканированием
+Args: DATABASE_URL в окружении; --search в командной строке
+Returns: план EXPLAIN для каждого типа контента; код выхода 1, если хоть один запрос не использует индекс
+'''
+
+import argparse
+import os
+import sys
+import psycopg2
+
+# Same WHERE clauses as the search mode of backend/content/index.py
+SEARCH_QUERIES = {
+    'shops': ('idx_shops_search_vector', "SELECT id FROM shops WHERE search_vector @@ to_tsquery('russian', %(tsquery)s) ORDER BY ts_rank_cd(search_vector, to_tsquery('russian', %(tsquery)s)) DESC, created_at DESC"),
+    'schools': ('idx_schools_search_vector', "SELECT s.id FROM schools s WHERE s.search_vector @@ to_tsquery('russian', %(tsquery)s) ORDER BY ts_rank_cd(s.search_vector, to_tsquery('russian', %(tsquery)s)) DESC, s.created_at DESC"),
+    'services': ('idx_services_search_vector', "SELECT s.id FROM services s WHERE s.search_vector @@ to_tsquery('russian', %(tsquery)s) ORDER BY ts_rank_cd(s.search_vector, to_tsquery('russian', %(tsquery)s)) DESC, s.created_at DESC"),
+    'announcements': ('idx_announcements_search_vector', "SELECT id FROM announcements WHERE status = 'active' AND search_vector @@ to_tsquery('russian', %(tsquery)s) ORDER BY ts_rank_cd(search_vector, to_tsquery('russian', %(tsquery)s)) DESC, created_at DESC")
+}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--search', default='мото')
+    args = parser.parse_args()
+    tsquery = ' & '.join(f"{term}:*" for term in args.search.lower().split())
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    failed = []
+    try:
+        cur = conn.cursor()
+        # Small catalogs are cheaper to scan; forbid seq scans so the planner shows whether the index is usable at all
+        cur.execute("SET enable_seqscan = off")
+        for content_type, (index_name, sql) in SEARCH_QUERIES.items():
+            cur.execute(f"EXPLAIN {sql}", {'tsquery': tsquery})
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+            uses_index = index_name in plan
+            print(f"--- {content_type}: {'OK' if uses_index else 'NO INDEX'}\n{plan}\n")
+            if not uses_index:
+                failed.append(content_type)
+        cur.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failed:
+        print(f"Full-text search does not use its GIN index for: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()